@@ -66,7 +66,10 @@ def run_parser():
         "-s",
         type=str,
         help="PATH to the file containing the source compounds. It must be \
-        tab-delineated .smi file. These ligands will seed the first generation.",
+        tab-delineated .smi file (which may be compressed as .smi.gz or \
+        .smi.zst) or a .mlib molecule library (see \
+        --save_mol_library) or a Parquet/Arrow table (see --smiles_column and \
+        --id_column). These ligands will seed the first generation.",
     )
 
     # processors and multithread mode
@@ -235,6 +238,252 @@ def run_parser():
         the gypsum_timeout_limit. Default gypsum_timeout_limit is 15 seconds",
     )
 
+    PARSER.add_argument(
+        "--gypsum_batch_size",
+        type=int,
+        default=25,
+        help="Number of ligands handed to each Gypsum-DL worker at a time. Each \
+        worker sets up Gypsum-DL once per batch and converts the ligands one at a \
+        time in-process, each with its own --gypsum_timeout_limit. Set to 0 to \
+        run Gypsum-DL separately for every ligand from its own submission file. \
+        Default is 25",
+    )
+
+    PARSER.add_argument(
+        "--gypsum_timeout_mode",
+        choices=["process", "thread"],
+        default="process",
+        help="How a ligand which runs past --gypsum_timeout_limit is stopped \
+        when --gypsum_batch_size is above 0. process: terminate and replace the \
+        worker process running it, so the CPU and memory it was using are \
+        reclaimed, and re-queue the rest of its batch. thread: stop it with \
+        func_timeout, which can leave the stuck RDKit call running in the \
+        background. mpi runs always use thread. Default is process",
+    )
+
+    PARSER.add_argument(
+        "--skip_3d_sdfs",
+        action="store_true",
+        default=False,
+        help="Do not save the 3D .sdf files of the ligands in the 3D_SDFs \
+        folder. Only the PDBs are saved. When --gypsum_batch_size is above 0 the \
+        PDBs are written by the Gypsum-DL workers straight from memory, so the \
+        .sdf files are not needed. Ignored if --gypsum_batch_size is 0.",
+    )
+
+    PARSER.add_argument(
+        "--output_3d_format",
+        choices=["pdb", "sdf_shards"],
+        default="pdb",
+        help="How the 3D models are saved when --gypsum_batch_size is above 0. \
+        pdb: a PDB file per variant in the PDBs folder. sdf_shards: pack the \
+        variants into multi-record .sdf shards in the 3D_Shards folder, each \
+        with a .sdf.idx index of the byte offset of every pose, rather than \
+        millions of small files. Single poses can be read with \
+        accessory_scripts/extract_3d_poses.py. Default is pdb",
+    )
+    PARSER.add_argument(
+        "--poses_per_shard",
+        type=int,
+        default=10000,
+        help="Maximum number of poses in each .sdf shard with \
+        --output_3d_format sdf_shards. Default is 10000",
+    )
+    PARSER.add_argument(
+        "--gypsum_embed_multiple_confs",
+        action="store_true",
+        default=False,
+        help="When --gypsum_batch_size is above 0, embed all of the conformers \
+        of a ligand variant in a single RDKit EmbedMultipleConfs call (using \
+        --gypsum_embed_threads threads) rather than one at a time.",
+    )
+    PARSER.add_argument(
+        "--gypsum_embed_threads",
+        type=int,
+        default=1,
+        help="Number of threads RDKit uses to embed the conformers of a ligand \
+        with --gypsum_embed_multiple_confs, and to minimize them with \
+        --gypsum_batch_minimize, when --gypsum_batch_size is above 0. Each \
+        Gypsum-DL worker uses this many threads, so keep the number of \
+        workers times this value within the number of cores. 0 uses all \
+        available cores. Default is 1",
+    )
+    PARSER.add_argument(
+        "--gypsum_batch_minimize",
+        action="store_true",
+        default=False,
+        help="When --gypsum_batch_size is above 0, minimize all of the \
+        conformers of a ligand variant in a single RDKit force-field call \
+        (using --gypsum_embed_threads threads) rather than one at a time.",
+    )
+    PARSER.add_argument(
+        "--gypsum_force_field",
+        choices=["uff", "mmff"],
+        default="uff",
+        help="Force field used to minimize the conformers of a ligand when \
+        --gypsum_batch_size is above 0. If MMFF can not parameterize one of \
+        the variants of a ligand, all of its variants are minimized with UFF \
+        so their energies can be compared. Default is uff",
+    )
+    PARSER.add_argument(
+        "--gypsum_minimize_max_iters",
+        type=int,
+        default=200,
+        help="Maximum number of minimization steps per conformer when \
+        --gypsum_batch_size is above 0. Default is 200",
+    )
+    PARSER.add_argument(
+        "--gypsum_tautomer_backend",
+        choices=["molvs", "rdkit"],
+        default="molvs",
+        help="Tautomer enumerator used by Gypsum-DL when --gypsum_batch_size is \
+        above 0. molvs: the original MolVS enumerator. rdkit: RDKit's faster C++ \
+        TautomerEnumerator (requires RDKit 2020.09 or newer). Tautomers are \
+        cached per worker process by canonical SMILES with either backend. \
+        Default is molvs",
+    )
+    PARSER.add_argument(
+        "--gypsum_best_first_protonation",
+        action="store_true",
+        default=False,
+        help="When --gypsum_batch_size is above 0, Gypsum-DL enumerates the \
+        ionization states of each ligand from most to least probable at the \
+        given pH range, stopping once enough unique states are found, instead of \
+        enumerating all of them and sampling. Default is False",
+    )
+    PARSER.add_argument(
+        "--gypsum_template_embedding",
+        action="store_true",
+        default=False,
+        help="When --gypsum_batch_size is above 0, embed the protonation, \
+        tautomer and stereo variants of each ligand with the heavy atoms they \
+        share fixed at the positions of the first variant embedded, rather than \
+        embedding every variant from scratch. Much faster for ligands with many \
+        variants. Variants that can't be embedded this way are embedded freely.",
+    )
+    PARSER.add_argument(
+        "--gypsum_adaptive_sampling",
+        action="store_true",
+        default=False,
+        help="When --gypsum_batch_size is above 0, generate the conformers of \
+        each ligand variant in rounds and stop once a round no longer improves \
+        the lowest-energy conformers, rather than always generating \
+        max_variants_per_compound * thoroughness of them (which remains the \
+        cap). Saves time on rigid ligands. The number of conformers sampled per \
+        ligand is logged.",
+    )
+
+    PARSER.add_argument(
+        "--save_gypsum_submission_files",
+        action="store_true",
+        default=False,
+        help="For debugging. Also save the input of \
+        every ligand as a .smi file in the gypsum_submission_files folder. \
+        Ligands are always handed to Gypsum-DL in memory.",
+    )
+
+    # Binary molecule library
+    PARSER.add_argument(
+        "--save_mol_library",
+        action="store_true",
+        default=False,
+        help="Save the ligands which pass the filters as a binary molecule \
+        library (SMILES_Passed_All_Filters.mlib) of already parsed and sanitized \
+        RDKit mols. The 3D conversion then reads this library so the SMILES are \
+        not parsed again. A .mlib file can also be used as the \
+        --source_compound_file of a later run.",
+    )
+
+    # Columnar (Parquet/Arrow) input and output
+    PARSER.add_argument(
+        "--output_table_format",
+        type=str,
+        default=None,
+        choices=["parquet", "arrow"],
+        help="Also save the result of every ligand as a columnar table \
+        (Filter_Results.parquet or Filter_Results.arrow). The table has the \
+        columns SMILES, ID, passed and status. Requires pyarrow. \
+        Default is None (no table)",
+    )
+    PARSER.add_argument(
+        "--smiles_column",
+        type=str,
+        default="SMILES",
+        help="Name of the SMILES column when the --source_compound_file is a \
+        Parquet or Arrow table. Default is SMILES",
+    )
+    PARSER.add_argument(
+        "--id_column",
+        type=str,
+        default="ID",
+        help="Name of the ID column when the --source_compound_file is a \
+        Parquet or Arrow table. Default is ID",
+    )
+    PARSER.add_argument(
+        "--record_batch_size",
+        type=int,
+        default=10000,
+        help="Number of rows read and written at a time for Parquet and Arrow \
+        tables. Default is 10000",
+    )
+    PARSER.add_argument(
+        "--filter_verdict_columns",
+        action="store_true",
+        default=False,
+        help="Add one pass/fail column per filter (ie. filter_Lipinski_Strict_Filter) \
+        to the --output_table_format table.",
+    )
+    PARSER.add_argument(
+        "--descriptor_columns",
+        action="store_true",
+        default=False,
+        help="Add the molecular descriptors (ExactMolWt, MolLogP, MolMR, TPSA, \
+        NumHDonors, NumHAcceptors, NumRotatableBonds, NumRings, NumHeavyAtoms) \
+        which were calculated for the filters to the --output_table_format table \
+        so they do not need to be recomputed downstream.",
+    )
+
+    # Shards of large .smi files
+    PARSER.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        help="Only filter one shard of the --source_compound_file, given as i/N \
+        where N is the number of shards and i is the 0-based index of this shard \
+        (ie. 0/100 to 99/100 for a 100 job array). Only this shard's lines are read, \
+        using a byte-offset index of the .smi file (<source_compound_file>.idx) \
+        which is built the first time it is needed. Shard outputs can be combined \
+        with accessory_scripts/merge_shard_outputs.py. Default is None",
+    )
+    PARSER.add_argument(
+        "--line_range",
+        type=str,
+        default=None,
+        help="Only filter lines start:end of the --source_compound_file. Lines \
+        are 0-based and end is exclusive (ie. 0:1000 is the first 1000 lines). \
+        Can not be used with --shard. Default is None",
+    )
+
+    # Compressed output
+    PARSER.add_argument(
+        "--output_compression",
+        type=str,
+        default=None,
+        choices=["gz", "zst"],
+        help="Compress the output .smi files while they are written \
+        (ie. SMILES_Passed_All_Filters.smi.gz). zst requires the zstandard \
+        package. Compressed source files (.smi.gz or .smi.zst) are always \
+        decompressed while they are read, based on their extension. \
+        Default is None (uncompressed)",
+    )
+    PARSER.add_argument(
+        "--compression_level",
+        type=int,
+        default=None,
+        help="The compression level of the --output_compression. gz is 1-9 \
+        (default 9) and zst is 1-22 (default 3). Lower levels are faster.",
+    )
+
     # mpi mode pre-Run so there are python cache files without EOF Errors
     PARSER.add_argument(
         "--cache_prerun",
@@ -0,0 +1,144 @@
+"""
+Extract poses from the packed 3D output of GlauconiteFilter.
+
+With --output_3d_format sdf_shards the 3D models are saved in multi-record
+.sdf shards in $PATH/TO/Run_0/3D_Shards/ with an index of the byte offset of
+every pose. This script reads only the requested poses from the shards and
+writes each to a .pdb (with the same "REMARK Final SMILES string" header as
+the PDBs folder) or .sdf file.
+
+Run example:
+python extract_3d_poses.py \
+  --shard_folder $PATH/TO/Run_0/3D_Shards/ \
+  --ligand_ids Gen_0_Mutant_7_1 Gen_0_Mutant_9_3 \
+  --output_folder $PATH/TO/OUTPUT/
+
+Leave out --ligand_ids to extract every pose.
+"""
+import __future__
+
+import os
+import sys
+import argparse
+
+from rdkit import Chem
+
+# Allow the glauconite package to be imported from the accessory_scripts folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glauconite.operators.file_io.pose_shards as pose_shards
+
+
+def write_pose(sdf_block, final_smiles, output_file, output_format):
+    """
+    Write a single pose to a file.
+
+    Inputs:
+    :param str sdf_block: the SDF record of the pose
+    :param str final_smiles: the final SMILES of the pose
+    :param str output_file: the path of the file to write
+    :param str output_format: pdb or sdf
+    Returns:
+    :returns: bool written: False if rdkit could not read the pose
+    """
+
+    if output_format == "sdf":
+        with open(output_file, "w") as f:
+            f.write(sdf_block)
+        return True
+
+    mol = Chem.MolFromMolBlock(sdf_block, sanitize=False, removeHs=False)
+    if mol is None:
+        return False
+    printout = "REMARK Final SMILES string: {}\n".format(final_smiles)
+    with open(output_file, "w") as f:
+        f.write(printout + Chem.MolToPDBBlock(mol, flavor=32))
+    return True
+
+
+def start_run_main(vars):
+    """
+    This will run the main arguments for the script.
+
+    Inputs:
+    :param dict vars: dictionary of user variables.
+    """
+
+    ligand_ids = vars["ligand_ids"]
+    if ligand_ids is not None:
+        ligand_ids = set(ligand_ids)
+
+    num_written = 0
+    for entry in pose_shards.iter_pose_index(vars["shard_folder"]):
+        ligand_id, variant, shard_file, offset, length, final_smiles = entry
+        if ligand_ids is not None and ligand_id not in ligand_ids:
+            continue
+        sdf_block = pose_shards.read_pose_block(shard_file, offset, length)
+        output_file = "{}{}{}__{}.{}".format(
+            vars["output_folder"], os.sep, ligand_id, variant,
+            vars["output_format"]
+        )
+        if write_pose(sdf_block, final_smiles, output_file, vars["output_format"]):
+            num_written = num_written + 1
+        else:
+            print("WARNING: could not read pose {}__{}".format(ligand_id, variant))
+
+    print("Extracted {} poses to:\n\t{}".format(num_written, vars["output_folder"]))
+
+
+def get_arguments_from_argparse(args_dict):
+    """
+    This function handles the arg parser arguments for the script.
+
+    Inputs:
+    :param dict args_dict: dictionary of parameters
+    Returns:
+    :returns: dict args_dict: dictionary of parameters
+    """
+
+    if os.path.isdir(args_dict["shard_folder"]) is False:
+        raise Exception("provided shard_folder is not a directory.")
+    if len(pose_shards.get_shard_index_files(args_dict["shard_folder"])) == 0:
+        raise Exception("No shard indexes (.sdf.idx) found in shard_folder.")
+    args_dict["shard_folder"] = os.path.abspath(args_dict["shard_folder"])
+
+    if os.path.exists(args_dict["output_folder"]) is False:
+        try:
+            os.makedirs(args_dict["output_folder"])
+        except:
+            pass
+        if os.path.exists(args_dict["output_folder"]) is False:
+            raise Exception("output_folder could not be made or found.")
+    elif os.path.isdir(args_dict["output_folder"]) is False:
+        raise Exception("output_folder needs to be a directory.")
+    args_dict["output_folder"] = os.path.abspath(args_dict["output_folder"])
+
+    return args_dict
+#
+
+# Argument parsing
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument(
+    '--shard_folder', '-s', required=True, default=None,
+    help='Path to the 3D_Shards folder of a run.'
+)
+PARSER.add_argument(
+    '--ligand_ids', '-l', required=False, default=None, nargs="+",
+    help='IDs of the ligands to extract (as in New_SMILES_After_3D_Conversion.smi \
+    without the __variant). Default is every ligand.'
+)
+PARSER.add_argument(
+    '--output_folder', '-o', required=True, default=None,
+    help='Path to folder where the poses are written.'
+)
+PARSER.add_argument(
+    '--output_format', '-f', required=False, default="pdb",
+    choices=["pdb", "sdf"],
+    help='Write each pose as a .pdb or .sdf file. Default is pdb.'
+)
+
+ARGS_DICT = vars(PARSER.parse_args())
+ARGS_DICT = get_arguments_from_argparse(ARGS_DICT)
+
+# Running extraction
+start_run_main(ARGS_DICT)
@@ -0,0 +1,80 @@
+"""
+Build the byte-offset index of a .smi file.
+
+GlauconiteFilter builds the index of the --source_compound_file the first
+time --shard or --line_range is used. For a very large .smi file it is best to
+build it once before submitting the array jobs so every job can use it
+straight away.
+
+The index is saved next to the .smi file as $PATH/TO/LIBRARY.smi.idx
+
+Run example:
+python index_smi_file.py \
+  --source_compound_file $PATH/TO/LIBRARY.smi
+"""
+import __future__
+
+import os
+import sys
+import argparse
+
+# Allow the glauconite package to be imported from the accessory_scripts folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glauconite.operators.file_io.smi_index as smi_index
+
+
+def start_run_main(vars):
+    """
+    This will run the main arguments for the script.
+
+    Inputs:
+    :param dict vars: dictionary of user variables.
+    """
+
+    index_file, num_lines = smi_index.build_smi_index(
+        vars["source_compound_file"], vars["index_file"]
+    )
+    print("Indexed {} lines of {}".format(num_lines, vars["source_compound_file"]))
+    print("Index located:\n\t{}".format(index_file))
+
+
+def get_arguments_from_argparse(args_dict):
+    """
+    This function handles the arg parser arguments for the script.
+
+    Inputs:
+    :param dict args_dict: dictionary of parameters
+    Returns:
+    :returns: dict args_dict: dictionary of parameters
+    """
+
+    if os.path.exists(args_dict["source_compound_file"]) is False or \
+        os.path.isfile(args_dict["source_compound_file"]) is False:
+        raise Exception("provided source_compound_file can not be found.")
+    args_dict["source_compound_file"] = os.path.abspath(
+        args_dict["source_compound_file"]
+    )
+    if args_dict["index_file"] is not None:
+        args_dict["index_file"] = os.path.abspath(args_dict["index_file"])
+
+    return args_dict
+#
+
+# Argument parsing
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument(
+    '--source_compound_file', '-s', required=True, default=None,
+    help='Path to the .smi file to index.'
+)
+PARSER.add_argument(
+    '--index_file', '-o', required=False, default=None,
+    help='Path of the index to write. GlauconiteFilter only looks for the \
+    index at the default location. Default is the source_compound_file + .idx'
+)
+
+ARGS_DICT = vars(PARSER.parse_args())
+ARGS_DICT = get_arguments_from_argparse(ARGS_DICT)
+
+# Running indexer
+start_run_main(ARGS_DICT)
@@ -0,0 +1,226 @@
+"""
+Merge the outputs of GlauconiteFilter runs which each filtered one shard
+(--shard i/N) or line range (--line_range start:end) of the same .smi file.
+
+The vars.json of each run records which lines of the source file it read.
+The runs are combined in the order of those lines, so the merged files list
+the ligands in the same order as the original source .smi file, no matter in
+which order the array jobs finished.
+
+Merged files (only those present in every run are merged). Compressed
+outputs (ie. SMILES_Passed_All_Filters.smi.gz) are merged into a file with the
+same compression:
+    Initial_SMILES.smi
+    SMILES_Passed_All_Filters.smi
+    SMILES_Failed_Filter.smi
+    New_SMILES_After_3D_Conversion.smi
+
+Run example:
+python merge_shard_outputs.py \
+  --run_folders $PATH/TO/SHARD_OUTPUT/*/Run_0/ \
+  --output_folder $PATH/TO/OUTPUT/
+"""
+import __future__
+
+import os
+import sys
+import json
+import argparse
+
+# Allow the glauconite package to be imported from the accessory_scripts folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glauconite.operators.file_io.compressed_io as compressed_io
+
+MERGED_FILES = [
+    "Initial_SMILES.smi",
+    "SMILES_Passed_All_Filters.smi",
+    "SMILES_Failed_Filter.smi",
+    "New_SMILES_After_3D_Conversion.smi",
+]
+
+
+def get_run_line_range(run_folder):
+    """
+    Get the source file and the lines of it which a run read from the
+    vars.json of the run.
+
+    Inputs:
+    :param str run_folder: path to the Run_# folder of a shard
+    Returns:
+    :returns: list run_info: [source_compound_file, start_line, end_line,
+        num_lines, run_folder]
+    """
+
+    vars_file = run_folder + os.sep + "vars.json"
+    if os.path.exists(vars_file) is False:
+        raise Exception("No vars.json found in {}".format(run_folder))
+    with open(vars_file, "r") as f:
+        run_vars = json.load(f)
+
+    if run_vars.get("source_line_range") is None:
+        raise Exception(
+            "{} was not run with --shard or --line_range.".format(run_folder)
+        )
+    start_line, end_line, num_lines = run_vars["source_line_range"]
+
+    return [run_vars["source_compound_file"], start_line, end_line,
+            num_lines, run_folder]
+
+
+def check_run_coverage(run_infos):
+    """
+    Check that the runs are shards of the same file and that their lines do not
+    overlap. Prints a warning for any lines which no run read.
+
+    Inputs:
+    :param list run_infos: list of run_info lists (see get_run_line_range)
+        sorted by start_line
+    """
+
+    source_files = list(set([x[0] for x in run_infos]))
+    if len(source_files) != 1:
+        raise Exception(
+            "The runs filtered different source files: {}".format(source_files)
+        )
+
+    expected_start = 0
+    for source_file, start_line, end_line, num_lines, run_folder in run_infos:
+        if start_line < expected_start:
+            raise Exception(
+                "Lines {} to {} of {} overlap with another run.".format(
+                    start_line, end_line, run_folder
+                )
+            )
+        if start_line > expected_start:
+            print("WARNING: lines {} to {} were not filtered by any run.".format(
+                expected_start, start_line
+            ))
+        expected_start = end_line
+
+    num_lines = run_infos[-1][3]
+    if expected_start < num_lines:
+        print("WARNING: lines {} to {} were not filtered by any run.".format(
+            expected_start, num_lines
+        ))
+
+
+def find_run_file(run_folder, file_name):
+    """
+    Find an output file of a run, which may have been compressed.
+
+    Inputs:
+    :param str run_folder: path to the Run_# folder of a shard
+    :param str file_name: the name of the uncompressed output file
+    Returns:
+    :returns: str run_file: the path of the file or None if it does not exist
+    """
+
+    extensions = [""] + list(compressed_io.COMPRESSION_EXTENSIONS.values())
+    for extension in extensions:
+        run_file = run_folder + os.sep + file_name + extension
+        if os.path.exists(run_file):
+            return run_file
+    return None
+
+
+def merge_file(run_files, output_file):
+    """
+    Concatenate one output file of every run in input order.
+
+    Inputs:
+    :param list run_files: the paths of the file of every run sorted by
+        start_line
+    :param str output_file: the path of the merged file. It is compressed if
+        it ends with .gz or .zst
+    Returns:
+    :returns: str output_file: the path of the merged file
+    """
+
+    with compressed_io.open_text_for_writing(output_file) as output:
+        for run_file in run_files:
+            for line in compressed_io.iter_lines(run_file):
+                if line.strip() == "":
+                    continue
+                output.write(line + "\n")
+
+    return output_file
+
+
+def start_run_main(vars):
+    """
+    This will run the main arguments for the script.
+
+    Inputs:
+    :param dict vars: dictionary of user variables.
+    """
+
+    run_infos = [get_run_line_range(x) for x in vars["run_folders"]]
+    run_infos.sort(key=lambda x: (x[1], x[2]))
+    check_run_coverage(run_infos)
+
+    for file_name in MERGED_FILES:
+        run_files = [find_run_file(x[4], file_name) for x in run_infos]
+        if None in run_files:
+            if len([x for x in run_files if x is not None]) != 0:
+                print("WARNING: {} is missing from some runs. Skipping it.".format(
+                    file_name
+                ))
+            continue
+        # keep the compression of the first run's file
+        output_file = vars["output_folder"] + os.sep + file_name + \
+            run_files[0][len(run_infos[0][4] + os.sep + file_name):]
+        merge_file(run_files, output_file)
+        print("Merged {} runs into:\n\t{}".format(len(run_infos), output_file))
+
+
+def get_arguments_from_argparse(args_dict):
+    """
+    This function handles the arg parser arguments for the script.
+
+    Inputs:
+    :param dict args_dict: dictionary of parameters
+    Returns:
+    :returns: dict args_dict: dictionary of parameters
+    """
+
+    run_folders = []
+    for run_folder in args_dict["run_folders"]:
+        if os.path.isdir(run_folder) is False:
+            raise Exception("provided run folder is not a directory: {}".format(
+                run_folder
+            ))
+        run_folders.append(os.path.abspath(run_folder))
+    args_dict["run_folders"] = run_folders
+
+    if os.path.exists(args_dict["output_folder"]) is False:
+        try:
+            os.makedirs(args_dict["output_folder"])
+        except:
+            pass
+        if os.path.exists(args_dict["output_folder"]) is False:
+            raise Exception("output_folder could not be made or found.")
+    elif os.path.isdir(args_dict["output_folder"]) is False:
+        raise Exception("output_folder needs to be a directory.")
+    args_dict["output_folder"] = os.path.abspath(args_dict["output_folder"])
+
+    return args_dict
+#
+
+# Argument parsing
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument(
+    '--run_folders', '-r', required=True, nargs="+",
+    help='Paths to the Run_# folders of the shard runs to merge.'
+)
+PARSER.add_argument(
+    '--output_folder', '-o', required=True, default=None,
+    help='Path to folder where the merged files are written.'
+)
+
+if __name__ == "__main__":
+    ARGS_DICT = vars(PARSER.parse_args())
+    ARGS_DICT = get_arguments_from_argparse(ARGS_DICT)
+
+    # Running merge
+    start_run_main(ARGS_DICT)
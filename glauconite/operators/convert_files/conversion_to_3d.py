@@ -4,6 +4,9 @@ Run file type conversions from .smi to .sdf to .pdb
 import __future__
 
 import glob
+import io
+import math
+import multiprocessing
 import sys
 import os
 from os.path import basename
@@ -11,6 +14,7 @@ from os.path import basename
 import rdkit
 import rdkit.Chem as Chem
 from func_timeout import func_timeout
+from func_timeout import FunctionTimedOut
 
 # Disable the unnecessary RDKit warnings
 rdkit.RDLogger.DisableLog("rdApp.*")
@@ -30,49 +34,60 @@ GYPSUM_GYPSUM_DIR = (
 sys.path.extend([GYPSUM_DIR, CURRENT_DIR, GYPSUM_GYPSUM_DIR])
 
 import glauconite.operators.convert_files.gypsum_dl.gypsum_dl.MolObjectHandling as MOH
+import glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Steps.IO.MolLibrary as MolLibrary
+import glauconite.operators.file_io.compressed_io as compressed_io
+import glauconite.operators.file_io.pose_shards as pose_shards
+from glauconite.operators.convert_files.deadline_pool import DeadlinePool
 from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Start import prepare_molecules
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Start import set_parameters
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Start import set_up_in_process_params
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Start import make_mol_containers
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Start import execute_gypsum_dl
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Utils import slug
+from glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Steps.IO.SaveToSDF import save_params_to_sdf
 
+# The PoseShardWriter of each process, by (process ID, shard folder)
+POSE_SHARD_WRITERS = {}
 
+# The manifest of the 3D models written by the Gypsum-DL workers. One line
+# per variant, in the order of the input ligands:
+#   ligand_id   variant   file   byte_offset   byte_length   final_SMILES
+# file is relative to the output directory. For a PDB the offset is 0 and the
+# length is the size of the file; for a shard it locates the pose in the shard
+MANIFEST_3D_FILE_NAME = "3D_Manifest.tsv"
 
-class StdoutRedirection:
-    """Standard output redirection context manager
+# Gypsum-DL imports its own modules as gypsum_dl.X, so these are imported the
+# same way to share the log sink and the ContainerResult class with it.
+import gypsum_dl.Utils as gypsum_utils
+import gypsum_dl.ContainerResult as gypsum_results
 
-    Class taken from
-    https://stackoverflow.com/questions/4110891/how-to-redirect-the-output-of-print-to-a-txt-file
-    """
 
-    def __init__(self, path):
-        """
-        Inputs:
-        :param str path: the path
-        """
-        self._path = path
 
-    def __enter__(self):
-        """
-        This will return the class self object
-        and flush the print statements.
+def write_gypsum_failure_log(gypsum_log_path, lig_id, log_text, error=None):
+    """
+    Write the captured Gypsum-DL log of a ligand which failed to convert.
+    Logs are only written for failures.
 
-        Returns:
-        :returns: self self: class self object
-        """
-        sys.stdout.flush()
-        sys.stdout = open(self._path, mode="w")
-        sys.stdout.flush()
-        return self
+    Inputs:
+    :param str gypsum_log_path: a path to the folder to place the log files
+    :param str lig_id: the name of the ligand
+    :param str log_text: the captured log messages of Gypsum-DL for this
+        ligand
+    :param str error: optional description of the error (ie. TIMEOUT)
+    """
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """
-        Exit the output piping
+    if os.path.exists(gypsum_log_path) is False:
+        try:
+            os.makedirs(gypsum_log_path)
+        except:
+            # Another worker may have just made it
+            pass
 
-        Inputs:
-        :param obj exc_type: exc_type
-        :param obj exc_val: exc_val
-        :param obj exc_tb: exc_tb
-        """
-        sys.stdout.flush()
-        sys.stdout.close()
-        sys.stdout = sys.__stdout__
+    log_file = "{}{}_log.txt".format(gypsum_log_path, lig_id)
+    with open(log_file, "w") as f:
+        f.write(log_text)
+        if error is not None:
+            f.write("\n" + str(error) + "\n")
 
 
 def convert_to_3d(vars, smi_file, smile_file_directory):
@@ -81,9 +96,18 @@ def convert_to_3d(vars, smi_file, smile_file_directory):
     SMILES in an .smi file to 3D .sdf files Then rdkit converts the sdfs to
     PDB files.
 
+    When Gypsum-DL is run in batches (vars["gypsum_batch_size"] > 0) the
+    workers write the PDB files (and the .sdf files unless
+    vars["skip_3d_sdfs"]) straight from the 3D models in memory, so no
+    separate SDF to PDB conversion is needed. With
+    vars["output_3d_format"] == "sdf_shards" the workers instead pack the 3D
+    models into multi-record .sdf shards in the 3D_Shards folder (see
+    glauconite.operators.file_io.pose_shards).
+
     Inputs:
     :param dict vars: User variables which will govern how the programs runs
-    :param str smi_file: the file name of the .smi file
+    :param str smi_file: the file name of the .smi (or .mlib molecule library)
+        file
     :param srt smile_file_directory: the directory path which contains the
         .smi file
     """
@@ -95,6 +119,10 @@ def convert_to_3d(vars, smi_file, smile_file_directory):
     )
     print("CONVERTING SMILES TO SDF COMPLETED")
 
+    if vars["gypsum_batch_size"] > 0:
+        # The PDBs (or shards) were written by the Gypsum-DL workers
+        return
+
     print("CONVERTING SDF TO PDB")
     # convert sdf files to PDBs using rdkit
     convert_sdf_to_pdbs(vars, smile_file_directory, gypsum_output_folder_path)
@@ -103,9 +131,11 @@ def convert_to_3d(vars, smi_file, smile_file_directory):
 
 def convert_smi_to_sdfs_with_gypsum(vars, gen_smiles_file, smile_file_directory):
     """
-    Convert a file of SMILES to a set of 3d .sdf files using Gypsum. This does
-    so by making a set of .json files for running Gypsum for every ligand in
-    the .smi file.
+    Convert a file of SMILES to a set of 3d .sdf files using Gypsum. The
+    ligands are handed to Gypsum in memory, either in batches (see
+    vars["gypsum_batch_size"]) or as a set of parameter dictionaries, one for
+    every ligand in the .smi file. Logs are only saved for ligands which
+    failed.
 
     This will print out the list of ligands which failed to convert to 3D.
 
@@ -128,21 +158,43 @@ def convert_smi_to_sdfs_with_gypsum(vars, gen_smiles_file, smile_file_directory)
     pka_precision = vars["pka_precision"]
     gypsum_timeout_limit = vars["gypsum_timeout_limit"]
 
-    # Make a new folder to put gypsum .smi's and json. Name folder
-    # gypsum_submission_files.
-    folder_path = "{}gypsum_submission_files{}".format(smile_file_directory, os.sep)
-    if os.path.exists(folder_path) is False:
-        os.makedirs(folder_path)
-
     # Make Output for Gypsum folder (where .sdf's go)
     gypsum_output_folder_path = "{}3D_SDFs{}".format(smile_file_directory, os.sep)
     if os.path.exists(gypsum_output_folder_path) is False:
         os.makedirs(gypsum_output_folder_path)
 
-    # Make a folder to put the log files into within the 3D_SDFs folder
+    # The folder for the log files of ligands which failed within the
+    # 3D_SDFs folder. It is only made if a ligand fails.
     gypsum_log_path = "{}log{}".format(gypsum_output_folder_path, os.sep)
-    if os.path.exists(gypsum_log_path) is False:
-        os.makedirs(gypsum_log_path)
+
+    # Only for debugging, make a new folder to put a gypsum .smi for each
+    # ligand. Name folder gypsum_submission_files. The ligands are handed to
+    # Gypsum in memory either way.
+    folder_path = None
+    if vars["save_gypsum_submission_files"] is True:
+        folder_path = "{}gypsum_submission_files{}".format(
+            smile_file_directory, os.sep
+        )
+        if os.path.exists(folder_path) is False:
+            os.makedirs(folder_path)
+
+    if vars["gypsum_batch_size"] > 0:
+        # Hand each worker a batch of ligands to run in-process. The workers
+        # also write the PDBs or shards
+        output_3d = get_output_3d_settings(vars, smile_file_directory)
+        if os.path.isdir(output_3d[1]) is False:
+            os.makedirs(output_3d[1])
+        lig_failed_to_convert = convert_batches_with_gypsum(
+            vars,
+            gen_smiles_file,
+            gypsum_output_folder_path,
+            gypsum_log_path,
+            output_3d,
+            smile_file_directory + MANIFEST_3D_FILE_NAME,
+            folder_path,
+        )
+        print_ligands_failed_to_convert(lig_failed_to_convert, gypsum_log_path)
+        return gypsum_output_folder_path
 
     # Make All of the json files to submit to gypsum
     list_of_gypsum_params = make_smi_and_gyspum_params(
@@ -156,6 +208,15 @@ def convert_smi_to_sdfs_with_gypsum(vars, gen_smiles_file, smile_file_directory)
         pka_precision,
     )
 
+    # Write the gypsum_dl_params.sdf once rather than once per ligand
+    if len(list_of_gypsum_params) > 0:
+        write_gypsum_params_sdf(
+            dict(list_of_gypsum_params[0], source=gen_smiles_file),
+            gypsum_output_folder_path,
+        )
+    for gypsum_params in list_of_gypsum_params:
+        gypsum_params["skip_params_sdf"] = True
+
     # create a the job_inputs to run gypsum in multithread
     job_input = tuple(
         [
@@ -172,20 +233,365 @@ def convert_smi_to_sdfs_with_gypsum(vars, gen_smiles_file, smile_file_directory)
 
 
     sys.stdout.flush()
-    failed_to_convert = vars["parallelizer"].run(
-        job_input, run_gypsum_multiprocessing
+    results = vars["parallelizer"].run(job_input, run_gypsum_multiprocessing)
+    sys.stdout.flush()
+
+    lig_failed_to_convert = handle_gypsum_results(
+        [x for x in results if x is not None], gypsum_log_path
     )
+    print_ligands_failed_to_convert(lig_failed_to_convert, gypsum_log_path)
+    return gypsum_output_folder_path
+
+
+def handle_gypsum_results(results, gypsum_log_path):
+    """
+    Summarize the ContainerResults reported by the Gypsum workers and write
+    the logs of the ligands which failed.
+
+    Inputs:
+    :param list results: list of gypsum_dl ContainerResult objects, one per
+        ligand
+    :param str gypsum_log_path: a path to the folder to place the log files
+        of ligands which failed
+
+    Returns:
+    :returns: list lig_failed_to_convert: the ContainerResults of the
+        ligands which failed to convert
+    """
+
+    status_counts = {}
+    num_variants = 0
+    lig_failed_to_convert = []
+    for result in results:
+        status_counts[result.status] = status_counts.get(result.status, 0) + 1
+        num_variants = num_variants + result.num_variants
+        if result.succeeded():
+            continue
+
+        lig_failed_to_convert.append(result)
+        log_text = "\n".join(result.log) if result.log is not None else ""
+        error = result.status.upper()
+        if result.error is not None:
+            error = "{}: {}".format(error, result.error)
+        write_gypsum_failure_log(gypsum_log_path, result.name, log_text, error)
+
+    if len(results) > 0:
+        printout = "Gypsum-DL made {} 3D variants of {} ligands (".format(
+            num_variants, len(results)
+        )
+        printout = printout + ", ".join(
+            ["{}: {}".format(status, count)
+             for status, count in sorted(status_counts.items())]
+        )
+        print(printout + ")")
+
+    return lig_failed_to_convert
+
+
+def print_ligands_failed_to_convert(lig_failed_to_convert, gypsum_log_path):
+    """
+    Print the lists of ligands which failed to convert to 3D, grouped by the
+    status Gypsum-DL reported for them (ie. the ligands which timed out are
+    listed apart from those which hit an error).
+
+    Inputs:
+    :param list lig_failed_to_convert: the gypsum_dl ContainerResults of the
+        ligands which failed
+    :param str gypsum_log_path: the path to the folder with the log files of
+        the ligands which failed
+    """
+
+    names_by_status = {}
+    for result in lig_failed_to_convert:
+        names = names_by_status.setdefault(result.status, [])
+        if result.name not in names:
+            names.append(result.name)
+
+    timed_out = names_by_status.pop(gypsum_results.STATUS_TIMEOUT, [])
+    if len(timed_out) > 0:
+        print("The Following ligands Timed out in Gypsum (gypsum_timeout_limit)")
+        print(timed_out)
+
+    errors = names_by_status.pop(gypsum_results.STATUS_ERROR, [])
+    if len(errors) > 0:
+        print("The Following ligands Failed to convert in Gypsum with an error")
+        print("See the logs of these ligands in {}".format(gypsum_log_path))
+        print(errors)
+
+    # Ligands which Gypsum-DL rejected or made no variants of
+    for status, names in sorted(names_by_status.items()):
+        print("The Following ligands Failed to convert in Gypsum ({})".format(
+            status
+        ))
+        print(names)
     sys.stdout.flush()
 
 
-    lig_failed_to_convert = [x for x in failed_to_convert if x is not None]
-    lig_failed_to_convert = list(set(lig_failed_to_convert))
-    if len(lig_failed_to_convert) > 0:
-        print("The Following ligands Failed to convert in Gypsum")
-        print("Likely due to a Timeout")
-        print(lig_failed_to_convert)
+def get_output_3d_settings(vars, smile_file_directory):
+    """
+    Get how the Gypsum-DL workers write the 3D models.
+
+    Inputs:
+    :param dict vars: User variables which will govern how the programs runs
+    :param srt smile_file_directory: the directory path which contains the
+        .smi file
+
+    Returns:
+    :returns: list output_3d: [output_3d_format, output_folder,
+        poses_per_shard]. output_3d_format is "pdb" (a PDB file per variant in
+        the PDBs folder) or "sdf_shards" (multi-record .sdf shards in the
+        3D_Shards folder)
+    """
+
+    if vars["output_3d_format"] == "sdf_shards":
+        output_folder = smile_file_directory + "3D_Shards" + os.sep
+    else:
+        output_folder = smile_file_directory + "PDBs" + os.sep
+    return [vars["output_3d_format"], output_folder, vars["poses_per_shard"]]
+
+
+def convert_batches_with_gypsum(vars, gen_smiles_file, gypsum_output_folder_path,
+                                gypsum_log_path, output_3d, manifest_file,
+                                folder_path=None):
+    """
+    Convert the ligands of a .smi (or .mlib) file to 3D .sdf files by handing
+    each worker a batch of ligands as in-memory (SMILES, name, mol_binary)
+    tuples. Each worker sets up the Gypsum-DL parameters once per batch and
+    runs execute_gypsum_dl on one ligand at a time, so every ligand still has
+    its own timeout and is reported individually if it fails. No per-ligand
+    .smi/.json submission files are made.
+
+    Right after each ligand is converted, its worker writes a PDB file for
+    every variant (see write_pdbs_of_containers) or adds the variants to its
+    .sdf shard (see write_pose_shards_of_containers). Gypsum-DL does not
+    write the per-ligand .sdf files if vars["skip_3d_sdfs"] is True or the
+    variants are written to shards. Where every variant was written is
+    reported back by the workers and saved in the manifest_file, in the
+    order of the input ligands.
+
+    With vars["gypsum_timeout_mode"] == "process" the batches are run by a
+    DeadlinePool: a worker process running a ligand past the timeout is
+    terminated and replaced, and the rest of its batch is re-queued. MPI
+    runs (and "thread" mode) use func_timeout within the Parallelizer's
+    workers instead.
+
+    The gypsum_dl_params.sdf is written once here rather than once per
+    ligand.
+
+    Inputs:
+    :param dict vars: User variables which will govern how the programs runs
+    :param str gen_smiles_file: the file name of the .smi or .mlib file to be
+        converted to 3D sdf's
+    :param str gypsum_output_folder_path: a path to the folder with all of the
+        3D sdf's created by gypsum.
+    :param str gypsum_log_path: a path to the folder to place the log files
+        of ligands which failed
+    :param list output_3d: how to write the 3D models (see
+        get_output_3d_settings)
+    :param str manifest_file: the path of the manifest of the 3D models
+        (see MANIFEST_3D_FILE_NAME)
+    :param str folder_path: the directory path to save a debugging .smi file
+        for each ligand in, or None to not save them
+
+    Returns:
+    :returns: list lig_failed_to_convert: the gypsum_dl ContainerResults of
+        the ligands which failed to convert
+    """
+
+    ligands = [
+        (smile, get_abridged_ligand_name(ligand_name), mol_binary)
+        for smile, ligand_name, mol_binary in iter_ligands_to_convert(gen_smiles_file)
+    ]
+    if folder_path is not None:
+        for smile, lig_name_short, mol_binary in ligands:
+            save_submission_file(folder_path, smile, lig_name_short, mol_binary)
+    if len(ligands) == 0:
+        write_3d_manifest([], manifest_file)
+        return []
+
+    gypsum_params = make_gypsum_params(
+        gen_smiles_file,
+        gypsum_output_folder_path,
+        vars["max_variants_per_compound"],
+        vars["gypsum_thoroughness"],
+        vars["min_ph"],
+        vars["max_ph"],
+        vars["pka_precision"],
+    )
+    write_gypsum_params_sdf(gypsum_params, gypsum_output_folder_path)
+    add_batch_gypsum_params(vars, gypsum_params, output_3d)
+
+    batch_size = get_gypsum_batch_size(vars, len(ligands))
+    if vars["gypsum_timeout_mode"] == "process" and \
+            vars["parallelizer"].return_mode() != "mpi":
+        pool = DeadlinePool(
+            vars["parallelizer"].num_procs,
+            vars["gypsum_timeout_limit"],
+            set_up_gypsum_worker,
+            (gypsum_params, output_3d),
+            run_gypsum_ligand_in_worker,
+            make_failed_gypsum_result,
+        )
+        sys.stdout.flush()
+        batch_results = pool.run(
+            [ligands[i:i + batch_size] for i in range(0, len(ligands), batch_size)]
+        )
+        sys.stdout.flush()
+        finish_pose_shards(output_3d)
+        write_3d_manifest(batch_results, manifest_file)
+        return handle_gypsum_results(batch_results, gypsum_log_path)
+
+    job_input = tuple(
+        [
+            tuple(
+                [
+                    gypsum_log_path,
+                    gypsum_params,
+                    ligands[i:i + batch_size],
+                    vars["gypsum_timeout_limit"],
+                    output_3d,
+                ]
+            )
+            for i in range(0, len(ligands), batch_size)
+        ]
+    )
+
     sys.stdout.flush()
-    return gypsum_output_folder_path
+    results = vars["parallelizer"].run(job_input, run_gypsum_batch)
+    sys.stdout.flush()
+    finish_pose_shards(output_3d)
+
+    batch_results = []
+    for results_of_batch in results:
+        if results_of_batch is not None:
+            batch_results.extend(results_of_batch)
+
+    write_3d_manifest(batch_results, manifest_file)
+    return handle_gypsum_results(batch_results, gypsum_log_path)
+
+
+def add_batch_gypsum_params(vars, gypsum_params, output_3d):
+    """
+    Add the Gypsum-DL parameters which only apply when the ligands are
+    converted in batches (see convert_batches_with_gypsum). The workers write
+    the 3D models themselves, and the gypsum_dl_params.sdf is written once
+    for the whole run.
+
+    Inputs:
+    :param dict vars: User variables which will govern how the programs runs
+    :param dict gypsum_params: the Gypsum-DL parameters (see
+        make_gypsum_params). They are changed in place
+    :param list output_3d: how to write the 3D models (see
+        get_output_3d_settings)
+    """
+
+    gypsum_params["skip_params_sdf"] = True
+    gypsum_params["skip_sdf_output"] = vars["skip_3d_sdfs"] or \
+        output_3d[0] == "sdf_shards"
+    # Optionally embed all of the conformers of a ligand in one
+    # EmbedMultipleConfs call and minimize them in one force-field call
+    gypsum_params["embed_multiple_confs"] = vars["gypsum_embed_multiple_confs"]
+    gypsum_params["embed_num_threads"] = vars["gypsum_embed_threads"]
+    gypsum_params["batch_minimize"] = vars["gypsum_batch_minimize"]
+    gypsum_params["minimize_num_threads"] = vars["gypsum_embed_threads"]
+    gypsum_params["force_field"] = vars["gypsum_force_field"]
+    gypsum_params["minimize_max_iters"] = vars["gypsum_minimize_max_iters"]
+    # Optionally enumerate the most probable ionization states first
+    gypsum_params["best_first_protonation"] = vars["gypsum_best_first_protonation"]
+    gypsum_params["tautomer_backend"] = vars["gypsum_tautomer_backend"]
+    gypsum_params["template_embedding"] = vars["gypsum_template_embedding"]
+    gypsum_params["adaptive_sampling"] = vars["gypsum_adaptive_sampling"]
+
+
+def write_3d_manifest(results, manifest_file):
+    """
+    Write the manifest of the 3D models from the outputs the workers
+    reported in the ContainerResults, in the order of the results.
+
+    Inputs:
+    :param list results: list of gypsum_dl ContainerResult objects, one per
+        ligand in the order of the input ligands
+    :param str manifest_file: the path of the manifest (see
+        MANIFEST_3D_FILE_NAME)
+    """
+
+    output_directory = os.path.dirname(manifest_file)
+    with open(manifest_file, "w") as f:
+        for result in results:
+            if result is None or result.outputs is None:
+                continue
+            for ligand_id, variant, file_path, offset, length, final_smiles in result.outputs:
+                f.write("\t".join([
+                    str(ligand_id), str(variant),
+                    os.path.relpath(file_path, output_directory),
+                    str(offset), str(length), str(final_smiles)
+                ]) + "\n")
+
+
+def iter_3d_manifest(manifest_file):
+    """
+    Iterate through the manifest of the 3D models.
+
+    Inputs:
+    :param str manifest_file: the path of the manifest (see
+        MANIFEST_3D_FILE_NAME)
+
+    Returns:
+    :returns: generator entries: yields [ligand_id, variant, file_path,
+        byte_offset, byte_length, final_smiles] for every variant, with
+        file_path relative to the directory of the manifest
+    """
+
+    with open(manifest_file) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line == "":
+                continue
+            ligand_id, variant, file_path, offset, length, final_smiles = \
+                line.split("\t")
+            yield [ligand_id, int(variant), file_path, int(offset),
+                   int(length), final_smiles]
+
+
+def write_gypsum_params_sdf(gypsum_params, gypsum_output_folder_path):
+    """
+    Write the gypsum_dl_params.sdf describing the Gypsum-DL parameters of the
+    run. This is done once here so the workers can skip it for every ligand.
+
+    Inputs:
+    :param dict gypsum_params: the Gypsum-DL parameters. The "source" should
+        be the file name of the ligands
+    :param str gypsum_output_folder_path: a path to the folder with all of the
+        3D sdf's created by gypsum.
+    """
+
+    save_params_to_sdf(
+        set_parameters(gypsum_params),
+        gypsum_output_folder_path + "gypsum_dl_params.sdf"
+    )
+
+
+def get_gypsum_batch_size(vars, num_ligands):
+    """
+    Get how many ligands to hand each worker at a time. This is
+    vars["gypsum_batch_size"] unless there are too few ligands to give every
+    processor a full batch, in which case the ligands are split evenly
+    between the processors.
+
+    Inputs:
+    :param dict vars: User variables which will govern how the programs runs
+    :param int num_ligands: the number of ligands to convert
+
+    Returns:
+    :returns: int batch_size: the number of ligands per batch
+    """
+
+    num_processors = vars["number_of_processors"]
+    if num_processors is None or num_processors < 1:
+        num_processors = multiprocessing.cpu_count()
+    ligands_per_processor = int(math.ceil(float(num_ligands) / num_processors))
+
+    return max(1, min(int(vars["gypsum_batch_size"]), ligands_per_processor))
 
 
 def make_smi_and_gyspum_params(gen_smiles_file, folder_path,
@@ -193,17 +599,22 @@ def make_smi_and_gyspum_params(gen_smiles_file, folder_path,
                                gypsum_thoroughness, min_ph, max_ph,
                                pka_precision):
     """
-    Make an individual .smi file and parameter dictionary to submit to Gypsum
-    for every ligand in the generation_*_to_convert.smi file.
+    Make a parameter dictionary to submit to Gypsum for every ligand in the
+    generation_*_to_convert.smi file.
+
+    The ligand is noted within the dictionary as "source" as a list holding a
+    single (SMILES, name, mol_binary) tuple, so no file needs to be read.
+    mol_binary is the already parsed mol if gen_smiles_file is a binary
+    molecule library (.mlib) and None otherwise.
 
-    The .smi file for each ligand will be noted within the dictionary as
-    "source".
+    If folder_path is not None an individual .smi (or single-record .mlib)
+    file is also saved there for each ligand, for debugging.
 
     Inputs:
-    :param str gen_smiles_file: the file name of the .smi file to be converted
-        to 3D sdf's
-    :param srt folder_path: the directory path which will contain the inputs
-        and outputs from Gypsum
+    :param str gen_smiles_file: the file name of the .smi or .mlib file to be
+        converted to 3D sdf's
+    :param srt folder_path: the directory path to save a debugging .smi file
+        for each ligand in, or None to not save them
     :param str gypsum_output_folder_path: a path to the folder with all of the
         3D sdf's created by gypsum.
     :param int max_variance: User variable for how many conformers per ligand
@@ -225,91 +636,211 @@ def make_smi_and_gyspum_params(gen_smiles_file, folder_path,
     """
     list_of_gypsum_params = []
 
-    with open(gen_smiles_file) as smiles_file:
-        for line in smiles_file:
-            if line == "\n":
-                continue
-            line = line.replace("\n", "")
-            line = line.replace("    ", "\t")
-            parts = line.split("\t")  # split line into parts separated by 4-spaces
-            if len(parts) == 0 or len(parts) == 1:
-                print(parts)
-            smile = parts[0]
-            # ligand_name example
-            # (Gen_30_Cross_639427+Gen_31_Cross_717928)Gen_34_Cross_709666 But
-            # bash doesn't like + or () for file names so we will abridge
-            # lig_name_short name for above example becomes
-            # Gen_34_Cross_709666 if ligand is from the source files we wont
-            # split the name
-
-            ligand_name = parts[1]
-            if len(ligand_name.split(")")) == 2:
-                lig_name_short = ligand_name.split(")")[1]
-            elif len(ligand_name.split(")")) == 1:
-                lig_name_short = ligand_name
-            else:
-                printout = "Ligand name failed to abridge. Smiles may be \
-                            named in improper format please separate with _ \
-                            or camelcase. Our formatting is: \
-                            (Gen_2_Cross_631+Gen_3_Cross_744)Gen_4_Cross_702 \
-                            which reads as Gen_34_Cross_702 (aka ligand 702) \
-                            was produced by crossover using ligands: \
-                            Gen_2_Cross_631 and Gen_3_Cross_744. \
-                            This will abridge to Gen_4_Cross_702 for saving \
-                            files.\nThe failed ligand name was \
-                            {}".format(ligand_name)
-
-                print(printout)
-                raise Exception(printout)
-
-            smi_line = "{}\t{}".format(smile, lig_name_short)
-
-            smi_path = "{}{}.smi".format(folder_path, lig_name_short)
-
-            # make .smi file
-            with open(smi_path, "w") as smi_file:
-                smi_file.write(smi_line)
-
-            # Make .json file
-            gypsum_params = {
-                "source": smi_path,
-                "output_folder": gypsum_output_folder_path,
-                "num_processors": 1,
-                "job_manager": "serial",
-                "use_durrant_lab_filters": True,
-                "max_variants_per_compound": max_variance,
-                "thoroughness": gypsum_thoroughness,
-                "separate_output_files": True,
-                "add_pdb_output": False,
-                "add_html_output": False,
-                "min_ph": min_ph,
-                "max_ph": max_ph,
-                "pka_precision": pka_precision,
-                "skip_optimize_geometry": False,
-                "skip_alternate_ring_conformations": False,
-                "skip_adding_hydrogen": False,
-                "skip_making_tautomers": False,
-                "skip_enumerate_chiral_mol": False,
-                "skip_enumerate_double_bonds": False,
-                "let_tautomers_change_chirality": False,
-                "2d_output_only": False,
-                "cache_prerun": False,
-                "test": False,
-            }
-
-            list_of_gypsum_params.append(gypsum_params)
+    for smile, ligand_name, mol_binary in iter_ligands_to_convert(gen_smiles_file):
+        lig_name_short = get_abridged_ligand_name(ligand_name)
+
+        if folder_path is not None:
+            save_submission_file(
+                folder_path, smile, lig_name_short, mol_binary
+            )
+
+        # Make .json file
+        gypsum_params = make_gypsum_params(
+            [(smile, lig_name_short, mol_binary)],
+            gypsum_output_folder_path,
+            max_variance,
+            gypsum_thoroughness,
+            min_ph,
+            max_ph,
+            pka_precision,
+        )
+
+        list_of_gypsum_params.append(gypsum_params)
 
     return list_of_gypsum_params
 
 
+def save_submission_file(folder_path, smile, lig_name_short, mol_binary=None):
+    """
+    Save the input of a single ligand as a .smi file (or as a single-record
+    .mlib file if the ligand has a parsed mol) for debugging.
+
+    Inputs:
+    :param srt folder_path: the directory path to save the file in
+    :param str smile: the SMILES string of the ligand
+    :param str lig_name_short: the abridged name of the ligand
+    :param bytes mol_binary: the rdkit binary of the parsed mol or None
+
+    Returns:
+    :returns: str smi_path: the path of the saved file
+    """
+
+    if mol_binary is None:
+        smi_path = "{}{}.smi".format(folder_path, lig_name_short)
+        with open(smi_path, "w") as smi_file:
+            smi_file.write("{}\t{}".format(smile, lig_name_short))
+    else:
+        smi_path = "{}{}{}".format(
+            folder_path, lig_name_short, MolLibrary.MOL_LIBRARY_EXTENSION
+        )
+        MolLibrary.write_mol_library(
+            smi_path, [(smile, lig_name_short, mol_binary)]
+        )
+
+    return smi_path
+
+
+def make_gypsum_params(source, gypsum_output_folder_path, max_variance,
+                       gypsum_thoroughness, min_ph, max_ph, pka_precision):
+    """
+    Make the Gypsum-DL parameter dictionary used to convert ligands to 3D.
+
+    Inputs:
+    :param str source: the source of the ligands. A file name or a list of
+        (SMILES, name, ...) tuples
+    :param str gypsum_output_folder_path: a path to the folder with all of the
+        3D sdf's created by gypsum.
+    :param int max_variance: User variable for how many conformers per ligand
+        should be made by Gypsum
+    :param int gypsum_thoroughness: User variable for How widely Gypsum-DL
+        will search for low-energy conformers
+    :param float min_ph: User variable for Minimum pH to consider by
+        Dimorphite-DL
+    :param float max_ph: User variable for Maximum pH to consider by
+        Dimorphite-DL
+    :param float pka_precision: User variable for Size of pH substructure
+        ranges by Dimorphite-DL
+
+    Returns:
+    :returns: dict gypsum_params: the Gypsum-DL parameters
+    """
+
+    gypsum_params = {
+        "source": source,
+        "output_folder": gypsum_output_folder_path,
+        "num_processors": 1,
+        "job_manager": "serial",
+        "use_durrant_lab_filters": True,
+        "max_variants_per_compound": max_variance,
+        "thoroughness": gypsum_thoroughness,
+        "separate_output_files": True,
+        "add_pdb_output": False,
+        "add_html_output": False,
+        "min_ph": min_ph,
+        "max_ph": max_ph,
+        "pka_precision": pka_precision,
+        "skip_optimize_geometry": False,
+        "skip_alternate_ring_conformations": False,
+        "skip_adding_hydrogen": False,
+        "skip_making_tautomers": False,
+        "skip_enumerate_chiral_mol": False,
+        "skip_enumerate_double_bonds": False,
+        "let_tautomers_change_chirality": False,
+        "2d_output_only": False,
+        "cache_prerun": False,
+        "test": False,
+    }
+
+    return gypsum_params
+
+
+def iter_ligands_to_convert(gen_smiles_file):
+    """
+    Iterate through the ligands which should be converted to 3D. This can be
+    either a tab (or 4-space) delineated .smi file (which may be compressed,
+    ie. .smi.gz or .smi.zst) or a binary molecule library
+    (.mlib) containing the already parsed and sanitized mols.
+
+    Inputs:
+    :param str gen_smiles_file: the file name of the .smi or .mlib file to be
+        converted to 3D sdf's
+
+    Returns:
+    :returns: generator ligands: a generator of tuples (SMILES, ligand name,
+        rdkit binary mol). The rdkit binary mol is None for .smi files.
+    """
+
+    if MolLibrary.is_mol_library_file(gen_smiles_file):
+        for smile, ligand_name, mol_binary in MolLibrary.iter_mol_library(gen_smiles_file):
+            yield smile, ligand_name, mol_binary
+        return
+
+    # .smi.gz and .smi.zst files are decompressed while they are read
+    for line in compressed_io.iter_lines(gen_smiles_file):
+        if line == "":
+            continue
+        line = line.replace("    ", "\t")
+        parts = line.split("\t")  # split line into parts separated by 4-spaces
+        if len(parts) == 0 or len(parts) == 1:
+            print(parts)
+        yield parts[0], parts[1], None
+
+
+def get_abridged_ligand_name(ligand_name):
+    """
+    Abridge a ligand name so it can be used in file names.
+
+    ligand_name example
+    (Gen_30_Cross_639427+Gen_31_Cross_717928)Gen_34_Cross_709666 But
+    bash doesn't like + or () for file names so we will abridge
+    lig_name_short name for above example becomes
+    Gen_34_Cross_709666 if ligand is from the source files we wont
+    split the name
+
+    Inputs:
+    :param str ligand_name: the full name of the ligand
+
+    Returns:
+    :returns: str lig_name_short: the abridged name of the ligand
+    """
+
+    if len(ligand_name.split(")")) == 2:
+        lig_name_short = ligand_name.split(")")[1]
+    elif len(ligand_name.split(")")) == 1:
+        lig_name_short = ligand_name
+    else:
+        printout = "Ligand name failed to abridge. Smiles may be \
+                    named in improper format please separate with _ \
+                    or camelcase. Our formatting is: \
+                    (Gen_2_Cross_631+Gen_3_Cross_744)Gen_4_Cross_702 \
+                    which reads as Gen_34_Cross_702 (aka ligand 702) \
+                    was produced by crossover using ligands: \
+                    Gen_2_Cross_631 and Gen_3_Cross_744. \
+                    This will abridge to Gen_4_Cross_702 for saving \
+                    files.\nThe failed ligand name was \
+                    {}".format(ligand_name)
+
+        print(printout)
+        raise Exception(printout)
+
+    return lig_name_short
+
+
+def add_gypsum_to_sys_path():
+    """
+    Make sure Gypsum-DL can be imported in a worker process. Gypsum-DL
+    imports its own modules as gypsum_dl.X so its folders need to be on the
+    path. Folders which are already on the path are not added again.
+    """
+
+    current_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    gypsum_dir = (
+        str(current_dir) + os.sep + "convert_files" + os.sep + "gypsum_dl" + os.sep
+    )
+    gypsum_gypsum_dir = str(gypsum_dir) + os.sep + "gypsum_dl" + os.sep
+    for path in [current_dir, gypsum_dir, gypsum_gypsum_dir]:
+        if path not in sys.path:
+            sys.path.append(path)
+
+
 def run_gypsum_multiprocessing(gypsum_log_path, gypsum_params,
                                gypsum_timeout_limit):
     """
     This converts the a single ligand from a SMILE to a 3D SDF using Gypsum.
     This is used within a multithread.
 
-    This uses a Try statement and a bash script to be able to create a timeout
-    to prevent stalling or very long conversions.
+    This uses func_timeout to be able to create a timeout to prevent stalling
+    or very long conversions.
 
     Inputs:
     :param str gypsum_log_path: a path to the folder to place the log files
@@ -321,82 +852,472 @@ def run_gypsum_multiprocessing(gypsum_log_path, gypsum_params,
         run Gypsum per ligand
 
     Returns:
-    :returns: str lig_id: the name of the ligand if it failed or None if it
-        successfully converted to 3D sdf.
+    :returns: ContainerResult result: the gypsum_dl ContainerResult of the
+        ligand. The Gypsum-DL log messages are only kept if it failed.
     """
-    current_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
-    gypsum_dir = (
-        str(current_dir) + os.sep + "convert_files" + os.sep + "gypsum_dl" + os.sep
+    add_gypsum_to_sys_path()
+
+    # The source is a single (SMILES, name, mol_binary) tuple. Hand Gypsum the
+    # parsed mol if there is one
+    smile, lig_id, mol_binary = gypsum_params["source"][0]
+    gypsum_params = dict(gypsum_params)
+    gypsum_params["source"] = get_gypsum_smiles_data(smile, lig_id, mol_binary)
+
+    return run_gypsum_with_timeout(
+        smile, lig_id, gypsum_timeout_limit, prepare_molecules, gypsum_params
     )
-    gypsum_gypsum_dir = str(gypsum_dir) + os.sep + "gypsum_dl" + os.sep
-    sys.path.extend([current_dir, gypsum_dir, gypsum_gypsum_dir])
 
 
-    lig_id = gypsum_params["source"].split(os.sep)[-1].replace(".smi", "")
-    log_file = "{}{}_log.txt".format(gypsum_log_path, lig_id)
+def run_gypsum_batch(gypsum_log_path, gypsum_params, ligand_batch,
+                     gypsum_timeout_limit, output_3d):
+    """
+    This converts a batch of ligands from SMILES to 3D SDFs using Gypsum-DL
+    within a single worker. The Gypsum-DL parameters are set up once for the
+    whole batch and execute_gypsum_dl is then run on one ligand at a time, each
+    with its own timeout.
 
-    try:
-        with StdoutRedirection(log_file):
-            func_timeout(gypsum_timeout_limit, prepare_molecules, args=(gypsum_params,))
+    Inputs:
+    :param str gypsum_log_path: a path to the folder to place the log files
+        produced when running gypsum.
+    :param dict gypsum_params: dictionary of params to be feed to Gypsum-DL
+    :param list ligand_batch: list of (SMILES, abridged name, mol_binary)
+        tuples. mol_binary is None unless the ligands came from a molecule
+        library.
+    :param int gypsum_timeout_limit: this is taken from
+        vars["gypsum_timeout_limit"]. It determines the maximum amount of time to
+        run Gypsum per ligand
+    :param list output_3d: how to write the 3D models (see
+        get_output_3d_settings)
 
-        sys.stdout.flush()
-    except:
+    Returns:
+    :returns: list results: the gypsum_dl ContainerResult of every ligand in
+        the batch
+    """
+
+    add_gypsum_to_sys_path()
+
+    gypsum_params = dict(gypsum_params)
+    gypsum_params["source"] = []
+    params = set_up_in_process_params(gypsum_params)
+
+    results = []
+    for smile, lig_id, mol_binary in ligand_batch:
+        results.append(
+            run_gypsum_with_timeout(
+                smile, lig_id, gypsum_timeout_limit, prepare_containers_in_process,
+                get_gypsum_smiles_data(smile, lig_id, mol_binary), params,
+                output_3d
+            )
+        )
+
+    return results
+
+
+def get_gypsum_smiles_data(smile, lig_id, mol_binary):
+    """
+    Make the Gypsum-DL source of a single ligand.
+
+    Inputs:
+    :param str smile: the SMILES string of the ligand
+    :param str lig_id: the abridged name of the ligand
+    :param bytes mol_binary: the binary of the parsed rdkit mol or None
+
+    Returns:
+    :returns: list smiles_data: a list of one (SMILES, name, properties) or
+        (SMILES, name, properties, rdkit.Chem.rdchem.Mol) tuple
+    """
+
+    if mol_binary is None:
+        return [(smile, lig_id, {})]
+    return [(smile, lig_id, {}, Chem.Mol(mol_binary))]
+
+
+def prepare_containers_in_process(smiles_data, params, output_3d):
+    """
+    Make the molecule container of a ligand and run execute_gypsum_dl on it
+    with parameters which were already set up (see set_up_in_process_params).
+    The 3D models of its variants are then written from memory.
+
+    Inputs:
+    :param list smiles_data: the Gypsum-DL source of the ligand (see
+        get_gypsum_smiles_data)
+    :param dict params: the Gypsum-DL parameters
+    :param list output_3d: how to write the 3D models (see
+        get_output_3d_settings)
+
+    Returns:
+    :returns: list results: the gypsum_dl ContainerResult of the ligand
+    """
+
+    results = []
+    contnrs = make_mol_containers(smiles_data, results)
+    if len(contnrs) != 0:
+        contnr_results = execute_gypsum_dl(contnrs, params)
+        output_3d_format, output_folder, poses_per_shard = output_3d
+        if output_3d_format == "sdf_shards":
+            outputs = write_pose_shards_of_containers(
+                contnrs, output_folder, poses_per_shard
+            )
+        else:
+            outputs = write_pdbs_of_containers(contnrs, output_folder)
+
+        # Report where the variants were written for the manifest
+        for result in contnr_results:
+            ligand_id = slug(result.name)
+            result.outputs = [x for x in outputs if x[0] == ligand_id]
+        results.extend(contnr_results)
+
+    return results
+
+
+def iter_poses_of_containers(contnrs):
+    """
+    Iterate through the 3D models of every variant of a list of Gypsum-DL
+    containers, sanitized and with their final SMILES. Variants which can't
+    be sanitized are skipped.
+
+    Inputs:
+    :param list contnrs: list of gypsum_dl MolContainer objects which have
+        been through execute_gypsum_dl
+
+    Returns:
+    :returns: generator poses: yields [ligand_id, variant, mol,
+        no_hydrogen_smiles] where ligand_id is the slug of the container's
+        name and variant is indexed to 1
+    """
+
+    for contnr in contnrs:
+        ligand_id = slug(contnr.name)
+        counter = 0
+        for my_mol in contnr.mols:
+            my_mol.load_conformers_into_rdkit_mol()
+            mol = my_mol.rdkit_mol
+            if mol is None or mol.GetNumConformers() == 0:
+                continue
+
+            mol = MOH.check_sanitization(Chem.Mol(mol))
+            # Filter out any which failed
+            if mol is None:
+                continue
+
+            try:
+                no_hydrogen_smiles = Chem.MolToSmiles(Chem.RemoveHs(mol))
+            except:
+                no_hydrogen_smiles = Chem.MolToSmiles(mol)
+
+            counter = counter + 1
+            yield [ligand_id, counter, mol, no_hydrogen_smiles]
+
+
+def write_pdbs_of_containers(contnrs, pdb_subfolder_path):
+    """
+    Write a PDB file for every variant of a list of Gypsum-DL containers,
+    straight from the molecules in memory. Each file is written once, with
+    the "REMARK Final SMILES string" header already in place.
+
+    The files are named as by convert_single_sdf_to_pdb:
+    $PDB_FOLDER/$LIGAND_NAME__$VARIANT_NUMBER.pdb (indexed to 1)
+
+    Inputs:
+    :param list contnrs: list of gypsum_dl MolContainer objects which have
+        been through execute_gypsum_dl
+    :param str pdb_subfolder_path: a path to the folder to place the PDB
+        files
+
+    Returns:
+    :returns: list outputs: [ligand_id, variant, pdb_name, 0, byte_length,
+        final_smiles] for every PDB written
+    """
+
+    outputs = []
+    for ligand_id, variant, mol, no_hydrogen_smiles in iter_poses_of_containers(contnrs):
+        pdb_name = "{}{}__{}.pdb".format(pdb_subfolder_path, ligand_id, variant)
+        data = make_pdb_block_with_smiles(mol, no_hydrogen_smiles).encode("utf-8")
+        with open(pdb_name, "wb") as f:
+            f.write(data)
+        outputs.append([ligand_id, variant, pdb_name, 0, len(data),
+                        no_hydrogen_smiles])
+
+    return outputs
+
+
+def write_pose_shards_of_containers(contnrs, shard_folder, poses_per_shard):
+    """
+    Add every variant of a list of Gypsum-DL containers to the .sdf shard of
+    this process. Each pose is an SDF record named $LIGAND_NAME__$VARIANT
+    with its final SMILES in the Final_SMILES property.
+
+    Inputs:
+    :param list contnrs: list of gypsum_dl MolContainer objects which have
+        been through execute_gypsum_dl
+    :param str shard_folder: a path to the folder to place the shards
+    :param int poses_per_shard: the number of poses per shard
+
+    Returns:
+    :returns: list outputs: the shard index entry of every pose written,
+        [ligand_id, variant, shard_file, byte_offset, byte_length,
+        final_smiles]
+    """
+
+    poses = []
+    for ligand_id, variant, mol, no_hydrogen_smiles in iter_poses_of_containers(contnrs):
+        poses.append([
+            ligand_id,
+            variant,
+            make_sdf_block(mol, "{}__{}".format(ligand_id, variant),
+                           no_hydrogen_smiles),
+            no_hydrogen_smiles,
+        ])
+    if len(poses) == 0:
+        return []
+    return get_pose_shard_writer(shard_folder, poses_per_shard).write_poses(poses)
+
+
+def get_pose_shard_writer(shard_folder, poses_per_shard):
+    """
+    Get the PoseShardWriter of this process, making it if needed. Each
+    process has its own so no two processes write to the same shard.
+
+    Inputs:
+    :param str shard_folder: a path to the folder to place the shards
+    :param int poses_per_shard: the number of poses per shard
+
+    Returns:
+    :returns: PoseShardWriter writer: the writer of this process
+    """
+
+    key = (os.getpid(), shard_folder)
+    if key not in POSE_SHARD_WRITERS:
+        POSE_SHARD_WRITERS[key] = pose_shards.PoseShardWriter(
+            shard_folder, poses_per_shard
+        )
+    return POSE_SHARD_WRITERS[key]
+
+
+def close_pose_shard_writers():
+    """
+    Close the PoseShardWriters of this process. Worker processes flush every
+    pose as it is written, so only the writers of the current process need
+    closing.
+    """
+
+    for key in list(POSE_SHARD_WRITERS.keys()):
+        if key[0] == os.getpid():
+            POSE_SHARD_WRITERS.pop(key).close()
+
+
+def finish_pose_shards(output_3d):
+    """
+    Once all the 3D conversions are finished, close the PoseShardWriters of
+    this process (in serial mode the shards were written by this process)
+    and remove any partial record left in a shard by a worker process which
+    was terminated mid-write.
+
+    Inputs:
+    :param list output_3d: how the 3D models were written (see
+        get_output_3d_settings)
+    """
+
+    close_pose_shard_writers()
+    if output_3d[0] == "sdf_shards" and os.path.isdir(output_3d[1]):
+        num_bytes_removed = pose_shards.repair_pose_shards(output_3d[1])
+        if num_bytes_removed != 0:
+            print("Removed {} bytes of partial poses from the 3D shards".format(
+                num_bytes_removed
+            ))
+
+
+def make_sdf_block(mol, name, no_hydrogen_smiles):
+    """
+    Make the text of an SDF record of a mol with its final SMILES.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the mol with 3D coordinates
+    :param str name: the name of the record
+    :param str no_hydrogen_smiles: the SMILES of the mol without hydrogens
+
+    Returns:
+    :returns: str sdf_block: the text of the SDF record, ending with $$$$
+    """
+
+    mol = Chem.Mol(mol)
+    mol.SetProp("_Name", name)
+    mol.SetProp("Final_SMILES", str(no_hydrogen_smiles))
+    sdf_text = io.StringIO()
+    writer = Chem.SDWriter(sdf_text)
+    writer.write(mol)
+    writer.close()
+    return sdf_text.getvalue()
+
+
+def make_pdb_block_with_smiles(mol, no_hydrogen_smiles):
+    """
+    Make the text of a PDB file of a mol with a header containing its SMILES
+    (with protanation and stereochem).
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the mol with 3D coordinates
+    :param str no_hydrogen_smiles: the SMILES of the mol without hydrogens or
+        None
+
+    Returns:
+    :returns: str pdb_block: the text of the PDB file
+    """
+
+    printout = "REMARK Final SMILES string: {}\n".format(no_hydrogen_smiles)
+    return printout + Chem.MolToPDBBlock(mol, flavor=32)
+
+
+def run_gypsum_with_timeout(smile, lig_id, gypsum_timeout_limit, func, *args):
+    """
+    Run a Gypsum-DL function on a single ligand with a timeout and return its
+    ContainerResult. The Gypsum-DL log messages are kept in memory by a log
+    sink which only applies to the thread running the function, so
+    sys.stdout is never redirected. The messages are only kept in the result
+    if the ligand failed.
+
+    Inputs:
+    :param str smile: the SMILES string of the ligand
+    :param str lig_id: the abridged name of the ligand
+    :param int gypsum_timeout_limit: the maximum amount of time to run Gypsum
+        on the ligand
+    :param func func: prepare_molecules or prepare_containers_in_process
+    :param args: the arguments of func
+
+    Returns:
+    :returns: ContainerResult result: the gypsum_dl ContainerResult of the
+        ligand
+    """
+
+    log_lines = []
+    try:
+        results = func_timeout(
+            gypsum_timeout_limit, gypsum_utils.call_with_log_sink,
+            args=tuple([log_lines, func] + list(args))
+        )
+    except FunctionTimedOut:
         # This Ligand Timed out
-        return lig_id
+        return gypsum_results.ContainerResult(
+            lig_id, smile, gypsum_results.STATUS_TIMEOUT,
+            error="Timed out after {} seconds".format(gypsum_timeout_limit),
+            log=log_lines
+        )
+    except Exception as e:
+        return gypsum_results.ContainerResult(
+            lig_id, smile, gypsum_results.STATUS_ERROR, error=repr(e),
+            log=log_lines
+        )
 
-    # Check if it worked if it failed return lig_id if it works return None
-    did_gypsum_complete = check_gypsum_log_did_complete(log_file)
-    if did_gypsum_complete in [None, False]:
-        # Failed to convert
-        return lig_id
+    return get_result_of_ligand(smile, lig_id, results, log_lines)
 
-    return None
 
+def get_result_of_ligand(smile, lig_id, results, log_lines):
+    """
+    Get the ContainerResult of a single ligand from the results Gypsum-DL
+    returned for it, keeping the log messages only if it failed.
 
-def check_gypsum_log_did_complete(log_file_path):
+    Inputs:
+    :param str smile: the SMILES string of the ligand
+    :param str lig_id: the abridged name of the ligand
+    :param list results: the ContainerResults returned by Gypsum-DL
+    :param list log_lines: the Gypsum-DL log messages of the ligand
+
+    Returns:
+    :returns: ContainerResult result: the gypsum_dl ContainerResult of the
+        ligand
     """
-    This function checks a log_file_path to see if the last line reads
-    "TIMEOUT". If it does then gypsum timed out before converting a .smi. If
-    it timedout return False. If it completed return True
+
+    if results is None or len(results) == 0:
+        return gypsum_results.ContainerResult(
+            lig_id, smile, gypsum_results.STATUS_ERROR,
+            error="Gypsum-DL did not report a result", log=log_lines
+        )
+
+    # There is one result per ligand
+    result = results[0]
+    result.name = lig_id
+    if result.succeeded() is False:
+        result.log = log_lines
+    return result
+
+
+def set_up_gypsum_worker(gypsum_params, output_3d):
+    """
+    Set up the Gypsum-DL parameters once in a DeadlinePool worker process.
 
     Inputs:
-    :param str log_file_path: the path to the log from converting a ligand
-        with Gypsum.
+    :param dict gypsum_params: dictionary of params to be feed to Gypsum-DL
+    :param list output_3d: how to write the 3D models (see
+        get_output_3d_settings)
 
     Returns:
-    :returns: bool bol:  Returns True if the conversion worked (or if it was a
-        blank .smi with no name or SMILES). Returns False if it timedout. Returns
-        None if it failed to convert due to errors with the SMILES string, .json,
-        or .smi.
+    :returns: list worker_state: [params, output_3d], where params are the
+        Gypsum-DL parameters set up to be run in-process
+    """
+
+    add_gypsum_to_sys_path()
+
+    gypsum_params = dict(gypsum_params)
+    gypsum_params["source"] = []
+    return [set_up_in_process_params(gypsum_params), output_3d]
+
 
-        -examples would be
-                1) if the SMILE was invalid chemically
-                2) There was SMILE name but no SMILE string
-                3) The SMILES wasn't a SMILE but rather a different data type
-                    ie None, False, non-chemical string...
+def run_gypsum_ligand_in_worker(worker_state, ligand):
     """
+    Convert a single ligand in a DeadlinePool worker process. There is no
+    timeout here; the DeadlinePool terminates the process if the ligand runs
+    too long.
 
-    if os.path.exists(log_file_path) is False:
-        return False
+    Inputs:
+    :param list worker_state: [params, output_3d] (see
+        set_up_gypsum_worker)
+    :param tuple ligand: (SMILES, abridged name, mol_binary)
 
-    sys.stdout.flush()
-    with open(log_file_path) as log:
-        data = log.readlines()
-    if len(data) == 0:
-        # For whatever reason it didn't write to the file.
-        return None
+    Returns:
+    :returns: ContainerResult result: the gypsum_dl ContainerResult of the
+        ligand
+    """
+
+    params, output_3d = worker_state
+    smile, lig_id, mol_binary = ligand
+    log_lines = []
+    try:
+        results = gypsum_utils.call_with_log_sink(
+            log_lines, prepare_containers_in_process,
+            get_gypsum_smiles_data(smile, lig_id, mol_binary), params,
+            output_3d
+        )
+    except Exception as e:
+        return gypsum_results.ContainerResult(
+            lig_id, smile, gypsum_results.STATUS_ERROR, error=repr(e),
+            log=log_lines
+        )
+
+    return get_result_of_ligand(smile, lig_id, results, log_lines)
 
-    lastline = data[-1]
-    lastline = lastline.replace("\n", "")
-    lastline = lastline.replace("\t", "")
-    lastline = lastline.replace(" ", "")
 
-    if str(lastline) == "TIMEOUT":
-        return False
-    if str(lastline) == "FAILED ERRORS WITH THE LIGAND":
-        return None
-    # passes
-    return True
+def make_failed_gypsum_result(ligand, error, timed_out):
+    """
+    Make the ContainerResult of a ligand whose DeadlinePool worker process was
+    terminated (it timed out) or died. Its log messages are lost with the
+    process.
+
+    Inputs:
+    :param tuple ligand: (SMILES, abridged name, mol_binary)
+    :param str error: a description of the problem
+    :param bool timed_out: True if the ligand timed out
+
+    Returns:
+    :returns: ContainerResult result: the gypsum_dl ContainerResult of the
+        ligand
+    """
+
+    smile, lig_id, mol_binary = ligand
+    if timed_out is True:
+        status = gypsum_results.STATUS_TIMEOUT
+    else:
+        status = gypsum_results.STATUS_ERROR
+    return gypsum_results.ContainerResult(lig_id, smile, status, error=error)
 
 
 def convert_sdf_to_pdbs(vars, gen_folder_path, sdfs_folder_path):
@@ -513,31 +1434,19 @@ def convert_single_sdf_to_pdb(pdb_subfolder_path, sdf_file_path):
                     # pdb_name indexed to 1
                     pdb_name = "{}_{}.pdb".format(file_output_name, counter + 1)
                     if mol is not None:  # For extra precaution...
-                        Chem.MolToPDBFile(mol, pdb_name, flavor=32)
                         # Add header to PDB file with SMILES containing
                         # protanation and stereochem
-
                         no_hydrogen_smiles = mols_no_hydrogen[i]
                         if no_hydrogen_smiles is None:
                             no_hydrogen_smiles = Chem.MolToSmiles(mol)
 
                         if no_hydrogen_smiles is None:
                             print("SMILES was None for: ", pdb_name)
-                            printout = "REMARK Final SMILES string: {}\n".format("None")
-                        elif type(no_hydrogen_smiles) == str:
-                            printout = "REMARK Final SMILES string: {}\n".format(
-                                no_hydrogen_smiles
-                            )
-                        elif type(no_hydrogen_smiles) == type(Chem.MolFromSmiles("C")):
-                            printout = "REMARK Final SMILES string: {}\n".format(
-                                Chem.MolToSmiles(no_hydrogen_smiles)
-                            )
-
-                        with open(pdb_name) as f:
-                            printout = printout + f.read()
+                        elif type(no_hydrogen_smiles) != str:
+                            no_hydrogen_smiles = Chem.MolToSmiles(no_hydrogen_smiles)
+
                         with open(pdb_name, "w") as f:
-                            f.write(printout)
-                        printout = ""
+                            f.write(make_pdb_block_with_smiles(mol, no_hydrogen_smiles))
 
                     counter = counter + 1
             else:
@@ -0,0 +1,346 @@
+"""
+A pool of worker processes which enforces a deadline on every item it runs.
+
+Each worker process runs batches of items one item at a time and tells the
+parent when it starts each item. If an item runs past the deadline, the
+parent terminates the worker process (reclaiming the CPU and memory of
+whatever it was stuck in, ie. an RDKit embedding in C++), records the item as
+timed out, starts a new worker in its place and re-queues the items of the
+batch which the old worker had not reached yet.
+
+Every worker talks to the parent through its own pipe, so terminating one
+worker can not corrupt the communication with the others.
+"""
+import __future__
+
+import collections
+import multiprocessing
+import multiprocessing.connection
+import time
+
+# Longest time (seconds) the parent waits for a message before checking the
+# deadlines and the health of the workers again
+MAX_WAIT_TIME = 1.0
+
+
+def _run_worker(conn, init_func, init_args, item_func):
+    """
+    The main loop of a worker process. It receives batches of
+    (item_index, item) from the parent and runs item_func on each item,
+    sending ("start", item_index) before and ("result", item_index, result)
+    after each one. The batch is done once every item has a result. A None batch stops the worker.
+
+    Inputs:
+    :param multiprocessing.connection.Connection conn: the worker end of the
+        pipe to the parent
+    :param func init_func: run once when the worker starts. Its return value
+        (ie. parameters which are expensive to set up) is handed to every call
+        of item_func
+    :param tuple init_args: the arguments of init_func
+    :param func item_func: run on every item as item_func(state, item)
+    """
+
+    state = init_func(*init_args)
+    while True:
+        try:
+            batch = conn.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        for item_index, item in batch:
+            conn.send(("start", item_index))
+            conn.send(("result", item_index, item_func(state, item)))
+    conn.close()
+
+
+class _Worker(object):
+    """
+    The parent's record of one worker process and the batch it is running.
+    """
+
+    def __init__(self, init_func, init_args, item_func):
+        """
+        Start a worker process.
+
+        Inputs:
+        :param func init_func: see _run_worker
+        :param tuple init_args: see _run_worker
+        :param func item_func: see _run_worker
+        """
+
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_run_worker,
+            args=(child_conn, init_func, init_args, item_func),
+        )
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+        # The (item_index, item) pairs of the batch which have not finished
+        self.batch = []
+        # The item being run and the time it started
+        self.current_item_index = None
+        self.start_time = None
+        # Set if the pipe to the worker was closed (ie. the worker died)
+        self.lost_connection = False
+
+    def send_batch(self, batch):
+        """
+        Hand the worker a batch of items.
+
+        Inputs:
+        :param list batch: list of (item_index, item)
+        """
+
+        self.batch = list(batch)
+        self.current_item_index = None
+        self.start_time = None
+        try:
+            self.conn.send(self.batch)
+        except (OSError, ValueError):
+            # The worker already died (ie. in init_func). The batch is kept
+            # so DeadlinePool._check_worker deals with it
+            self.lost_connection = True
+
+    def is_busy(self):
+        """
+        Whether the worker is running a batch.
+
+        Returns:
+        :returns: bool busy: True if the worker has a batch
+        """
+
+        return len(self.batch) != 0
+
+    def remaining_items(self):
+        """
+        The items of the batch after the one being run.
+
+        Returns:
+        :returns: list remaining: list of (item_index, item)
+        """
+
+        return [x for x in self.batch if x[0] != self.current_item_index]
+
+    def stop(self, terminate=False):
+        """
+        Stop the worker process.
+
+        Inputs:
+        :param bool terminate: if True the process is killed straight away,
+            otherwise it is asked to finish
+        """
+
+        if terminate is False:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                terminate = True
+        if terminate is True and self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+class DeadlinePool(object):
+    """
+    Run items in worker processes with a deadline for every item.
+    """
+
+    def __init__(self, num_procs, timeout, init_func, init_args, item_func,
+                 failed_func):
+        """
+        Initialize the pool. No processes are started until run is called.
+
+        Inputs:
+        :param int num_procs: the number of worker processes
+        :param float timeout: the maximum number of seconds an item may run
+        :param func init_func: run once in every worker process. Its return
+            value is handed to every call of item_func
+        :param tuple init_args: the arguments of init_func
+        :param func item_func: run on every item in a worker process as
+            item_func(state, item). It should catch its own exceptions and
+            return a result describing them
+        :param func failed_func: run in the parent as
+            failed_func(item, error, timed_out) to make the result of an item
+            which timed out (timed_out is True) or whose worker died
+            (timed_out is False). error is a str
+        """
+
+        self.num_procs = max(1, int(num_procs))
+        self.timeout = timeout
+        self.init_func = init_func
+        self.init_args = init_args
+        self.item_func = item_func
+        self.failed_func = failed_func
+
+    def run(self, batches):
+        """
+        Run every item of every batch.
+
+        Inputs:
+        :param list batches: list of lists of items. Each batch is run by a
+            single worker process
+
+        Returns:
+        :returns: list results: the result of every item in the order of the
+            items in the batches
+        """
+
+        items = [item for batch in batches for item in batch]
+        results = [None] * len(items)
+        pending = collections.deque()
+        item_index = 0
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            pending.append(
+                [(item_index + i, item) for i, item in enumerate(batch)]
+            )
+            item_index = item_index + len(batch)
+        if len(pending) == 0:
+            return results
+
+        num_procs = min(self.num_procs, len(pending))
+        workers = [self._start_worker() for i in range(num_procs)]
+        try:
+            while True:
+                for worker in workers:
+                    if worker.is_busy() is False and len(pending) != 0:
+                        worker.send_batch(pending.popleft())
+                busy_workers = [x for x in workers if x.is_busy()]
+                if len(busy_workers) == 0:
+                    break
+
+                ready = multiprocessing.connection.wait(
+                    [x.conn for x in busy_workers],
+                    timeout=self._get_wait_time(busy_workers),
+                )
+                for worker in busy_workers:
+                    if worker.conn in ready:
+                        self._handle_messages(worker, results)
+
+                for i, worker in enumerate(workers):
+                    if worker.is_busy() is False:
+                        continue
+                    error, timed_out = self._check_worker(worker)
+                    if error is None:
+                        continue
+                    # Kill the stuck worker, fail the item it was running and
+                    # put the rest of its batch back in the queue
+                    self._fail_current_item(
+                        worker, items, results, error, timed_out
+                    )
+                    remaining = worker.remaining_items()
+                    worker.stop(terminate=True)
+                    if len(remaining) != 0:
+                        pending.appendleft(remaining)
+                    workers[i] = self._start_worker()
+        finally:
+            for worker in workers:
+                worker.stop(terminate=worker.is_busy())
+
+        return results
+
+    def _start_worker(self):
+        """
+        Start a new worker process.
+
+        Returns:
+        :returns: _Worker worker: the new worker
+        """
+
+        return _Worker(self.init_func, self.init_args, self.item_func)
+
+    def _get_wait_time(self, busy_workers):
+        """
+        How long to wait for a message before the next deadline check.
+
+        Inputs:
+        :param list busy_workers: the workers which are running a batch
+
+        Returns:
+        :returns: float wait_time: the number of seconds to wait
+        """
+
+        wait_time = MAX_WAIT_TIME
+        now = time.time()
+        for worker in busy_workers:
+            if worker.start_time is not None:
+                time_left = worker.start_time + self.timeout - now
+                wait_time = min(wait_time, max(0.0, time_left))
+        return wait_time
+
+    def _handle_messages(self, worker, results):
+        """
+        Read every waiting message from a worker.
+
+        Inputs:
+        :param _Worker worker: the worker
+        :param list results: the results of all items, updated in place
+        """
+
+        while worker.is_busy() and worker.conn.poll():
+            try:
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                # The worker died. _check_worker deals with it
+                worker.lost_connection = True
+                return
+            if message[0] == "start":
+                worker.current_item_index = message[1]
+                worker.start_time = time.time()
+            elif message[0] == "result":
+                results[message[1]] = message[2]
+                worker.batch = [x for x in worker.batch if x[0] != message[1]]
+                worker.current_item_index = None
+                worker.start_time = None
+
+    def _check_worker(self, worker):
+        """
+        Check whether a busy worker has passed its deadline or died.
+
+        Inputs:
+        :param _Worker worker: the worker
+
+        Returns:
+        :returns: str error: a description of the problem or None if the
+            worker is fine
+        :returns: bool timed_out: True if the worker passed its deadline
+        """
+
+        if worker.start_time is not None and \
+                time.time() - worker.start_time > self.timeout:
+            return "Timed out after {} seconds".format(self.timeout), True
+        if worker.lost_connection is True or (
+                worker.process.is_alive() is False and worker.conn.poll() is False):
+            # The pipe can close before the process is reaped, so wait for it
+            # to get its exit code
+            worker.process.join(MAX_WAIT_TIME)
+            return "The worker process exited with code {}".format(
+                worker.process.exitcode
+            ), False
+        return None, False
+
+    def _fail_current_item(self, worker, items, results, error, timed_out):
+        """
+        Record the result of the item which a worker was running when it
+        was stopped. If the worker died before starting an item, the first
+        item of its batch is blamed so a batch which always kills its worker
+        can not be re-queued forever.
+
+        Inputs:
+        :param _Worker worker: the worker
+        :param list items: all items, by item index
+        :param list results: the results of all items, updated in place
+        :param str error: a description of the problem
+        :param bool timed_out: True if the worker passed its deadline
+        """
+
+        if worker.current_item_index is None:
+            worker.current_item_index = worker.batch[0][0]
+        results[worker.current_item_index] = self.failed_func(
+            items[worker.current_item_index], error, timed_out
+        )
@@ -27,7 +27,7 @@ except:
     Utils.exception("You need to install rdkit and its dependencies.")
 
 
-def pick_lowest_enrgy_mols(mol_lst, num, thoroughness):
+def pick_lowest_enrgy_mols(mol_lst, num, thoroughness, template_embedding=False):
     """Pick molecules with low energies. If necessary, the definition also
        makes a conformer without minimization (so not too computationally
        expensive).
@@ -44,7 +44,14 @@ def pick_lowest_enrgy_mols(mol_lst, num, thoroughness):
        computational expense, but it also increases the chances of finding good
        molecules.
     :type thoroughness: int
-    :return: Returns a list of MyMol.MyMol, the best ones.
+    :param template_embedding: Whether to embed the molecules using the
+       first one with a conformer as a template (see
+       MyMol.MyMol.make_first_3d_conf_no_min). The molecules are all
+       variants of the same compound. Defaults to False.
+    :type template_embedding: bool, optional
+    :return: Returns a list of MyMol.MyMol, the best ones. Each keeps the
+       (unminimized) conformer used to score it, so the 3D steps can start
+       from it rather than embedding the molecule again.
     :rtype: list
     """
 
@@ -59,22 +66,34 @@ def pick_lowest_enrgy_mols(mol_lst, num, thoroughness):
     # a list of Gypsum-DL MyMol.MyMol objects.
     mols_3d = Utils.random_sample(mol_lst, num * thoroughness, "")
 
+    # If using a template, start with a molecule that already has a
+    # conformer, if any.
+    template = None
+    if template_embedding == True:
+        with_confs = [mol for mol in mols_3d if len(mol.conformers) > 0]
+        if len(with_confs) > 0:
+            template = with_confs[0]
+
     # Now get the energies
     data = []
     for i, mol in enumerate(mols_3d):
-        mol.make_first_3d_conf_no_min()  # Make sure at least one conformer
-        # exists.
+        mol.make_first_3d_conf_no_min(template)  # Make sure at least one
+        # conformer exists.
         if len(mol.conformers) > 0:
             energy = mol.conformers[0].energy
             data.append((energy, i))
 
+            if template_embedding == True and template is None:
+                template = mol
+
     data.sort()
 
     # Now keep only best top few.
     data = data[:num]
 
-    # Keep just the mols there.
-    new_mols_list = [mol_lst[d[1]] for d in data]
+    # Keep just the mols there. Note that the indexes are into mols_3d (a
+    # random sample of mol_lst), not mol_lst itself.
+    new_mols_list = [mols_3d[d[1]] for d in data]
 
     # Return those molecules.
     return new_mols_list
@@ -118,6 +137,7 @@ def bst_for_each_contnr_no_opt(
     max_variants_per_compound,
     thoroughness,
     crry_ovr_frm_lst_step_if_no_fnd=True,
+    template_embedding=False,
 ):
     """Keep only the top few compound variants in each container, to prevent a
        combinatorial explosion. This is run periodically on the growing
@@ -143,6 +163,9 @@ def bst_for_each_contnr_no_opt(
        conformers, determines whether to just keep the old ones. Defaults to
        True.
     :param crry_ovr_frm_lst_step_if_no_fnd: bool, optional
+    :param template_embedding: Whether to embed the variants of each
+       container using a sibling variant as a template. Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     # Remove duplicate ligands from each container.
@@ -168,7 +191,9 @@ def bst_for_each_contnr_no_opt(
             # Pick the lowest-energy molecules. Note that this creates a
             # conformation if necessary, but it is not minimized and so is not
             # computationally expensive.
-            mols = pick_lowest_enrgy_mols(mols, max_variants_per_compound, thoroughness)
+            mols = pick_lowest_enrgy_mols(
+                mols, max_variants_per_compound, thoroughness, template_embedding
+            )
 
             if len(mols) > 0:
                 # Now remove all previously determined mols for this
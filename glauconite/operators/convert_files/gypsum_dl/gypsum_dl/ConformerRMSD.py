@@ -0,0 +1,124 @@
+# Copyright 2018 Jacob D. Durrant
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Vectorized RMSD calculations used to eliminate conformers that are very
+geometrically similar. The heavy-atom coordinates of all the conformers are
+extracted once into a numpy array, and the RMSDs (after optimal alignment,
+using the Kabsch algorithm) between one conformer and many others are
+calculated together.
+"""
+
+import __future__
+
+import gypsum_dl.Utils as Utils
+
+try:
+    import numpy
+except:
+    Utils.exception("You need to install numpy and its dependencies.")
+
+# The number of conformers compared to a given conformer in a single
+# vectorized calculation. Limits the size of the temporary arrays.
+RMSD_BATCH_SIZE = 256
+
+
+def get_heavy_atom_coords(conformers):
+    """Extracts the heavy-atom coordinates of some conformers.
+
+    :param conformers: The MyMol.MyConformer objects, all of the same
+       molecule.
+    :type conformers: list
+    :return: The coordinates, with shape (num conformers, num heavy atoms, 3).
+    :rtype: numpy.ndarray
+    """
+
+    ids_hvy_atms = conformers[0].ids_hvy_atms
+    return numpy.array(
+        [conf.coords[ids_hvy_atms] for conf in conformers], dtype=numpy.float64
+    )
+
+
+def get_aligned_rmsds(ref_coords, other_coords):
+    """Calculates the RMSDs between one set of coordinates and many others,
+       each optimally aligned (rotated and translated, but not reflected) to
+       the first.
+
+    :param ref_coords: The reference coordinates, with shape (num atoms, 3).
+    :type ref_coords: numpy.ndarray
+    :param other_coords: The other coordinates, with shape (num sets, num
+       atoms, 3).
+    :type other_coords: numpy.ndarray
+    :return: The RMSDs, with shape (num sets,).
+    :rtype: numpy.ndarray
+    """
+
+    num_atms = ref_coords.shape[0]
+
+    # Center everything on the origin.
+    ref = ref_coords - ref_coords.mean(axis=0)
+    others = other_coords - other_coords.mean(axis=1)[:, None, :]
+
+    # The covariance matrices and their singular values. Flip the sign of the
+    # smallest singular value where needed, so the alignments are proper
+    # rotations rather than reflections.
+    covariances = numpy.einsum("nai,aj->nij", others, ref)
+    u, s, vt = numpy.linalg.svd(covariances)
+    signs = numpy.sign(numpy.linalg.det(u) * numpy.linalg.det(vt))
+    s[:, -1] = s[:, -1] * numpy.where(signs == 0, 1.0, signs)
+
+    # The squared deviation after alignment, without ever building the
+    # rotated coordinates.
+    sum_sqs = (ref * ref).sum() + (others * others).sum(axis=(1, 2))
+    sqr_devs = numpy.maximum(sum_sqs - 2.0 * s.sum(axis=1), 0.0)
+
+    return numpy.sqrt(sqr_devs / num_atms)
+
+
+def find_distinct_conformers(coords, rmsd_cutoff=0.1, batch_size=RMSD_BATCH_SIZE):
+    """Greedily picks the conformers that are not too similar to other
+       (earlier) conformers. The first conformer is always kept. Each later
+       conformer is dropped if it comes within rmsd_cutoff of any earlier
+       conformer that is kept.
+
+    :param coords: The heavy-atom coordinates of the conformers, with shape
+       (num conformers, num heavy atoms, 3), in order of priority (e.g.,
+       sorted by energy).
+    :type coords: numpy.ndarray
+    :param rmsd_cutoff: The RMSD cutoff to use. Defaults to 0.1
+    :type rmsd_cutoff: float, optional
+    :param batch_size: The number of conformers to compare at a time.
+       Defaults to RMSD_BATCH_SIZE.
+    :type batch_size: int, optional
+    :return: A list of bools, True for the conformers to keep.
+    :rtype: list
+    """
+
+    num_confs = coords.shape[0]
+    keep = numpy.ones(num_confs, dtype=bool)
+
+    for i in range(num_confs - 1):
+        if not keep[i]:
+            # Already eliminated, so don't use it to eliminate others.
+            continue
+
+        # Compare it to all the later conformers that are still kept.
+        later_idxs = numpy.nonzero(keep[i + 1 :])[0] + i + 1
+        for start in range(0, len(later_idxs), batch_size):
+            batch_idxs = later_idxs[start : start + batch_size]
+            rmsds = get_aligned_rmsds(coords[i], coords[batch_idxs])
+            keep[batch_idxs[rmsds <= rmsd_cutoff]] = False
+
+    return keep.tolist()
@@ -0,0 +1,122 @@
+# Copyright 2018 Jacob D. Durrant
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+The ContainerResult class describes what happened to a single input molecule
+(a MolContainer) when it was run through Gypsum-DL. It lets callers (e.g., a
+worker converting many molecules) check the outcome directly rather than
+parsing the log.
+"""
+
+import __future__
+
+STATUS_SUCCESS = "success"
+STATUS_NO_VARIANTS = "no_variants"
+STATUS_INVALID_INPUT = "invalid_input"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+
+
+class ContainerResult:
+    """The outcome of preparing a single input molecule."""
+
+    def __init__(self, name, smiles, status, num_variants=0, timings=None,
+                 error=None, log=None, outputs=None):
+        """The constructor.
+
+        :param name: The name of the molecule.
+        :type name: str
+        :param smiles: The input SMILES string of the molecule.
+        :type smiles: str
+        :param status: One of STATUS_SUCCESS, STATUS_NO_VARIANTS,
+           STATUS_INVALID_INPUT, STATUS_TIMEOUT or STATUS_ERROR.
+        :type status: str
+        :param num_variants: The number of variants (3D models) generated.
+        :type num_variants: int
+        :param timings: The seconds spent in each step, {step name: seconds}.
+           These are the timings of the execute_gypsum_dl call the molecule
+           was part of. Defaults to None (no timings).
+        :type timings: dict
+        :param error: A description of the error, if any. Defaults to None.
+        :type error: str
+        :param log: The messages logged while preparing the molecule, if they
+           were captured. Defaults to None.
+        :type log: list
+        :param outputs: Where the variants were written, if the caller
+           records it (e.g., a caller that writes the variants itself).
+           Defaults to None.
+        :type outputs: list
+        """
+
+        self.name = name
+        self.smiles = smiles
+        self.status = status
+        self.num_variants = num_variants
+        self.timings = timings if timings is not None else {}
+        self.error = error
+        self.log = log
+        self.outputs = outputs
+
+    def succeeded(self):
+        """Whether at least one variant was generated.
+
+        :return: True if the molecule was prepared successfully.
+        :rtype: bool
+        """
+
+        return self.status == STATUS_SUCCESS
+
+    def __repr__(self):
+        """A short description of the result.
+
+        :return: The description.
+        :rtype: str
+        """
+
+        return "ContainerResult({}, {}, {} variants)".format(
+            self.name, self.status, self.num_variants
+        )
+
+
+def make_container_results(contnrs, timings=None):
+    """Makes the results of a list of containers that have been through
+    execute_gypsum_dl.
+
+    :param contnrs: A list of containers (MolContainer.MolContainer).
+    :type contnrs: list
+    :param timings: The seconds spent in each step of the run.
+    :type timings: dict
+    :return: A list of ContainerResult objects, one per container.
+    :rtype: list
+    """
+
+    results = []
+    for contnr in contnrs:
+        num_variants = len(contnr.mols)
+        if num_variants > 0:
+            status = STATUS_SUCCESS
+        else:
+            status = STATUS_NO_VARIANTS
+        results.append(
+            ContainerResult(
+                contnr.name,
+                contnr.orig_smi,
+                status,
+                num_variants,
+                dict(timings) if timings is not None else None,
+            )
+        )
+
+    return results
@@ -37,7 +37,7 @@ class MolContainer:
     """The molecucle container class. It stores all the molecules (tautomers,
     etc.) associated with a single input SMILES entry."""
 
-    def __init__(self, smiles, name, index, properties):
+    def __init__(self, smiles, name, index, properties, mol=None):
         """The constructor.
 
         :param smiles: A list of SMILES strings.
@@ -49,6 +49,10 @@ class MolContainer:
         :type index: int
         :param properties: A dictionary of properties from the sdf.
         :type properties: dict
+        :param mol: An already parsed and sanitized rdkit.Mol of the SMILES
+           string (e.g., from a binary molecule library). If given, the SMILES
+           string is not parsed or sanitized again. Defaults to None.
+        :type mol: rdkit.Mol, optional
         """
 
         # Set some variables are set on the container level (not the MyMol
@@ -62,7 +66,15 @@ class MolContainer:
         self.mols = []
         self.name = name
         self.properties = properties
-        self.mol_orig_frm_inp_smi = MyMol.MyMol(smiles, name)
+        if mol is None:
+            self.mol_orig_frm_inp_smi = MyMol.MyMol(smiles, name)
+        else:
+            self.mol_orig_frm_inp_smi = MyMol.MyMol(mol, name, sanitized=True)
+
+            # Keep the input SMILES (not the canonical one) as the original,
+            # just as if it had been parsed here.
+            self.mol_orig_frm_inp_smi.orig_smi = smiles
+            self.mol_orig_frm_inp_smi.orig_smi_deslt = smiles
         self.mol_orig_frm_inp_smi.contnr_idx = self.contnr_idx
         self.frgs = ""  # For caching.
 
@@ -87,6 +99,55 @@ class MolContainer:
         # Get the non-acidic carbon-hydrogen footprint.
         self.carbon_hydrogen_count = self.mol_orig_frm_inp_smi.count_hyd_bnd_to_carb()
 
+    # The attributes of a container, in the order they are pickled (see
+    # __getstate__).
+    state_attrs = [
+        "contnr_idx",
+        "contnr_idx_orig",
+        "orig_smi",
+        "orig_smi_deslt",
+        "mols",
+        "name",
+        "properties",
+        "mol_orig_frm_inp_smi",
+        "frgs",
+        "orig_smi_canonical",
+        "num_nonaro_rngs",
+        "num_specif_chiral_cntrs",
+        "num_unspecif_chiral_cntrs",
+        "carbon_hydrogen_count",
+    ]
+
+    def __getstate__(self):
+        """Gets the state of this container, for pickling (e.g., to send it
+           to another process). The attributes are stored as a tuple, without
+           their names. The molecules serialize themselves compactly (see
+           MyMol.MyMol.__getstate__).
+
+        :return: The state. The second item holds any other attributes, or
+           None.
+        :rtype: tuple
+        """
+
+        values = tuple([getattr(self, a) for a in MolContainer.state_attrs])
+        others = dict(
+            [(k, v) for k, v in self.__dict__.items() if k not in MolContainer.state_attrs]
+        )
+        return (values, others if len(others) > 0 else None)
+
+    def __setstate__(self, state):
+        """Restores the state of this container, when unpickling.
+
+        :param state: The state, from __getstate__.
+        :type state: tuple
+        """
+
+        values, others = state
+        for a, value in zip(MolContainer.state_attrs, values):
+            setattr(self, a, value)
+        if others is not None:
+            self.__dict__.update(others)
+
     def mol_with_smiles_is_in_contnr(self, smiles):
         """Checks whether or not a given smiles string is already in this
            container.
@@ -30,6 +30,7 @@ import operator
 
 import gypsum_dl.Utils as Utils
 import gypsum_dl.MolObjectHandling as MOH
+import gypsum_dl.ConformerRMSD as ConformerRMSD
 
 #Disable the unnecessary RDKit warnings
 from rdkit import RDLogger
@@ -40,21 +41,491 @@ try:
     from rdkit.Chem import AllChem
     from rdkit import Chem
     from rdkit.Chem.rdchem import BondStereo
+    from rdkit.Geometry import Point3D
 except:
     Utils.exception("You need to install rdkit and its dependencies.")
 
+try:
+    import numpy
+except:
+    Utils.exception("You need to install numpy and its dependencies.")
+
 try:
     from gypsum_dl.molvs import standardize_smiles as ssmiles
 except:
     Utils.exception("You need to install molvs and its dependencies.")
 
+# When embedding from a template, the minimum number of atoms whose positions
+# must be fixed, and the number of attempts before embedding freely instead.
+MIN_TEMPLATE_ATOMS = 4
+TEMPLATE_EMBED_MAX_ATTEMPTS = 5
+
+
+def make_conf_settings(params):
+    """Collects the parameters that control how conformers are generated, so
+       they can be passed along to MyMol.add_conformers.
+
+    :param params: The parameters.
+    :type params: dict
+    :return: The conformer settings. "embed_multiple_confs" is whether to
+       generate all the requested conformers of a molecule with a single
+       EmbedMultipleConfs call, and "embed_num_threads" is the number of
+       threads rdkit uses for it (0 uses all available cores).
+       "batch_minimize" is whether to minimize all the conformers of a
+       molecule with a single call, using "minimize_num_threads" threads.
+       "force_field" ("uff" or "mmff") is the force field used to minimize
+       the conformers (see make_contnr_conf_settings), and
+       "minimize_max_iters" is the maximum number of minimization steps per
+       conformer. "adaptive_sampling" is whether to
+       generate conformers in rounds until they stop improving (see
+       MyMol.add_conformers_adaptively).
+    :rtype: dict
+    """
+
+    return {
+        "embed_multiple_confs": params["embed_multiple_confs"],
+        "embed_num_threads": params["embed_num_threads"],
+        "batch_minimize": params["batch_minimize"],
+        "minimize_num_threads": params["minimize_num_threads"],
+        "force_field": params["force_field"],
+        "minimize_max_iters": params["minimize_max_iters"],
+        "adaptive_sampling": params["adaptive_sampling"],
+    }
+
+
+def choose_force_field(mol, force_field):
+    """Picks the force field to minimize a molecule with. MMFF is only used
+       if it can parameterize the molecule. Otherwise, UFF is used.
+
+    :param mol: The molecule, with explicit hydrogens.
+    :type mol: rdkit.Mol
+    :param force_field: The requested force field, "uff" or "mmff".
+    :type force_field: str
+    :return: The force field to use, "uff" or "mmff".
+    :rtype: str
+    """
+
+    if force_field == "mmff" and AllChem.MMFFHasAllMoleculeParams(mol):
+        return "mmff"
+    return "uff"
+
+
+def make_contnr_conf_settings(contnr, conf_settings):
+    """Gets the conformer settings to use for the variants of a single
+       container. The minimized energies of the variants of a container are
+       compared to each other, so they must all come from the same force
+       field. If MMFF can't parameterize one of the variants, all of them are
+       minimized with UFF.
+
+    :param contnr: The container.
+    :type contnr: MolContainer.MolContainer
+    :param conf_settings: The conformer settings (see make_conf_settings),
+       or None.
+    :type conf_settings: dict
+    :return: The conformer settings, or a copy of them that uses UFF.
+    :rtype: dict
+    """
+
+    if conf_settings is None or conf_settings["force_field"] != "mmff":
+        return conf_settings
+
+    for mol in contnr.mols:
+        if mol.rdkit_mol is None or mol.rdkit_mol == "":
+            continue
+        if choose_force_field(Chem.AddHs(mol.rdkit_mol), "mmff") != "mmff":
+            Utils.log(
+                "\tWarning: Could not parameterize " + mol.smiles(True)
+                + " with MMFF. Minimizing all the variants of " + contnr.name
+                + " with UFF instead."
+            )
+            contnr_conf_settings = dict(conf_settings)
+            contnr_conf_settings["force_field"] = "uff"
+            return contnr_conf_settings
+
+    return conf_settings
+
+
+def optimize_conformers(mol, conf_settings):
+    """Minimizes all the conformers of a rdkit molecule with a single call,
+       so the force field is only set up once and rdkit can minimize the
+       conformers in parallel threads.
+
+    :param mol: The molecule, with the conformers to minimize. The
+       coordinates of the conformers are updated in place.
+    :type mol: rdkit.Mol
+    :param conf_settings: The conformer settings (see make_conf_settings).
+    :type conf_settings: dict
+    :return: A (not_converged, energy) tuple for each conformer, in the same
+       order as the conformers.
+    :rtype: list
+    """
+
+    num_threads = conf_settings["minimize_num_threads"]
+    max_iters = conf_settings["minimize_max_iters"]
+
+    if conf_settings["force_field"] == "mmff":
+        if choose_force_field(mol, "mmff") == "mmff":
+            return AllChem.MMFFOptimizeMoleculeConfs(
+                mol, numThreads=num_threads, maxIters=max_iters
+            )
+
+        # Some molecules (e.g., ones with unusual elements) can't be
+        # parameterized with MMFF. Use UFF instead.
+        Utils.log(
+            "Warning: Could not parameterize molecule with MMFF. Using UFF: "
+            + Chem.MolToSmiles(mol)
+        )
+
+    return AllChem.UFFOptimizeMoleculeConfs(
+        mol, numThreads=num_threads, maxIters=max_iters
+    )
+
+
+def make_etkdg_params(use_random_coordinates):
+    """Makes the ETKDG parameters used to embed conformers.
+
+    :param use_random_coordinates: Whether to start from random coordinates.
+    :type use_random_coordinates: bool
+    :return: The parameters.
+    :rtype: rdkit.Chem.rdDistGeom.EmbedParameters
+    """
+
+    try:
+        # Try to use ETKDGv2, but it is only present in the python 3.6
+        # version of RDKit.
+        params = AllChem.ETKDGv2()
+    except:
+        # Use the original version of ETKDG if python 2.7 RDKit.
+        params = AllChem.ETKDG()
+
+    # The default, but just a sanity check.
+    params.enforcechiral = True
+
+    # Set a max number of times it will try to calculate the 3D coordinates.
+    params.maxIterations = 0
+
+    # Also set whether to start from random coordinates.
+    params.useRandomCoords = use_random_coordinates
+
+    return params
+
+
+def get_conformer_coords(conf):
+    """Gets the coordinates of a rdkit conformer, in the compact form
+       MyConformer stores them.
+
+    :param conf: The rdkit conformer.
+    :type conf: rdkit.Conformer
+    :return: The coordinates, with shape (num atoms, 3).
+    :rtype: numpy.ndarray (float32)
+    """
+
+    return numpy.array(conf.GetPositions(), dtype=numpy.float32)
+
+
+def make_rdkit_conformer(coords):
+    """Makes a rdkit conformer from coordinates.
+
+    :param coords: The coordinates, with shape (num atoms, 3).
+    :type coords: numpy.ndarray
+    :return: The conformer.
+    :rtype: rdkit.Conformer
+    """
+
+    conf = Chem.Conformer(len(coords))
+    for i, (x, y, z) in enumerate(coords.tolist()):
+        conf.SetAtomPosition(i, Point3D(x, y, z))
+    conf.Set3D(True)
+    return conf
+
+
+def mol_to_binary(mol):
+    """Serializes a rdkit molecule with rdkit's binary format, including its
+       conformers and all its properties. Much faster to pickle (and
+       unpickle) than the molecule itself.
+
+    :param mol: The rdkit molecule. Anything else (e.g., None or "", used
+       as placeholders) is returned as is.
+    :type mol: rdkit.Mol
+    :return: The binary string.
+    :rtype: bytes
+    """
+
+    if not isinstance(mol, Chem.Mol):
+        return mol
+
+    try:
+        return mol.ToBinary(Chem.PropertyPickleOptions.AllProps)
+    except:
+        # Older versions of rdkit can't include the properties.
+        return mol.ToBinary()
+
+
+def mol_from_binary(data):
+    """Rebuilds a rdkit molecule serialized with mol_to_binary.
+
+    :param data: The binary string (or placeholder).
+    :type data: bytes
+    :return: The rdkit molecule (or placeholder).
+    :rtype: rdkit.Mol
+    """
+
+    if isinstance(data, bytes):
+        return Chem.Mol(data)
+    return data
+
+
+def pack_conformers(conformers, topology=None):
+    """Packs the conformers of a molecule compactly, for pickling. Each
+       topology is serialized only once, and the coordinates of all the
+       conformers are stored as a single binary string.
+
+    :param conformers: The MyConformer objects.
+    :type conformers: list
+    :param topology: An additional topology to pack (e.g., the one the
+       molecule caches), usually shared with the conformers. Defaults to
+       None.
+    :type topology: rdkit.Mol, optional
+    :return: The packed data, for unpack_conformers.
+    :rtype: tuple
+    """
+
+    # The unique topologies, by identity.
+    topologies = []
+
+    def get_topology_idx(mol):
+        for i, t in enumerate(topologies):
+            if t is mol:
+                return i
+        topologies.append(mol)
+        return len(topologies) - 1
+
+    topology_idx = None if topology is None else get_topology_idx(topology)
+    conf_topology_idxs = [get_topology_idx(c.mol) for c in conformers]
+    coords = b"".join(
+        [numpy.asarray(c.coords, dtype=numpy.float32).tobytes() for c in conformers]
+    )
+
+    return (
+        [mol_to_binary(t) for t in topologies],
+        topology_idx,
+        conf_topology_idxs,
+        [c.smiles for c in conformers],
+        [c.energy for c in conformers],
+        [c.minimized for c in conformers],
+        coords,
+    )
+
+
+def unpack_conformers(data):
+    """Rebuilds conformers packed with pack_conformers.
+
+    :param data: The packed data.
+    :type data: tuple
+    :return: A (conformers, topology) tuple. The conformers are MyConformer
+       objects, sharing their topologies as before packing. topology is
+       the additional topology (or None).
+    :rtype: tuple
+    """
+
+    topologies_bin, topology_idx, conf_topology_idxs, smiles, energies, \
+        minimized, coords = data
+
+    topologies = [mol_from_binary(t) for t in topologies_bin]
+    ids_hvy_atms = [
+        [a.GetIdx() for a in t.GetAtoms() if a.GetAtomicNum() != 1]
+        for t in topologies
+    ]
+    all_coords = numpy.frombuffer(coords, dtype=numpy.float32)
+
+    conformers = []
+    start = 0
+    for i, topology_idx_of_conf in enumerate(conf_topology_idxs):
+        topology = topologies[topology_idx_of_conf]
+        end = start + topology.GetNumAtoms() * 3
+        conf = MyConformer.__new__(MyConformer)
+        conf.smiles = smiles[i]
+        conf.mol = topology
+        conf.coords = all_coords[start:end].reshape(-1, 3).copy()
+        conf.energy = energies[i]
+        conf.minimized = minimized[i]
+        conf.ids_hvy_atms = ids_hvy_atms[topology_idx_of_conf]
+        conformers.append(conf)
+        start = end
+
+    topology = None if topology_idx is None else topologies[topology_idx]
+    return conformers, topology
+
+
+def make_heavy_atom_skeleton(mol):
+    """Makes a copy of a molecule's heavy-atom graph, with every bond single
+       and no charges, aromaticity, or stereochemistry. The protonation,
+       tautomer, and stereo variants of a compound all have the same
+       skeleton.
+
+    :param mol: The rdkit molecule.
+    :type mol: rdkit.Mol
+    :return: A (skeleton, heavy_atom_idxs) tuple. heavy_atom_idxs[i] is the
+       index in mol of skeleton atom i.
+    :rtype: tuple
+    """
+
+    heavy_atom_idxs = [a.GetIdx() for a in mol.GetAtoms() if a.GetAtomicNum() != 1]
+    new_idxs = {}
+    skeleton = Chem.RWMol()
+    for idx in heavy_atom_idxs:
+        atomic_num = mol.GetAtomWithIdx(idx).GetAtomicNum()
+        new_idxs[idx] = skeleton.AddAtom(Chem.Atom(atomic_num))
+
+    for bond in mol.GetBonds():
+        idx1 = bond.GetBeginAtomIdx()
+        idx2 = bond.GetEndAtomIdx()
+        if idx1 in new_idxs and idx2 in new_idxs:
+            skeleton.AddBond(new_idxs[idx1], new_idxs[idx2], Chem.BondType.SINGLE)
+
+    # Not sanitized, so set up just what substructure matching needs.
+    skeleton = skeleton.GetMol()
+    skeleton.UpdatePropertyCache(strict=False)
+    Chem.FastFindRings(skeleton)
+
+    return skeleton, heavy_atom_idxs
+
+
+def get_stereo_atom_idxs(mol):
+    """Gets the indexes of the atoms whose positions determine the
+       stereochemistry of a molecule: chiral centers, the atoms of
+       stereo double bonds, and their heavy-atom neighbors.
+
+    :param mol: The rdkit molecule.
+    :type mol: rdkit.Mol
+    :return: The atom indexes.
+    :rtype: set
+    """
+
+    stereo_idxs = set([])
+    for atom in mol.GetAtoms():
+        if atom.GetChiralTag() != Chem.rdchem.ChiralType.CHI_UNSPECIFIED:
+            stereo_idxs.add(atom.GetIdx())
+    for bond in mol.GetBonds():
+        if bond.GetStereo() != BondStereo.STEREONONE:
+            stereo_idxs.add(bond.GetBeginAtomIdx())
+            stereo_idxs.add(bond.GetEndAtomIdx())
+
+    neighbor_idxs = set([])
+    for idx in stereo_idxs:
+        for neighbor in mol.GetAtomWithIdx(idx).GetNeighbors():
+            if neighbor.GetAtomicNum() != 1:
+                neighbor_idxs.add(neighbor.GetIdx())
+
+    return stereo_idxs | neighbor_idxs
+
+
+def get_template_coord_map(template, mol):
+    """Maps the heavy atoms of a molecule to the coordinates of the same
+       atoms in a sibling variant (e.g., another protonation state or
+       tautomer of the same compound) that already has a conformer. Atoms
+       that determine the molecule's stereochemistry are left out, so
+       variants with different stereochemistry can still use the template.
+
+    :param template: The sibling variant, with at least one conformer.
+    :type template: MyMol.MyMol
+    :param mol: The rdkit molecule to embed.
+    :type mol: rdkit.Mol
+    :return: A dictionary mapping atom indexes in mol to positions, or None
+       if the heavy-atom skeletons don't match.
+    :rtype: dict | None
+    """
+
+    template_mol = template.conformers[0].make_rdkit_mol()
+    template_skel, template_idxs = make_heavy_atom_skeleton(template_mol)
+    skel, idxs = make_heavy_atom_skeleton(mol)
+
+    if template_skel.GetNumAtoms() != skel.GetNumAtoms():
+        return None
+
+    match = skel.GetSubstructMatch(template_skel)
+    if len(match) == 0:
+        return None
+
+    stereo_idxs = get_stereo_atom_idxs(mol)
+    template_conf = template_mol.GetConformer()
+    coord_map = {}
+    for template_skel_idx, skel_idx in enumerate(match):
+        idx = idxs[skel_idx]
+        if idx not in stereo_idxs:
+            coord_map[idx] = template_conf.GetAtomPosition(
+                template_idxs[template_skel_idx]
+            )
+
+    # Too few atoms to constrain anything useful.
+    if len(coord_map) < MIN_TEMPLATE_ATOMS:
+        return None
+
+    return coord_map
+
+
+def embed_with_coord_map(mol, coord_map, use_random_coordinates=False):
+    """Embeds a molecule (in place) with the positions of some of its atoms
+       fixed to those of a template. Does nothing if that fails.
+
+    :param mol: The rdkit molecule, without conformers.
+    :type mol: rdkit.Mol
+    :param coord_map: A dictionary mapping atom indexes to positions (see
+       get_template_coord_map).
+    :type coord_map: dict
+    :param use_random_coordinates: Whether to start from random coordinates.
+       Defaults to False.
+    :type use_random_coordinates: bool, optional
+    """
+
+    try:
+        AllChem.EmbedMolecule(
+            mol,
+            coordMap=coord_map,
+            maxAttempts=TEMPLATE_EMBED_MAX_ATTEMPTS,
+            useRandomCoords=use_random_coordinates,
+            enforceChirality=True,
+            useExpTorsionAnglePrefs=True,
+            useBasicKnowledge=True,
+        )
+    except:
+        # Older versions of rdkit, for example. Embed freely instead.
+        mol.RemoveAllConformers()
+
+
 class MyMol:
     """
     A class that wraps around a rdkit.Mol object. Includes additional data and
     functions.
     """
 
-    def __init__(self, starter, name=""):
+    __slots__ = [
+        "rdkit_mol",
+        "can_smi",
+        "can_smi_noh",
+        "orig_smi",
+        "orig_smi_deslt",
+        "orig_smi_canonical",
+        "name",
+        "conformers",
+        "conf_topology",
+        "conf_topology_src",
+        "nonaro_ring_atom_idx",
+        "chiral_cntrs_only_assigned",
+        "chiral_cntrs_include_unasignd",
+        "bizarre_substruct",
+        "enrgy",
+        "minimized_enrgy",
+        "contnr_idx",
+        "frgs",
+        "stdrd_smiles",
+        "mol_props",
+        "idxs_low_energy_confs_no_opt",
+        "idxs_of_confs_to_min",
+        "genealogy",
+    ]
+
+    def __init__(self, starter, name="", sanitized=False):
         """Initialize the MyMol object.
 
         :param starter: The object (smiles or rdkit.Mol) on which to build this
@@ -62,6 +533,11 @@ class MyMol:
         :type starter: str or rdkit.Mol
         :param name: An optional string, the name of this molecule. Defaults to "".
         :param name: str, optional
+        :param sanitized: Whether starter is an rdkit.Mol that is already
+           sanitized (e.g., from a binary molecule library), in which case it
+           is not sanitized again. SMILES strings are always sanitized.
+           Defaults to False.
+        :type sanitized: bool, optional
         """
 
         if isinstance(starter, str):
@@ -97,8 +573,11 @@ class MyMol:
 
         # Default assumption is that they are the same.
         self.orig_smi_deslt = smiles
+        self.orig_smi_canonical = ""
         self.name = name
         self.conformers = []
+        self.conf_topology = None  # Shared by the conformers.
+        self.conf_topology_src = None
         self.nonaro_ring_atom_idx = ""
         self.chiral_cntrs_only_assigned = ""
         self.chiral_cntrs_include_unasignd = ""
@@ -114,8 +593,9 @@ class MyMol:
         self.genealogy = []  # Keep track of how the molecule came to be.
 
         # Makes the molecule if a smiles was provided. Sanitizes the molecule
-        # regardless.
-        self.make_mol_frm_smiles_sanitze()
+        # unless it's an rdkit mol that is known to be sanitized already.
+        if sanitized == False or isinstance(starter, str):
+            self.make_mol_frm_smiles_sanitze()
 
     def standardize_smiles(self):
         """Standardize the smiles string if you can."""
@@ -133,6 +613,48 @@ class MyMol:
 
         return self.stdrd_smiles
 
+    # The attributes that are pickled as they are. The rest (the rdkit
+    # molecules and the conformers) are serialized separately, in
+    # __getstate__.
+    plain_state_attrs = [
+        s for s in __slots__
+        if s not in ["rdkit_mol", "conformers", "conf_topology", "conf_topology_src"]
+    ]
+
+    def __getstate__(self):
+        """Gets the state of this molecule, for pickling (e.g., to send it to
+           another process). The rdkit molecules are stored in rdkit's binary
+           format, and the conformers are packed together (see
+           pack_conformers). The other attributes are stored as a tuple,
+           without their names.
+
+        :return: The state.
+        :rtype: tuple
+        """
+
+        return (
+            mol_to_binary(self.rdkit_mol),
+            pack_conformers(self.conformers, self.conf_topology),
+            self.conf_topology is not None
+            and self.conf_topology_src is self.rdkit_mol,
+            tuple([getattr(self, a) for a in MyMol.plain_state_attrs]),
+        )
+
+    def __setstate__(self, state):
+        """Restores the state of this molecule, when unpickling.
+
+        :param state: The state, from __getstate__.
+        :type state: tuple
+        """
+
+        rdkit_mol, conformers, topology_is_current, values = state
+
+        self.rdkit_mol = mol_from_binary(rdkit_mol)
+        self.conformers, self.conf_topology = unpack_conformers(conformers)
+        self.conf_topology_src = self.rdkit_mol if topology_is_current else None
+        for a, value in zip(MyMol.plain_state_attrs, values):
+            setattr(self, a, value)
+
     def __hash__(self):
         """Allows you to compare MyMol.MyMol objects.
 
@@ -252,11 +774,49 @@ class MyMol:
         self.rdkit_mol = m
         return m
 
-    def make_first_3d_conf_no_min(self):
+    def get_conformer_topology(self):
+        """Gets the rdkit molecule (without conformers or properties) that
+           the conformers of this molecule share. It is made again only if
+           self.rdkit_mol has been replaced since it was last made.
+
+        :return: The topology.
+        :rtype: rdkit.Mol
+        """
+
+        if self.conf_topology is None or self.conf_topology_src is not self.rdkit_mol:
+            self.conf_topology = Chem.Mol(self.rdkit_mol, True)
+            self.conf_topology_src = self.rdkit_mol
+        return self.conf_topology
+
+    def copy_without_conformers(self):
+        """Makes a deep copy of this molecule, but without its conformers.
+           Faster than copying them all when only one or two are needed.
+
+        :return: The copy, with an empty list of conformers.
+        :rtype: MyMol.MyMol
+        """
+
+        conformers = self.conformers
+        self.conformers = []
+        try:
+            new_mol = copy.deepcopy(self)
+        finally:
+            self.conformers = conformers
+        return new_mol
+
+    def make_first_3d_conf_no_min(self, template=None):
         """Makes the associated rdkit.mol object 3D by adding the first
            conformer. This also adds hydrogen atoms to the associated rdkit.mol
            object. Note that it does not perform a minimization, so it is not
-           too expensive."""
+           too expensive.
+
+        :param template: An optional sibling variant of this molecule (e.g.,
+           another protonation state or tautomer of the same compound) that
+           already has a conformer. If given, the heavy atoms this molecule
+           shares with it are embedded at the same positions, which is much
+           faster than embedding freely. Defaults to None.
+        :type template: MyMol.MyMol, optional
+        """
 
         # Set the first 3D conformer
         if len(self.conformers) > 0:
@@ -267,6 +827,15 @@ class MyMol:
         # need to check that.
         self.rdkit_mol = MOH.try_reprotanation(self.rdkit_mol)
 
+        # Try to embed from the template first. MyConformer embeds freely if
+        # that fails.
+        if template is not None and len(template.conformers) > 0:
+            coord_map = get_template_coord_map(template, self.rdkit_mol)
+            if coord_map is not None:
+                new_conf = MyConformer(self, coord_map=coord_map)
+                if new_conf.mol is not False:
+                    self.conformers.append(new_conf)
+
         # Add a single conformer. RMSD cutoff very small so all conformers
         # will be accepted. And not minimizing (False).
         self.add_conformers(1, 1e60, False)
@@ -554,7 +1123,8 @@ class MyMol:
         self.set_rdkit_mol_prop("Genealogy", genealogy)
         self.set_rdkit_mol_prop("_Name", self.name)
 
-    def add_conformers(self, num, rmsd_cutoff=0.1, minimize=True):
+    def add_conformers(self, num, rmsd_cutoff=0.1, minimize=True,
+                       conf_settings=None):
         """Add conformers to this molecule.
 
         :param num: The total number of conformers to generate, including ones
@@ -566,11 +1136,33 @@ class MyMol:
         :param minimize: Whether or not to minimize the geometry of all these
            conformers. Defaults to True.
         :param minimize: bool, optional
+        :param conf_settings: The conformer settings (see
+           make_conf_settings). Defaults to None, generating the conformers
+           one at a time.
+        :type conf_settings: dict, optional
         """
 
         # First, do you need to add new conformers? Some might have already
         # been added. Just add enough to meet the requested amount.
         num_new_confs = max(0, num - len(self.conformers))
+        if (
+            num_new_confs > 0
+            and conf_settings is not None
+            and conf_settings["embed_multiple_confs"] == True
+        ):
+            # Generate them all at once. If they are about to be minimized
+            # together, their energies will come from that, so don't
+            # calculate them now.
+            calc_energies = not (
+                minimize == True and conf_settings["batch_minimize"] == True
+            )
+            self.conformers.extend(
+                self.embed_multiple_conformers(
+                    num_new_confs, conf_settings, calc_energies
+                )
+            )
+            num_new_confs = 0
+
         for i in range(num_new_confs):
             if len(self.conformers) == 0:
                 # For the first one, don't start from random coordinates.
@@ -584,8 +1176,8 @@ class MyMol:
 
         # Are the current ones minimized if necessary?
         if minimize == True:
-            for conf in self.conformers:
-                conf.minimize()  # Won't reminimize if it's already been done.
+            # Won't reminimize if it's already been done.
+            self.minimize_conformers(self.conformers, conf_settings)
 
         # Automatically sort by the energy.
         self.conformers.sort(key=operator.attrgetter('energy'))
@@ -593,6 +1185,159 @@ class MyMol:
         # Remove ones that are very structurally similar.
         self.eliminate_structurally_similar_conformers(rmsd_cutoff)
 
+    def add_conformers_adaptively(self, max_num, round_size, rmsd_cutoff=0.1,
+                                  minimize=True, conf_settings=None):
+        """Add conformers to this molecule in rounds, stopping once a round
+           no longer changes the best (lowest-energy) round_size conformers.
+           That is, stopping once new conformers are all either higher in
+           energy or too similar to ones already found. For rigid molecules,
+           this is usually well before max_num conformers.
+
+        :param max_num: The maximum number of conformers to generate.
+        :type max_num: int
+        :param round_size: The number of conformers to generate per round.
+           Also the number of best conformers checked for changes.
+        :type round_size: int
+        :param rmsd_cutoff: Don't keep conformers that come within this rms
+           distance of other conformers. Defaults to 0.1
+        :param rmsd_cutoff: float, optional
+        :param minimize: Whether or not to minimize the geometry of all these
+           conformers. Defaults to True.
+        :param minimize: bool, optional
+        :param conf_settings: The conformer settings (see
+           make_conf_settings). Defaults to None.
+        :type conf_settings: dict, optional
+        :return: The number of conformers generated.
+        :rtype: int
+        """
+
+        round_size = max(1, round_size)
+        num_sampled = 0
+        while num_sampled < max_num:
+            old_confs = set([id(c) for c in self.conformers])
+
+            num_new_confs = min(round_size, max_num - num_sampled)
+            self.add_conformers(len(self.conformers) + num_new_confs,
+                                rmsd_cutoff, minimize, conf_settings)
+            num_sampled = num_sampled + num_new_confs
+
+            # Did any new conformer make it into the best ones?
+            best_ids = [id(c) for c in self.conformers[:round_size]]
+            if len(old_confs) > 0 and len(set(best_ids) - old_confs) == 0:
+                break
+
+        Utils.log(
+            "\t" + str(self.smiles(True)) + " (" + self.name + "): sampled "
+            + str(num_sampled) + " of up to " + str(max_num) + " conformers."
+        )
+
+        return num_sampled
+
+    def embed_multiple_conformers(self, num, conf_settings, calc_energies=True):
+        """Generates several conformers with a single EmbedMultipleConfs call,
+           so rdkit can embed them in parallel threads. The ETKDG parameters
+           are set up once for all of them.
+
+        :param num: The number of conformers to generate.
+        :type num: int
+        :param conf_settings: The conformer settings (see make_conf_settings).
+        :type conf_settings: dict
+        :param calc_energies: Whether to calculate the (unminimized) energies
+           of the new conformers. If False, they must be minimized before
+           their energies are used. Defaults to True.
+        :type calc_energies: bool, optional
+        :return: A list of the new MyConformer objects. May contain fewer
+           than num conformers if rdkit could not embed them all.
+        :rtype: list
+        """
+
+        # A copy of the molecule without its conformers or properties.
+        mol = Chem.Mol(self.get_conformer_topology())
+
+        # As with MyConformer, the first conformer should not start from
+        # random coordinates. Subsequent ones should, to consider alternate
+        # geometries.
+        use_random_coordinates = len(self.conformers) > 0
+        params = make_etkdg_params(use_random_coordinates)
+        params.numThreads = conf_settings["embed_num_threads"]
+        conf_ids = list(AllChem.EmbedMultipleConfs(mol, num, params))
+
+        # On rare occasions, the embedding fails without random coordinates.
+        # So if it fails, try again with them.
+        if len(conf_ids) == 0 and use_random_coordinates == False:
+            params.useRandomCoords = True
+            conf_ids = list(AllChem.EmbedMultipleConfs(mol, num, params))
+
+        # Wrap each conformer. Each MyConformer keeps only its coordinates.
+        # If its energy is needed, it is calculated on a light copy of the
+        # molecule holding just that conformer.
+        new_confs = []
+        for conf_id in conf_ids:
+            if calc_energies:
+                conf_mol = Chem.Mol(mol, True)
+                conf_mol.AddConformer(mol.GetConformer(conf_id), assignId=True)
+                new_confs.append(MyConformer(self, prebuilt_mol=conf_mol))
+            else:
+                new_confs.append(
+                    MyConformer(self, mol.GetConformer(conf_id), energy=0.0)
+                )
+
+        return new_confs
+
+    def minimize_conformers(self, conformers, conf_settings=None):
+        """Minimize (optimize) the geometries of some of the conformers of
+           this molecule, skipping any that have already been optimized.
+
+        :param conformers: The MyConformer objects to minimize.
+        :type conformers: list
+        :param conf_settings: The conformer settings (see
+           make_conf_settings). Defaults to None, minimizing the conformers
+           one at a time with UFF.
+        :type conf_settings: dict, optional
+        """
+
+        conformers = [c for c in conformers if c.minimized == False]
+        if len(conformers) == 0:
+            return
+
+        if conf_settings is None:
+            for conf in conformers:
+                conf.minimize()
+            return
+
+        if conf_settings["batch_minimize"] == False:
+            for conf in conformers:
+                conf.minimize(
+                    conf_settings["minimize_max_iters"], conf_settings["force_field"]
+                )
+            return
+
+        # Put all the conformers in one molecule, so they can be minimized
+        # together.
+        mol = Chem.Mol(conformers[0].mol, True)
+        for conf in conformers:
+            mol.AddConformer(conf.conformer(), assignId=True)
+
+        try:
+            results = optimize_conformers(mol, conf_settings)
+        except:
+            # Minimize them one at a time instead. That handles (and logs)
+            # molecules that can't be parameterized.
+            for conf in conformers:
+                conf.minimize(
+                    conf_settings["minimize_max_iters"], conf_settings["force_field"]
+                )
+            return
+
+        # Copy the minimized coordinates and energies back to the
+        # MyConformer objects.
+        for conf, rdkit_conf, result in zip(
+            conformers, mol.GetConformers(), results
+        ):
+            conf.conformer(rdkit_conf)
+            conf.energy = result[1]
+            conf.minimized = True
+
     def eliminate_structurally_similar_conformers(self, rmsd_cutoff=0.1):
         """Eliminates conformers that are very geometrically similar.
 
@@ -600,31 +1345,20 @@ class MyMol:
         :param rmsd_cutoff: float, optional
         """
 
-        # Eliminate redundant ones.
-        for i1 in range(0, len(self.conformers) - 1):
-            if self.conformers[i1] is not None:
-                for i2 in range(i1 + 1, len(self.conformers)):
-                    if self.conformers[i2] is not None:
-                        # Align them.
-                        self.conformers[i2] = self.conformers[i1].align_to_me(
-                            self.conformers[i2]
-                        )
-
-                        # Calculate the RMSD.
-                        rmsd = self.conformers[i1].rmsd_to_me(
-                            self.conformers[i2]
-                        )
-
-                        # Replace the second one with None if it's too similar
-                        # to the first.
-                        if rmsd <= rmsd_cutoff:
-                            self.conformers[i2] = None
+        if len(self.conformers) < 2:
+            # Nothing to compare.
+            return
 
-        # Remove all the None entries.
-        while None in self.conformers:
-            self.conformers.remove(None)
+        # Get the heavy-atom coordinates of all the conformers at once. Each
+        # conformer is eliminated if it comes within rmsd_cutoff (after
+        # alignment) of an earlier conformer that is kept.
+        coords = ConformerRMSD.get_heavy_atom_coords(self.conformers)
+        keep = ConformerRMSD.find_distinct_conformers(coords, rmsd_cutoff)
 
         # Those that remains are only the distinct conformers.
+        self.conformers = [
+            conf for conf, keep_it in zip(self.conformers, keep) if keep_it
+        ]
 
     def count_hyd_bnd_to_carb(self):
         """Count the number of Hydrogens bound to carbons."""
@@ -652,9 +1386,17 @@ class MyConformer:
     """A wrapper around a rdkit Conformer object. Allows me to associate extra
     values with conformers. These are 3D coordinate sets for a given
     MyMol.MyMol object (different molecule conformations).
+
+    To save memory (and copying time), the coordinates are stored as a
+    float32 numpy array, and all the conformers of a MyMol.MyMol share one
+    rdkit molecule for the topology. rdkit Conformer objects are only made
+    when needed (e.g., to write the output).
     """
 
-    def __init__(self, mol, conformer=None, second_embed=False, use_random_coordinates=False):
+    __slots__ = ["smiles", "mol", "coords", "energy", "minimized", "ids_hvy_atms"]
+
+    def __init__(self, mol, conformer=None, second_embed=False, use_random_coordinates=False,
+                 prebuilt_mol=None, energy=None, coord_map=None):
         """Create a MyConformer objects.
 
         :param mol: The MyMol.MyMol associated with this conformer.
@@ -673,94 +1415,144 @@ class MyConformer:
            conformers to try to consider alternate geometries. So they should
            start from random coordinates. Defaults to False.
         :type use_random_coordinates: bool, optional
+        :param prebuilt_mol: An optional rdkit.Mol that already holds the
+           (single) conformer to use, e.g., one of several conformers embedded
+           together by MyMol.embed_multiple_conformers. Its energy is
+           calculated on it as is, without copying. Defaults to None.
+        :type prebuilt_mol: rdkit.Mol, optional
+        :param energy: The energy of the conformer, if already known (e.g.,
+           from a minimization). If None, it is calculated with UFF. Defaults
+           to None.
+        :type energy: float, optional
+        :param coord_map: An optional dictionary mapping atom indexes to the
+           positions they should be embedded at (see
+           get_template_coord_map). If embedding with these constraints
+           fails, the conformer is embedded freely. Defaults to None.
+        :type coord_map: dict, optional
         """
 
-        # Save some values to the object.
-        self.mol = copy.deepcopy(mol.rdkit_mol)
+        # Save some values to the object. The topology (atoms and bonds) is
+        # shared by all the conformers of the molecule. Only the coordinates
+        # are stored per conformer.
         self.smiles = mol.smiles()
-
-        # Remove any previous conformers.
-        self.mol.RemoveAllConformers()
-
-        if conformer is None:
-            # The user is providing no conformer. So we must generate it.
+        self.mol = mol.get_conformer_topology()
+        self.coords = None
+        self.energy = None
+        self.minimized = False
+        self.ids_hvy_atms = None
+
+        if prebuilt_mol is not None:
+            # The conformer is already in place.
+            conf_mol = prebuilt_mol
+        elif conformer is None:
+            # The user is providing no conformer. So we must generate it. Do
+            # so in a temporary copy of the topology.
+            conf_mol = Chem.Mol(self.mol)
 
             # Note that I have confirmed that the below respects chirality.
             # params is a list of ETKDGv2 parameters generated by this command
             # Description of these parameters can be found at
             # help(AllChem.EmbedMolecule)
 
-            try:
-                # Try to use ETKDGv2, but it is only present in the python 3.6
-                # version of RDKit.
-                params = AllChem.ETKDGv2()
-            except:
-                # Use the original version of ETKDG if python 2.7 RDKit. This
-                # may be resolved in next RDKit update so we encased this in a
-                # try statement.
-                params = AllChem.ETKDG()
-
-            # The default, but just a sanity check.
-            params.enforcechiral = True
+            params = make_etkdg_params(use_random_coordinates)
 
-            # Set a max number of times it will try to calculate the 3D
-            # coordinates. Will save a little time.
-            params.maxIterations = 0   # This should be the default but lets
-                                       # set it anyway
-
-            # Also set whether to start from random coordinates.
-            params.useRandomCoords = use_random_coordinates
+            # If some atom positions are known from a template, start from
+            # those.
+            if coord_map is not None:
+                embed_with_coord_map(conf_mol, coord_map, use_random_coordinates)
 
             # AllChem.EmbedMolecule uses geometry to create inital molecule
             # coordinates. This sometimes takes a very long time
-            AllChem.EmbedMolecule(self.mol, params)
+            if conf_mol.GetNumConformers() == 0:
+                AllChem.EmbedMolecule(conf_mol, params)
 
             # On rare occasions, the new conformer generating algorithm fails
             # because params.useRandomCoords = False. So if it fails, try
             # again with True.
-            if self.mol.GetNumConformers() == 0 and use_random_coordinates == False:
+            if conf_mol.GetNumConformers() == 0 and use_random_coordinates == False:
                 params.useRandomCoords = True
-                AllChem.EmbedMolecule(self.mol, params)
+                AllChem.EmbedMolecule(conf_mol, params)
 
             # On very rare occasions, the new conformer generating algorithm
             # fails. For example, COC(=O)c1cc(C)nc2c(C)cc3[nH]c4ccccc4c3c12 .
             # In this case, the old one still works. So if no coordinates are
             # assigned, try that one. Parameters must have second_embed set to
             # True for this to happen.
-            if second_embed == True and self.mol.GetNumConformers() == 0:
+            if second_embed == True and conf_mol.GetNumConformers() == 0:
                 AllChem.EmbedMolecule(
-                    self.mol, useRandomCoords=use_random_coordinates
+                    conf_mol, useRandomCoords=use_random_coordinates
                 )
 
             # On rare occasions, both methods fail. For example,
             # O=c1cccc2[C@H]3C[NH2+]C[C@@H](C3)Cn21 Another example:
             # COc1cccc2c1[C@H](CO)[N@H+]1[C@@H](C#N)[C@@H]3C[C@@H](C(=O)[O-])[C@H]([C@H]1C2)[N@H+]3C
-            if self.mol.GetNumConformers() == 0:
+            if conf_mol.GetNumConformers() == 0:
                 self.mol = False
         else:
             # The user has provided a conformer. Just add it.
-            conformer.SetId(0)
-            self.mol.AddConformer(conformer, assignId=True)
+            conf_mol = None
+            self.conformer(conformer)
 
         # Calculate some energies, other housekeeping.
         if self.mol is not False:
-            try:
-                ff = AllChem.UFFGetMoleculeForceField(self.mol)
-                self.energy = ff.CalcEnergy()
-            except:
-                Utils.log("Warning: Could not calculate energy for molecule " +
-                          Chem.MolToSmiles(self.mol))
-                # Example of smiles that cause problem here without try...catch:
-                # NC1=NC2=C(N[C@@H]3[C@H](N2)O[C@@H](COP(O)(O)=O)C2=C3S[Mo](S)(=O)(=O)S2)C(=O)N1
-                self.energy = 9999
-            self.minimized = False
+            if conf_mol is not None:
+                self.coords = get_conformer_coords(conf_mol.GetConformer())
+
+            if energy is not None:
+                # Already known, so no need to set up a force field.
+                self.energy = energy
+            else:
+                if conf_mol is None:
+                    conf_mol = self.make_rdkit_mol()
+                try:
+                    ff = AllChem.UFFGetMoleculeForceField(conf_mol)
+                    self.energy = ff.CalcEnergy()
+                except:
+                    Utils.log("Warning: Could not calculate energy for molecule " +
+                              Chem.MolToSmiles(conf_mol))
+                    # Example of smiles that cause problem here without try...catch:
+                    # NC1=NC2=C(N[C@@H]3[C@H](N2)O[C@@H](COP(O)(O)=O)C2=C3S[Mo](S)(=O)(=O)S2)C(=O)N1
+                    self.energy = 9999
             self.ids_hvy_atms = [a.GetIdx() for a in self.mol.GetAtoms()
                                  if a.GetAtomicNum() != 1]
 
+    def __getstate__(self):
+        """Gets the state of this conformer, for pickling. MyMol.MyMol packs
+           its conformers together instead (see pack_conformers).
+
+        :return: The state.
+        :rtype: tuple
+        """
+
+        return (
+            self.smiles,
+            mol_to_binary(self.mol),
+            None if self.coords is None else self.coords.tobytes(),
+            self.energy,
+            self.minimized,
+            self.ids_hvy_atms,
+        )
+
+    def __setstate__(self, state):
+        """Restores the state of this conformer, when unpickling.
+
+        :param state: The state, from __getstate__.
+        :type state: tuple
+        """
+
+        self.smiles, mol, coords, self.energy, self.minimized, \
+            self.ids_hvy_atms = state
+        self.mol = mol_from_binary(mol)
+        if coords is not None:
+            coords = numpy.frombuffer(coords, dtype=numpy.float32).reshape(-1, 3)
+            coords = coords.copy()
+        self.coords = coords
+
     def conformer(self, conf=None):
         """Get or set the conformer. An optional variable can specify the
            conformer to set. If not specified, this function acts as a get for
-           the conformer.
+           the conformer. The rdkit Conformer is made from the stored
+           coordinates when requested.
 
         :param conf: The conformer to set, defaults to None
         :param conf: rdkit.Conformer, optional
@@ -769,27 +1561,54 @@ class MyConformer:
         """
 
         if conf is None:
-            return self.mol.GetConformers()[0]
+            return make_rdkit_conformer(self.coords)
         else:
-            self.mol.RemoveAllConformers()
-            self.mol.AddConformer(conf)
+            self.coords = get_conformer_coords(conf)
+
+    def make_rdkit_mol(self):
+        """Makes a rdkit molecule with this conformer. Use it to write the
+           conformer out, or to run rdkit functions on it.
+
+        :return: A copy of the topology, holding only this conformer.
+        :rtype: rdkit.Mol
+        """
 
-    def minimize(self):
+        mol = Chem.Mol(self.mol)
+        mol.AddConformer(self.conformer(), assignId=True)
+        return mol
+
+    def minimize(self, max_iters=200, force_field="uff"):
         """Minimize (optimize) the geometry of the current conformer if it
-           hasn't already been optimized."""
+           hasn't already been optimized.
+
+        :param max_iters: The maximum number of minimization steps. Defaults
+           to 200.
+        :type max_iters: int, optional
+        :param force_field: The force field, "uff" or "mmff". Molecules that
+           MMFF can't parameterize are minimized with UFF (see
+           choose_force_field). Defaults to "uff".
+        :type force_field: str, optional
+        """
 
         if self.minimized == True:
             # Already minimized. Don't do it again.
             return
 
         # Perform the minimization, and save the energy.
+        mol = self.make_rdkit_mol()
         try:
-            ff = AllChem.UFFGetMoleculeForceField(self.mol)
-            ff.Minimize()
+            if choose_force_field(mol, force_field) == "mmff":
+                ff = AllChem.MMFFGetMoleculeForceField(
+                    mol, AllChem.MMFFGetMoleculeProperties(mol)
+                )
+            else:
+                ff = AllChem.UFFGetMoleculeForceField(mol)
+            ff.Minimize(maxIts=max_iters)
             self.energy = ff.CalcEnergy()
+            self.conformer(mol.GetConformer())
         except:
             Utils.log("Warning: Could not calculate energy for molecule " +
-                      Chem.MolToSmiles(self.mol))
+                      Chem.MolToSmiles(mol))
             self.energy = 9999
         self.minimized = True
 
@@ -803,18 +1622,16 @@ class MyConformer:
         """
 
         # Add the conformer of the other MyConformer object.
-        self.mol.AddConformer(other_conf.conformer(), assignId=True)
+        mol = self.make_rdkit_mol()
+        mol.AddConformer(other_conf.conformer(), assignId=True)
 
         # Align them.
-        AllChem.AlignMolConformers(self.mol, atomIds = self.ids_hvy_atms)
+        AllChem.AlignMolConformers(mol, atomIds = self.ids_hvy_atms)
 
         # Reset the conformer of the other MyConformer object.
-        last_conf = self.mol.GetConformers()[-1]
+        last_conf = mol.GetConformers()[-1]
         other_conf.conformer(last_conf)
 
-        # Remove the added conformer.
-        self.mol.RemoveConformer(last_conf.GetId())
-
         # Return that other object.
         return other_conf
 
@@ -822,10 +1639,7 @@ class MyConformer:
         """Prints out the first 500 letters of the molblock version of this
         conformer. Good for debugging."""
 
-        mol_copy = copy.deepcopy(self.mol_copy)  # Use it as a template.
-        mol_copy.RemoveAllConformers()
-        mol_copy.AddConformer(self.conformer)
-        Utils.log(Chem.MolToMolBlock(mol_copy)[:500])
+        Utils.log(Chem.MolToMolBlock(self.make_rdkit_mol())[:500])
 
     def rmsd_to_me(self, other_conf):
         """Calculate the rms distance between this conformer and another one.
@@ -22,12 +22,17 @@ import __future__
 import sys
 import json
 import os
+import time
 from datetime import datetime
 from collections import OrderedDict
 
 import gypsum_dl.Utils as Utils
 from gypsum_dl.Parallelizer import Parallelizer
 from gypsum_dl.Parallelizer import flatten_list
+from gypsum_dl.ContainerResult import ContainerResult
+from gypsum_dl.ContainerResult import make_container_results
+from gypsum_dl.ContainerResult import STATUS_INVALID_INPUT
+from gypsum_dl.ContainerResult import STATUS_ERROR
 
 try:
     from rdkit.Chem import AllChem
@@ -51,6 +56,8 @@ from gypsum_dl.Steps.ThreeD.PrepareThreeD import prepare_3d
 from gypsum_dl.Steps.IO.ProcessOutput import proccess_output
 from gypsum_dl.Steps.IO.LoadFiles import load_smiles_file
 from gypsum_dl.Steps.IO.LoadFiles import load_sdf_file
+from gypsum_dl.Steps.IO.MolLibrary import is_mol_library_file
+from gypsum_dl.Steps.IO.MolLibrary import load_mol_library_file
 
 # see http://www.rdkit.org/docs/GettingStartedInPython.html#working-with-3d-molecules
 def prepare_molecules(args):
@@ -59,6 +66,9 @@ def prepare_molecules(args):
 
     :param args: The arguments, from the commandline.
     :type args: dict
+    :return: A list of ContainerResult objects, one per input molecule,
+       describing whether 3D models were generated for it.
+    :rtype: list
     """
 
     # Keep track of the tim the program starts.
@@ -166,17 +176,41 @@ def prepare_molecules(args):
     if need_to_print_override_warning == True:
         Utils.log("WARNING: Using the --json flag overrides all other flags.")
 
+    # The fused pipeline only applies to multiprocessing mode (mpi mode
+    # always runs each container end-to-end on one node, and there is nothing
+    # to fuse in serial mode).
+    if params["fused_pipeline"] == True and params["job_manager"] != "multiprocessing":
+        Utils.log(
+            "WARNING: --fused_pipeline only applies to the multiprocessing job_manager. Ignoring it."
+        )
+        params["fused_pipeline"] = False
+
+    # Each container is output separately when it is prepared end-to-end on
+    # a single processor (mpi mode, or the fused pipeline).
+    if params["job_manager"] == "mpi":
+        per_contnr_mode = "mpi mode"
+    elif params["fused_pipeline"] == True:
+        per_contnr_mode = "fused_pipeline mode"
+    else:
+        per_contnr_mode = None
+
     # If running in mpi mode, separate_output_files must be set to true.
-    if params["job_manager"] == "mpi" and params["separate_output_files"] == False:
+    if per_contnr_mode is not None and params["separate_output_files"] == False:
         Utils.log(
-            "WARNING: Running in mpi mode, but separate_output_files is not set to True. Setting separate_output_files to True anyway."
+            "WARNING: Running in "
+            + per_contnr_mode
+            + ", but separate_output_files is not set to True. Setting separate_output_files to True anyway."
         )
         params["separate_output_files"] = True
 
     # Outputing HTML files not supported in mpi mode.
-    if params["job_manager"] == "mpi" and params["add_html_output"] == True:
+    if per_contnr_mode is not None and params["add_html_output"] == True:
         Utils.log(
-            "WARNING: Running in mpi mode, but add_html_output is set to True. HTML output is not supported in mpi mode."
+            "WARNING: Running in "
+            + per_contnr_mode
+            + ", but add_html_output is set to True. HTML output is not supported in "
+            + per_contnr_mode
+            + "."
         )
         params["add_html_output"] = False
 
@@ -202,10 +236,22 @@ def prepare_molecules(args):
         elif params["source"].lower().endswith(".sdf"):
             # It's an sdf file. Convert it to a smiles.
             smiles_data = load_sdf_file(src)
+        elif is_mol_library_file(src):
+            # It's a binary molecule library. The mols are already parsed.
+            smiles_data = load_mol_library_file(src)
         else:
             smiles_data = [params["source"]]
     else:
-        pass  # It's already in the required format.
+        # It's already a list of molecule tuples, (SMILES, Name), (SMILES,
+        # Name, properties) or (SMILES, Name, properties, rdkit.Mol). Add
+        # empty properties where they are missing.
+        Utils.log("Loading " + str(len(params["source"])) + " molecules from memory...")
+        smiles_data = []
+        for mol_tuple in params["source"]:
+            mol_tuple = tuple(mol_tuple)
+            if len(mol_tuple) == 2:
+                mol_tuple = mol_tuple + ({},)
+            smiles_data.append(mol_tuple)
 
     # Make the output directory if necessary.
     if os.path.exists(params["output_folder"]) == False:
@@ -223,53 +269,29 @@ def prepare_molecules(args):
     # print("###########################")
     # print("")
 
-    # Make the molecule containers.
-    contnrs = []
-    idx_counter = 0
-    for i in range(0, len(smiles_data)):
-        try:
-            smiles, name, props = smiles_data[i]
-        except:
-            msg = 'Unexpected error. Does your "source" parameter specify a '
-            msg = msg + "filename that ends in a .can, .smi, or .sdf extension?"
-            Utils.exception(msg)
-
-        if detect_unassigned_bonds(smiles) is None:
-            Utils.log(
-                "WARNING: Throwing out SMILES because of unassigned bonds: " + smiles
-            )
-            continue
-
-        new_contnr = MolContainer(smiles, name, idx_counter, props)
-        if (
-            new_contnr.orig_smi_canonical == None
-            or type(new_contnr.orig_smi_canonical) != str
-        ):
-            Utils.log(
-                "WARNING: Throwing out SMILES because of it couldn't convert to mol: "
-                + smiles
-            )
-            continue
-
-        contnrs.append(new_contnr)
-        idx_counter += 1
-
-    # Remove None types from failed conversion
-    contnrs = [x for x in contnrs if x.orig_smi_canonical != None]
-    if len(contnrs) != idx_counter:
-        Utils.exception("There is a corrupted container")
+    # Make the molecule containers. Molecules that are thrown out are
+    # reported in the results.
+    results = []
+    contnrs = make_mol_containers(smiles_data, results)
 
     # In multiprocessing mode, Gypsum-DL parallelizes each small-molecule
     # preparation step separately. But this scheme is inefficient in MPI mode
     # because it increases the amount of communication required between nodes.
     # So for MPI mode, we will run all the preparation steps for a given
-    # molecule container on a single thread.
-    if params["Parallelizer"].return_mode() != "mpi":
+    # molecule container on a single thread. The same is done in
+    # multiprocessing mode if fused_pipeline is set, so that no processor
+    # waits on the slowest molecule at the end of every step, and the
+    # intermediate variants never leave the processor that made them.
+    run_per_contnr = (
+        params["Parallelizer"].return_mode() == "mpi"
+        or params["fused_pipeline"] == True
+    )
+    if run_per_contnr == False:
         # Non-MPI (e.g., multiprocessing)
-        execute_gypsum_dl(contnrs, params)
+        results.extend(execute_gypsum_dl(contnrs, params))
     else:
-        # MPI mode. Group the molecule containers so they can be passed to the
-        # parallelizer.
+        # MPI or fused mode. Group the molecule containers so they can be
+        # passed to the parallelizer.
         job_input = []
         temp_param = {}
         for key in list(params.keys()):
@@ -283,7 +305,26 @@ def prepare_molecules(args):
             job_input.append(tuple([[contnr], temp_param]))
         job_input = tuple(job_input)
 
-        params["Parallelizer"].run(job_input, execute_gypsum_dl)
+        # A container that raises an exception is reported as an error
+        # rather than escaping into the Parallelizer.
+        if params["Parallelizer"].return_mode() == "mpi":
+            per_contnr_results = params["Parallelizer"].run(
+                job_input, execute_gypsum_dl_on_one_job
+            )
+        else:
+            per_contnr_results = params["Parallelizer"].run(
+                job_input,
+                execute_gypsum_dl_on_one_job,
+                params["num_processors"],
+                params["job_manager"],
+            )
+
+        # Each job returns the list of results of its one container.
+        if per_contnr_results is None:
+            per_contnr_results = []
+        for job_results in per_contnr_results:
+            if isinstance(job_results, list):
+                results.extend(job_results)
 
     # Calculate the total run time.
     end_time = datetime.now()
@@ -299,6 +340,41 @@ def prepare_molecules(args):
     # Kill mpi workers if necessary.
     params["Parallelizer"].end(params["job_manager"])
 
+    return results
+
+
+def set_up_in_process_params(args):
+    """Sets up the parameters once so that execute_gypsum_dl can be called
+    directly on many small groups of molecule containers in the current
+    process (e.g., one ligand at a time within a worker that is already part
+    of a larger multiprocessing or mpi job). No Parallelizer is made, so every
+    step runs in serial in this process.
+
+    :param args: The parameters. The "source" may be a list of tuples,
+       (SMILES, Name, properties[, rdkit.Mol]).
+    :type args: dict
+    :return: The parameters, processed as by set_parameters, with the
+       "Parallelizer" set to None.
+    :rtype: dict
+    """
+
+    params = set_parameters(args)
+    params["job_manager"] = "serial"
+    params["num_processors"] = 1
+    params["Parallelizer"] = None
+
+    # Make the output directory if necessary.
+    if os.path.exists(params["output_folder"]) == False:
+        try:
+            os.makedirs(params["output_folder"])
+        except:
+            # Another worker may have just made it.
+            pass
+        if os.path.exists(params["output_folder"]) == False:
+            Utils.exception("Output folder directory couldn't be found or created.")
+
+    return params
+
 
 def execute_gypsum_dl(contnrs, params):
     """A function for doing all of the manipulations to each molecule.
@@ -307,15 +383,23 @@ def execute_gypsum_dl(contnrs, params):
     :type contnrs: list
     :param params: A dictionary containing all of the parameters.
     :type params: dict
+    :return: A list of ContainerResult objects, one per container, with the
+       number of variants generated and the time spent in each step.
+    :rtype: list
     """
     # Start creating the models.
+    timings = {}
 
     # Prepare the smiles. Desalt, consider alternate ionization, tautometeric,
     # stereoisomeric forms, etc.
+    step_start = time.time()
     prepare_smiles(contnrs, params)
+    timings["prepare_smiles"] = time.time() - step_start
 
     # Convert the processed SMILES strings to 3D.
+    step_start = time.time()
     prepare_3d(contnrs, params)
+    timings["prepare_3d"] = time.time() - step_start
 
     # Add in name and unique id to each molecule.
     add_mol_id_props(contnrs)
@@ -327,19 +411,120 @@ def execute_gypsum_dl(contnrs, params):
     deal_with_failed_molecules(contnrs, params)
 
     # Process the output.
+    step_start = time.time()
     proccess_output(contnrs, params)
+    timings["output"] = time.time() - step_start
 
+    return make_container_results(contnrs, timings)
 
-def detect_unassigned_bonds(smiles):
+
+def execute_gypsum_dl_on_one_job(contnrs, params):
+    """Runs execute_gypsum_dl on the containers of a single job (e.g., one
+    container in mpi or fused_pipeline mode). If preparing them raises an
+    exception, each container is reported as an error instead, so a failing
+    molecule never takes down the Parallelizer's worker.
+
+    :param contnrs: A list of containers (MolContainer.MolContainer).
+    :type contnrs: list
+    :param params: A dictionary containing all of the parameters.
+    :type params: dict
+    :return: A list of ContainerResult objects, one per container.
+    :rtype: list
+    """
+
+    try:
+        return execute_gypsum_dl(contnrs, params)
+    except Exception as e:
+        Utils.log(
+            "ERROR: Could not prepare "
+            + ", ".join([contnr.name for contnr in contnrs])
+            + ": "
+            + repr(e)
+        )
+        return [
+            ContainerResult(contnr.name, contnr.orig_smi, STATUS_ERROR, error=repr(e))
+            for contnr in contnrs
+        ]
+
+
+def make_mol_containers(smiles_data, rejected=None):
+    """Makes the molecule containers of a list of molecules. Molecules with
+       unassigned bonds or which can't be converted to a mol are thrown out.
+
+    :param smiles_data: A list of tuples, (SMILES, Name, properties) or
+       (SMILES, Name, properties, rdkit.Mol) if the mol is already parsed.
+    :type smiles_data: list
+    :param rejected: A list to add a ContainerResult to (with status
+       STATUS_INVALID_INPUT) for every molecule that is thrown out. Defaults
+       to None (not recorded).
+    :type rejected: list
+    :return: A list of containers (MolContainer.MolContainer).
+    :rtype: list
+    """
+
+    contnrs = []
+    idx_counter = 0
+    for i in range(0, len(smiles_data)):
+        try:
+            smiles, name, props = smiles_data[i][:3]
+        except:
+            msg = 'Unexpected error. Does your "source" parameter specify a '
+            msg = msg + "filename that ends in a .can, .smi, .sdf, or .mlib extension?"
+            Utils.exception(msg)
+
+        # Entries loaded from a molecule library also carry the parsed mol.
+        mol = smiles_data[i][3] if len(smiles_data[i]) > 3 else None
+
+        if detect_unassigned_bonds(smiles, mol) is None:
+            msg = "WARNING: Throwing out SMILES because of unassigned bonds: " + smiles
+            Utils.log(msg)
+            if rejected is not None:
+                rejected.append(
+                    ContainerResult(name, smiles, STATUS_INVALID_INPUT, error=msg)
+                )
+            continue
+
+        new_contnr = MolContainer(smiles, name, idx_counter, props, mol)
+        if (
+            new_contnr.orig_smi_canonical == None
+            or type(new_contnr.orig_smi_canonical) != str
+        ):
+            msg = (
+                "WARNING: Throwing out SMILES because of it couldn't convert to mol: "
+                + smiles
+            )
+            Utils.log(msg)
+            if rejected is not None:
+                rejected.append(
+                    ContainerResult(name, smiles, STATUS_INVALID_INPUT, error=msg)
+                )
+            continue
+
+        contnrs.append(new_contnr)
+        idx_counter += 1
+
+    # Remove None types from failed conversion
+    contnrs = [x for x in contnrs if x.orig_smi_canonical != None]
+    if len(contnrs) != idx_counter:
+        Utils.exception("There is a corrupted container")
+
+    return contnrs
+
+
+def detect_unassigned_bonds(smiles, mol=None):
     """Detects whether a give smiles string has unassigned bonds.
 
     :param smiles: The smiles string.
     :type smiles: string
+    :param mol: The already parsed rdkit.Mol of the smiles string, if
+       available. Defaults to None, in which case the smiles is parsed.
+    :type mol: rdkit.Mol, optional
     :return: None if it has bad bonds, or the input smiles string otherwise.
     :rtype: None|string
     """
 
-    mol = Chem.MolFromSmiles(smiles, sanitize=False)
+    if mol is None:
+        mol = Chem.MolFromSmiles(smiles, sanitize=False)
     if mol is None:
         # Apparently the bonds are particularly bad, because couldn't even
         # create the molecule.
@@ -379,6 +564,17 @@ def set_parameters(params_unicode):
             "thoroughness": 3,
             "max_variants_per_compound": 5,
             "second_embed": False,
+            "embed_multiple_confs": False,
+            "embed_num_threads": 1,
+            "template_embedding": False,
+            "adaptive_sampling": False,
+            "fused_pipeline": False,
+            "batch_minimize": False,
+            "minimize_num_threads": 1,
+            "force_field": "uff",
+            "minimize_max_iters": 200,
+            "best_first_protonation": False,
+            "tautomer_backend": "molvs",
             "2d_output_only": False,
             "skip_optimize_geometry": False,
             "skip_alternate_ring_conformations": False,
@@ -389,8 +585,11 @@ def set_parameters(params_unicode):
             "let_tautomers_change_chirality": False,
             "use_durrant_lab_filters": False,
             "job_manager": "multiprocessing",
+            "skip_params_sdf": False,
+            "skip_sdf_output": False,
             "cache_prerun": False,
             "test": False,
+            "benchmark": False,
         }
     )
 
@@ -447,6 +646,11 @@ def merge_parameters(default, params):
             Utils.log(" ".join(sorted(list(default.keys()))))
             Utils.exception("Unrecognized parameter: " + str(param))
 
+        # The source may also be a list of (SMILES, Name, ...) tuples.
+        if param == "source" and isinstance(params[param], (list, tuple)):
+            default[param] = list(params[param])
+            continue
+
         # Throw an error if the input parameter has a different type than
         # the default one.
         if not isinstance(params[param], type_dict[param]):
@@ -525,18 +729,26 @@ def finalize_params(params):
     # ends in ".smi", it's treated as a smiles file. If it's a string that
     # ends in ".sdf", it's treated as an sdf file. If it's any other
     # string, it's assumed to be a smiles string itself and is assigned a
-    # name of "". If it's a list, it's assumed to be a list of tuples,
+    # name of "". If it ends in ".mlib", it's treated as a binary molecule
+    # library of already parsed molecules. If it's a list, it's assumed to be a list of tuples,
     # [SMILES, Name].
 
     # Check some required variables.
-    try:
-        params["source"] = os.path.abspath(params["source"])
-    except:
-        Utils.exception("Source file doesn't exist.")
-    source_dir = params["source"].strip(os.path.basename(params["source"]))
+    if isinstance(params["source"], list):
+        # The molecules are already in memory, so there is no source file.
+        if params["output_folder"] == "":
+            Utils.exception(
+                "Specify the output_folder when the source is a list of molecules."
+            )
+    else:
+        try:
+            params["source"] = os.path.abspath(params["source"])
+        except:
+            Utils.exception("Source file doesn't exist.")
+        source_dir = params["source"].strip(os.path.basename(params["source"]))
 
-    if params["output_folder"] == "" and params["source"] != "":
-        params["output_folder"] = source_dir + "output" + str(os.sep)
+        if params["output_folder"] == "" and params["source"] != "":
+            params["output_folder"] = source_dir + "output" + str(os.sep)
 
     if params["add_pdb_output"] == True and params["output_folder"] == "":
         Utils.exception("To output files as .pdbs, specify the output_folder.")
@@ -554,6 +766,16 @@ def finalize_params(params):
     # Make sure job_manager is always lower case.
     params["job_manager"] = params["job_manager"].lower()
 
+    # Make sure the force field is one that can be used to minimize.
+    params["force_field"] = params["force_field"].lower()
+    if params["force_field"] not in ["uff", "mmff"]:
+        Utils.exception('The force_field must be "uff" or "mmff".')
+
+    # Make sure the tautomer backend is one that exists.
+    params["tautomer_backend"] = params["tautomer_backend"].lower()
+    if params["tautomer_backend"] not in ["molvs", "rdkit"]:
+        Utils.exception('The tautomer_backend must be "molvs" or "rdkit".')
+
     return params
 
 
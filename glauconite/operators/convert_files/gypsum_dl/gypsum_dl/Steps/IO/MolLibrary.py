@@ -0,0 +1,195 @@
+# Copyright 2018 Jacob D. Durrant
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A module for reading and writing binary molecule libraries (.mlib files).
+
+A molecule library stores already parsed and sanitized molecules so that
+later stages do not need to parse the SMILES strings again. The file starts
+with MAGIC and is followed by one record per molecule. Each record is three
+length-prefixed fields (a little-endian unsigned 32-bit length followed by
+that many bytes):
+
+    name (utf-8), SMILES (utf-8), rdkit binary mol (rdkit.Chem.Mol.ToBinary())
+"""
+
+import __future__
+
+import struct
+
+from gypsum_dl import Utils
+
+try:
+    from rdkit import Chem
+except:
+    Utils.exception("You need to install rdkit and its dependencies.")
+
+MOL_LIBRARY_EXTENSION = ".mlib"
+MAGIC = b"GYPMLIB1"
+LENGTH_PREFIX = struct.Struct("<I")
+
+
+def is_mol_library_file(filename):
+    """Checks whether a filename is a binary molecule library.
+
+    :param filename: The filename.
+    :type filename: str
+    :return: True if the filename has the molecule-library extension.
+    :rtype: bool
+    """
+
+    return isinstance(filename, str) and filename.lower().endswith(
+        MOL_LIBRARY_EXTENSION
+    )
+
+
+class MolLibraryWriter:
+    """Writes molecules to a binary molecule library one record at a time.
+    Can be used as a context manager."""
+
+    def __init__(self, filename):
+        """The constructor.
+
+        :param filename: The filename of the library to write.
+        :type filename: str
+        """
+
+        self.filename = filename
+        self.num_records = 0
+        self.file = open(filename, "wb")
+        self.file.write(MAGIC)
+
+    def write(self, smiles, name, mol):
+        """Adds a single molecule to the library.
+
+        :param smiles: The SMILES string of the molecule.
+        :type smiles: str
+        :param name: The name of the molecule.
+        :type name: str
+        :param mol: The molecule, either as an rdkit.Mol object or as bytes
+           already produced by rdkit.Mol.ToBinary().
+        :type mol: rdkit.Mol or bytes
+        """
+
+        if not isinstance(mol, bytes):
+            mol = mol.ToBinary()
+
+        for field in [name.encode("utf-8"), smiles.encode("utf-8"), mol]:
+            self.file.write(LENGTH_PREFIX.pack(len(field)))
+            self.file.write(field)
+        self.num_records = self.num_records + 1
+
+    def close(self):
+        """Closes the library file."""
+
+        self.file.close()
+
+    def __enter__(self):
+        """Starts the context manager.
+
+        :return: This writer.
+        :rtype: MolLibraryWriter
+        """
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes the library file when the context manager exits."""
+
+        self.close()
+
+
+def write_mol_library(filename, records):
+    """Writes a binary molecule library.
+
+    :param filename: The filename of the library to write.
+    :type filename: str
+    :param records: An iterable of (SMILES, Name, mol) tuples, where mol is an
+       rdkit.Mol object or its ToBinary() bytes.
+    :type records: iterable
+    :return: The number of records written.
+    :rtype: int
+    """
+
+    with MolLibraryWriter(filename) as writer:
+        for smiles, name, mol in records:
+            writer.write(smiles, name, mol)
+        return writer.num_records
+
+
+def _read_field(lib_file, filename):
+    """Reads one length-prefixed field from an open molecule library.
+
+    :param lib_file: The open (binary mode) library file.
+    :type lib_file: file
+    :param filename: The filename, used in error messages.
+    :type filename: str
+    :return: The bytes of the field, or None at the end of the file.
+    :rtype: bytes or None
+    """
+
+    prefix = lib_file.read(LENGTH_PREFIX.size)
+    if len(prefix) == 0:
+        return None
+    if len(prefix) != LENGTH_PREFIX.size:
+        Utils.exception("The molecule library " + filename + " is truncated.")
+
+    length = LENGTH_PREFIX.unpack(prefix)[0]
+    field = lib_file.read(length)
+    if len(field) != length:
+        Utils.exception("The molecule library " + filename + " is truncated.")
+    return field
+
+
+def iter_mol_library(filename):
+    """Iterates through a binary molecule library without building the
+    rdkit.Mol objects, so the caller decides where (and if) to unpickle them.
+
+    :param filename: The filename of the library.
+    :type filename: str
+    :return: A generator of (SMILES, Name, mol_binary) tuples.
+    :rtype: generator
+    """
+
+    with open(filename, "rb") as lib_file:
+        if lib_file.read(len(MAGIC)) != MAGIC:
+            Utils.exception(filename + " is not a molecule library.")
+
+        while True:
+            name = _read_field(lib_file, filename)
+            if name is None:
+                break
+            smiles = _read_field(lib_file, filename)
+            mol_binary = _read_field(lib_file, filename)
+            if smiles is None or mol_binary is None:
+                Utils.exception("The molecule library " + filename + " is truncated.")
+
+            yield (smiles.decode("utf-8"), name.decode("utf-8"), mol_binary)
+
+
+def load_mol_library_file(filename):
+    """Loads a binary molecule library.
+
+    :param filename: The filename.
+    :type filename: str
+    :return: A list of tuples, (SMILES, Name, properties, rdkit.Mol). The
+       rdkit.Mol objects are already sanitized.
+    :rtype: list
+    """
+
+    data = []
+    for smiles, name, mol_binary in iter_mol_library(filename):
+        data.append((smiles, name, {}, Chem.Mol(mol_binary)))
+
+    return data
@@ -37,8 +37,9 @@ def proccess_output(contnrs, params):
         # Write to an HTML file.
         web_2d_output(contnrs, output_folder)
 
-    # Write to an SDF file.
-    save_to_sdf(contnrs, params, separate_output_files, output_folder)
+    # Write to an SDF file, unless the caller writes the molecules itself.
+    if params["skip_sdf_output"] == False:
+        save_to_sdf(contnrs, params, separate_output_files, output_folder)
 
     # Also write to PDB files, if requested.
     if params["add_pdb_output"] == True:
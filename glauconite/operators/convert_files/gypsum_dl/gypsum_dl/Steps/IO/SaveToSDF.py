@@ -44,18 +44,9 @@ def save_to_sdf(contnrs, params, separate_output_files, output_folder):
     # Save an empty molecule with the parameters.
     if separate_output_files == False:
         w = Chem.SDWriter(output_folder + os.sep + "gypsum_dl_success.sdf")
-    else:
-        w = Chem.SDWriter(output_folder + os.sep + "gypsum_dl_params.sdf")
-
-    m = Chem.Mol()
-    m.SetProp("_Name", "EMPTY MOLECULE DESCRIBING GYPSUM-DL PARAMETERS")
-    for param in params:
-        m.SetProp(param, str(params[param]))
-    w.write(m)
-
-    if separate_output_files == True:
-        w.flush()
-        w.close()
+        w.write(make_params_mol(params))
+    elif params.get("skip_params_sdf", False) == False:
+        save_params_to_sdf(params, output_folder + os.sep + "gypsum_dl_params.sdf")
 
     # Also save the file or files containing the output molecules.
     Utils.log("Saving molecules associated with...")
@@ -89,3 +80,35 @@ def save_to_sdf(contnrs, params, separate_output_files, output_folder):
     if separate_output_files == False:
         w.flush()
         w.close()
+
+
+def make_params_mol(params):
+    """Makes an empty molecule with the parameters as its properties.
+
+    :param params: The parameters.
+    :type params: dict
+    :return: The empty molecule.
+    :rtype: rdkit.Mol
+    """
+
+    m = Chem.Mol()
+    m.SetProp("_Name", "EMPTY MOLECULE DESCRIBING GYPSUM-DL PARAMETERS")
+    for param in params:
+        m.SetProp(param, str(params[param]))
+    return m
+
+
+def save_params_to_sdf(params, sdf_file):
+    """Saves an SDF file containing only the empty molecule describing the
+    parameters.
+
+    :param params: The parameters.
+    :type params: dict
+    :param sdf_file: The path of the SDF file to write.
+    :type sdf_file: str
+    """
+
+    w = Chem.SDWriter(sdf_file)
+    w.write(make_params_mol(params))
+    w.flush()
+    w.close()
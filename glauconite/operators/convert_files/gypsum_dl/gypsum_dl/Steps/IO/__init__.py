@@ -29,3 +29,4 @@ sys.path.extend([current_dir, Steps, gypsum_gypsum_dir, gypsum_top_dir])
 from gypsum_dl.Steps.IO.ProcessOutput import proccess_output
 from gypsum_dl.Steps.IO.LoadFiles import load_smiles_file
 from gypsum_dl.Steps.IO.LoadFiles import load_sdf_file
+from gypsum_dl.Steps.IO.MolLibrary import load_mol_library_file
@@ -26,6 +26,7 @@ import gypsum_dl.MyMol as MyMol
 import gypsum_dl.MolContainer as MolCont
 
 from gypsum_dl.Steps.SMILES.dimorphite_dl.dimorphite_dl import Protonate
+from gypsum_dl.Steps.SMILES.dimorphite_dl.dimorphite_dl import run_with_smiles_list
 
 
 def add_hydrogens(
@@ -38,6 +39,8 @@ def add_hydrogens(
     num_procs,
     job_manager,
     parallelizer_obj,
+    best_first=False,
+    template_embedding=False,
 ):
     """Adds hydrogen atoms to molecule containers, as appropriate for a given
        pH.
@@ -68,6 +71,14 @@ def add_hydrogens(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param best_first: Whether Dimorphite-DL should enumerate the ionization
+       states from most to least probable, stopping once it has enough.
+       Defaults to False.
+    :type best_first: bool, optional
+    :param template_embedding: Whether to embed the variants of each
+       compound using a sibling variant as a template, when picking the
+       lowest-energy ones. Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     Utils.log("Ionizing all molecules...")
@@ -78,6 +89,7 @@ def add_hydrogens(
         "max_ph": max_pH,
         "pka_precision": st_dev,
         "max_variants": thoroughness * max_variants_per_compound,
+        "best_first": best_first,
     }
 
     # Format the inputs for use in the parallelizer.
@@ -89,13 +101,18 @@ def add_hydrogens(
         ]
     )
 
-    # Run the parallelizer and collect the results.
+    # Run the parallelizer and collect the results. When running in serial,
+    # protonate all the molecules in one batch instead, so Dimorphite-DL sets
+    # up its protonation substructures once.
     results = []
-    if parallelizer_obj != None:
+    if parallelizer_obj != None and job_manager != "serial":
         results = parallelizer_obj.run(inputs, parallel_add_H, num_procs, job_manager)
     else:
-        for i in inputs:
-            results.append(parallel_add_H(i[0], i[1]))
+        smis_lst = run_with_smiles_list(
+            [i[0].orig_smi_canonical for i in inputs], **dict(protonation_settings)
+        )
+        for i, smis in zip(inputs, smis_lst):
+            results.append(make_protonated_mols(i[0], smis))
 
     results = Parallelizer.flatten_list(results)
 
@@ -132,7 +149,11 @@ def add_hydrogens(
     # Keep only the top few compound variants in each container, to prevent a
     # combinatorial explosion.
     ChemUtils.bst_for_each_contnr_no_opt(
-        contnrs, results, max_variants_per_compound, thoroughness
+        contnrs,
+        results,
+        max_variants_per_compound,
+        thoroughness,
+        template_embedding=template_embedding,
     )
 
 
@@ -162,6 +183,21 @@ def parallel_add_H(contnr, protonation_settings):
     # Protonate the SMILESstring. This is Dimorphite-DL.
     smis = Protonate(protonation_settings)
 
+    return make_protonated_mols(contnr, smis)
+
+
+def make_protonated_mols(contnr, smis):
+    """Converts the protonated SMILES strings of a molecule container to
+       MyMol.MyMol objects.
+
+    :param contnr: The molecule container.
+    :type contnr: MolContainer.MolContainer
+    :param smis: The protonated SMILES strings from Dimorphite-DL.
+    :type smis: list
+    :return: A list of MyMol.MyMol objects.
+    :rtype: list
+    """
+
     # Convert the protonated SMILES strings into a list of rdkit molecule
     # objects.
     rdkit_mols = [Chem.MolFromSmiles(smi.strip()) for smi in smis]
@@ -120,7 +120,7 @@ def durrant_lab_filters(contnrs, num_procs, job_manager, parallelizer_obj):
         )
     else:
         for c in params:
-            tmp.append(parallel_durrant_lab_filter(c, prohibited_substructs))
+            tmp.append(parallel_durrant_lab_filter(c[0], c[1]))
 
     # Note that results is a list of containers.
 
@@ -19,7 +19,6 @@ A module for generating alternate chiralities.
 import __future__
 
 import copy
-import itertools
 import random
 
 import gypsum_dl.Parallelizer as Parallelizer
@@ -40,6 +39,7 @@ def enumerate_chiral_molecules(
     num_procs,
     job_manager,
     parallelizer_obj,
+    template_embedding=False,
 ):
     """Enumerates all possible enantiomers of a molecule. If the chirality of
        an atom is given, that chiral center is not varied. Only the chirality
@@ -65,6 +65,10 @@ def enumerate_chiral_molecules(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param template_embedding: Whether to embed the variants of each
+       compound using a sibling variant as a template, when picking the
+       lowest-energy ones. Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     # No point in continuing none requested.
@@ -114,7 +118,11 @@ def enumerate_chiral_molecules(
     # Keep only the top few compound variants in each container, to prevent a
     # combinatorial explosion.
     ChemUtils.bst_for_each_contnr_no_opt(
-        contnrs, flat, max_variants_per_compound, thoroughness
+        contnrs,
+        flat,
+        max_variants_per_compound,
+        thoroughness,
+        template_embedding=template_embedding,
     )
 
 
@@ -144,23 +152,12 @@ def parallel_get_chiral(mol, max_variants_per_compound, thoroughness):
     unasignd = [p[0] for p in mol.chiral_cntrs_w_unasignd() if p[1] == "?"]
     num = len(unasignd)
 
-    # Get all possible chiral assignments. If the chirality is specified,
-    # retain it.
+    # If the chirality is specified, retain it.
     results = []
     if num == 0:
         # There are no unspecified chiral centers, so just keep existing.
         results.append(mol)
         return results
-    elif num == 1:
-        # There's only one chiral center.
-        options = ["R", "S"]
-    else:
-        # There are multiple chiral centers.
-        starting = [["R"], ["S"]]
-        options = [["R"], ["S"]]
-        for i in range(num - 1):
-            options = list(itertools.product(options, starting))
-            options = [list(itertools.chain(c[0], c[1])) for c in options]
 
     # Let the user know the number of chiral centers.
     Utils.log(
@@ -169,15 +166,16 @@ def parallel_get_chiral(mol, max_variants_per_compound, thoroughness):
         + " ("
         + mol.name
         + ") has "
-        + str(len(options))
+        + str(2 ** num)
         + " enantiomers when chiral centers with "
         + "no specified chirality are systematically varied."
     )
 
     # Randomly select a few of the chiral combinations to examine. This is to
-    # reduce the potential  combinatorial explosion.
+    # reduce the potential  combinatorial explosion. Only the selected
+    # combinations are built, not all 2^num of them.
     num_to_keep_initially = thoroughness * max_variants_per_compound
-    options = Utils.random_sample(options, num_to_keep_initially, "")
+    options = Utils.random_sample_product(["R", "S"], num, num_to_keep_initially)
 
     # Go through the chirality combinations and make a molecule with that
     # chirality.
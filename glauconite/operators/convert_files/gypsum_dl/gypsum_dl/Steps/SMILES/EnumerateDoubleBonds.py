@@ -32,6 +32,11 @@ try:
 except:
     Utils.exception("You need to install rdkit and its dependencies.")
 
+# The maximum number of up/down combinations of the single bonds around the
+# unspecified double bonds to consider per molecule. If there are more, this
+# many are randomly selected instead.
+MAX_SNGL_BND_CONFIG_OPTIONS = 4096
+
 
 def enumerate_double_bonds(
     contnrs,
@@ -40,6 +45,7 @@ def enumerate_double_bonds(
     num_procs,
     job_manager,
     parallelizer_obj,
+    template_embedding=False,
 ):
     """Enumerates all possible cis-trans isomers. If the stereochemistry of a
        double bond is specified, it is not varied. All unspecified double bonds
@@ -65,6 +71,10 @@ def enumerate_double_bonds(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param template_embedding: Whether to embed the variants of each
+       compound using a sibling variant as a template, when picking the
+       lowest-energy ones. Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     # No need to continue if none are requested.
@@ -118,7 +128,11 @@ def enumerate_double_bonds(
     # Keep only the top few compound variants in each container, to prevent a
     # combinatorial explosion.
     ChemUtils.bst_for_each_contnr_no_opt(
-        contnrs, flat, max_variants_per_compound, thoroughness
+        contnrs,
+        flat,
+        max_variants_per_compound,
+        thoroughness,
+        template_embedding=template_embedding,
     )
 
 
@@ -205,10 +219,17 @@ def parallel_get_double_bonded(mol, max_variants_per_compound):
         all_sngl_bnd_idxs |= set(idxs_of_other_bnds_frm_atm2)
 
     # Now come up with all possible up/down combinations for those bonds.
+    # These are generated one at a time rather than all stored in memory. If
+    # there are too many, only consider a random selection of them.
     all_sngl_bnd_idxs = list(all_sngl_bnd_idxs)
-    all_atom_config_options = list(
-        itertools.product([True, False], repeat=len(all_sngl_bnd_idxs))
-    )
+    if 2 ** len(all_sngl_bnd_idxs) <= MAX_SNGL_BND_CONFIG_OPTIONS:
+        all_atom_config_options = itertools.product(
+            [True, False], repeat=len(all_sngl_bnd_idxs)
+        )
+    else:
+        all_atom_config_options = Utils.random_sample_product(
+            [True, False], len(all_sngl_bnd_idxs), MAX_SNGL_BND_CONFIG_OPTIONS
+        )
 
     # Let the user know.
     if dbl_bnd_count > 0:
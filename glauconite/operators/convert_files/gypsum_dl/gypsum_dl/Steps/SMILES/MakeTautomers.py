@@ -13,7 +13,8 @@
 # limitations under the License.
 
 """
-This module makes alternate tautomeric states, using MolVS.
+This module makes alternate tautomeric states, using MolVS or RDKit's
+(C++) tautomer enumerator.
 """
 
 import __future__
@@ -36,6 +37,25 @@ try:
 except:
     Utils.exception("You need to install molvs and its dependencies.")
 
+try:
+    from rdkit.Chem.MolStandardize import rdMolStandardize
+except:
+    # Only needed for the "rdkit" tautomer backend. Older versions of RDKit
+    # don't have it.
+    rdMolStandardize = None
+
+# The tautomers already enumerated in this process, keyed by (canonical
+# SMILES, max tautomers, backend). Values are lists of rdkit.Mol objects, or
+# None if the tautomers could not be enumerated.
+TAUTOMER_MEMO = {}
+
+# Forget all the memoized tautomers once there are this many entries, to
+# bound the memory used by long-running processes.
+MAX_TAUTOMER_MEMO_SIZE = 10000
+
+# The RDKit tautomer enumerators, keyed by max tautomers.
+RDKIT_TAUTOMER_ENUMERATORS = {}
+
 
 def make_tauts(
     contnrs,
@@ -45,6 +65,8 @@ def make_tauts(
     job_manager,
     let_tautomers_change_chirality,
     parallelizer_obj,
+    tautomer_backend="molvs",
+    template_embedding=False,
 ):
     """Generates tautomers of the molecules. Note that some of the generated
     tautomers are not realistic. If you find a certain improbable
@@ -75,6 +97,13 @@ def make_tauts(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param tautomer_backend: The tautomer enumerator to use, "molvs" or
+       "rdkit". Defaults to "molvs".
+    :type tautomer_backend: str, optional
+    :param template_embedding: Whether to embed the variants of each
+       compound using a sibling variant as a template, when picking the
+       lowest-energy ones. Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     # No need to proceed if there are no max variants.
@@ -87,7 +116,9 @@ def make_tauts(
     params = []
     for contnr in contnrs:
         for mol_index, mol in enumerate(contnr.mols):
-            params.append(tuple([contnr, mol_index, max_variants_per_compound]))
+            params.append(
+                tuple([contnr, mol_index, max_variants_per_compound, tautomer_backend])
+            )
     params = tuple(params)
 
     # Run the tautomizer through the parallel object.
@@ -96,7 +127,7 @@ def make_tauts(
         tmp = parallelizer_obj.run(params, parallel_make_taut, num_procs, job_manager)
     else:
         for i in params:
-            tmp.append(parallel_make_taut(i[0], i[1], i[2]))
+            tmp.append(parallel_make_taut(i[0], i[1], i[2], i[3]))
 
     # Flatten the resulting list of lists.
     none_data = tmp
@@ -119,11 +150,16 @@ def make_tauts(
     # Keep only the top few compound variants in each container, to prevent a
     # combinatorial explosion.
     ChemUtils.bst_for_each_contnr_no_opt(
-        contnrs, taut_data, max_variants_per_compound, thoroughness
+        contnrs,
+        taut_data,
+        max_variants_per_compound,
+        thoroughness,
+        template_embedding=template_embedding,
     )
 
 
-def parallel_make_taut(contnr, mol_index, max_variants_per_compound):
+def parallel_make_taut(contnr, mol_index, max_variants_per_compound,
+                       tautomer_backend="molvs"):
     """Makes alternate tautomers for a given molecule container. This is the
        function that gets fed into the parallelizer.
 
@@ -135,6 +171,9 @@ def parallel_make_taut(contnr, mol_index, max_variants_per_compound):
        only this number of variants (molecules) will be advanced to the next
        step.
     :type max_variants_per_compound: int
+    :param tautomer_backend: The tautomer enumerator to use, "molvs" or
+       "rdkit". Defaults to "molvs".
+    :type tautomer_backend: str, optional
     :return: A list of MyMol.MyMol objects, containing the alternate
         tautomeric forms.
     :rtype: list
@@ -144,36 +183,12 @@ def parallel_make_taut(contnr, mol_index, max_variants_per_compound):
     # given molecule index.
     mol = contnr.mols[mol_index]
 
-    # Create a temporary RDKit mol object, since that's what MolVS works with.
-    # TODO: There should be a copy function
-    m = MyMol.MyMol(mol.smiles()).rdkit_mol
-
-    # For tautomers to work, you need to not have any explicit hydrogens.
-    m = Chem.RemoveHs(m)
-
-    # Make sure it's not None.
-    if m is None:
-        Utils.log(
-            "\tCould not generate tautomers for "
-            + contnr.orig_smi
-            + ". I'm deleting it."
-        )
-        return
-
-    # Molecules should be kekulized already, but let's double check that.
-    # Because MolVS requires kekulized input.
-    Chem.Kekulize(m)
-    m = MOH.check_sanitization(m)
-    if m is None:
+    tauts_rdkit_mols = get_tautomers(
+        mol.smiles(), max_variants_per_compound, tautomer_backend, contnr.orig_smi
+    )
+    if tauts_rdkit_mols is None:
         return None
 
-    # Limit to max_variants_per_compound tauts. Note that another batch could
-    # add more, so you'll need to once again trim to this number later. But
-    # this could at least help prevent the combinatorial explosion at this
-    # stage.
-    enum = tautomer.TautomerEnumerator(max_tautomers=max_variants_per_compound)
-    tauts_rdkit_mols = enum.enumerate(m)
-
     # Make all those tautomers into MyMol objects.
     tauts_mols = [MyMol.MyMol(m) for m in tauts_rdkit_mols]
 
@@ -200,6 +215,114 @@ def parallel_make_taut(contnr, mol_index, max_variants_per_compound):
     return results
 
 
+def get_tautomers(smiles, max_tautomers, tautomer_backend="molvs", orig_smi=None):
+    """Enumerates the tautomers of a molecule. The results are memoized, so
+       molecules with the same canonical SMILES are only enumerated once per
+       process.
+
+    :param smiles: The canonical SMILES string of the molecule.
+    :type smiles: str
+    :param max_tautomers: The maximum number of tautomers to enumerate.
+    :type max_tautomers: int
+    :param tautomer_backend: The tautomer enumerator to use, "molvs" or
+       "rdkit". Defaults to "molvs".
+    :type tautomer_backend: str, optional
+    :param orig_smi: The input SMILES string, for the log. Defaults to None
+       (use smiles).
+    :type orig_smi: str, optional
+    :return: A list of rdkit.Mol objects (copies, so they can be modified), or
+       None if the tautomers could not be enumerated.
+    :rtype: list
+    """
+
+    key = (smiles, max_tautomers, tautomer_backend)
+    if key not in TAUTOMER_MEMO:
+        if len(TAUTOMER_MEMO) >= MAX_TAUTOMER_MEMO_SIZE:
+            TAUTOMER_MEMO.clear()
+        TAUTOMER_MEMO[key] = enumerate_tautomers(
+            smiles, max_tautomers, tautomer_backend,
+            smiles if orig_smi is None else orig_smi
+        )
+
+    tauts = TAUTOMER_MEMO[key]
+    if tauts is None:
+        return None
+    return [Chem.Mol(t) for t in tauts]
+
+
+def enumerate_tautomers(smiles, max_tautomers, tautomer_backend, orig_smi):
+    """Enumerates the tautomers of a molecule (not memoized).
+
+    :param smiles: The canonical SMILES string of the molecule.
+    :type smiles: str
+    :param max_tautomers: The maximum number of tautomers to enumerate.
+    :type max_tautomers: int
+    :param tautomer_backend: The tautomer enumerator to use, "molvs" or
+       "rdkit".
+    :type tautomer_backend: str
+    :param orig_smi: The input SMILES string, for the log.
+    :type orig_smi: str
+    :return: A list of rdkit.Mol objects, or None if the tautomers could not
+       be enumerated.
+    :rtype: list
+    """
+
+    # Create a temporary RDKit mol object, since that's what MolVS works with.
+    m = MyMol.MyMol(smiles).rdkit_mol
+
+    # For tautomers to work, you need to not have any explicit hydrogens.
+    m = Chem.RemoveHs(m)
+
+    # Make sure it's not None.
+    if m is None:
+        Utils.log(
+            "\tCould not generate tautomers for "
+            + orig_smi
+            + ". I'm deleting it."
+        )
+        return None
+
+    # Molecules should be kekulized already, but let's double check that.
+    # Because MolVS requires kekulized input.
+    Chem.Kekulize(m)
+    m = MOH.check_sanitization(m)
+    if m is None:
+        return None
+
+    # Limit to max_tautomers tauts. Note that another batch could add more, so
+    # you'll need to once again trim to this number later. But this could at
+    # least help prevent the combinatorial explosion at this stage.
+    if tautomer_backend == "rdkit":
+        return list(get_rdkit_tautomer_enumerator(max_tautomers).Enumerate(m))
+
+    enum = tautomer.TautomerEnumerator(max_tautomers=max_tautomers)
+    return enum.enumerate(m)
+
+
+def get_rdkit_tautomer_enumerator(max_tautomers):
+    """Gets an RDKit tautomer enumerator, making it the first time it is
+       needed in this process.
+
+    :param max_tautomers: The maximum number of tautomers to enumerate.
+    :type max_tautomers: int
+    :return: The enumerator.
+    :rtype: rdkit.Chem.MolStandardize.rdMolStandardize.TautomerEnumerator
+    """
+
+    if rdMolStandardize is None:
+        Utils.exception(
+            'The "rdkit" tautomer backend requires a version of RDKit with '
+            + "rdMolStandardize.TautomerEnumerator."
+        )
+
+    if max_tautomers not in RDKIT_TAUTOMER_ENUMERATORS:
+        enumerator = rdMolStandardize.TautomerEnumerator()
+        enumerator.SetMaxTautomers(max_tautomers)
+        RDKIT_TAUTOMER_ENUMERATORS[max_tautomers] = enumerator
+
+    return RDKIT_TAUTOMER_ENUMERATORS[max_tautomers]
+
+
 def tauts_no_break_arom_rngs(
     contnrs, taut_data, num_procs, job_manager, parallelizer_obj
 ):
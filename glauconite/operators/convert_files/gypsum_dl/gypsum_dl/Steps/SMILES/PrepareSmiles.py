@@ -83,6 +83,8 @@ def prepare_smiles(contnrs, params):
             num_procs,
             job_manager,
             parallelizer_obj,
+            params["best_first_protonation"],
+            params["template_embedding"],
         )
         # Utils.log("Done with Ionization")
     else:
@@ -103,6 +105,8 @@ def prepare_smiles(contnrs, params):
             job_manager,
             let_tautomers_change_chirality,
             parallelizer_obj,
+            params["tautomer_backend"],
+            params["template_embedding"],
         )
         # Utils.log("Done with Tautomerization")
     else:
@@ -132,6 +136,7 @@ def prepare_smiles(contnrs, params):
             num_procs,
             job_manager,
             parallelizer_obj,
+            params["template_embedding"],
         )
         # Utils.log("Done with Chirality Enumeration")
     else:
@@ -150,6 +155,7 @@ def prepare_smiles(contnrs, params):
             num_procs,
             job_manager,
             parallelizer_obj,
+            params["template_embedding"],
         )
         # Utils.log("Done with Double Bond Enumeration")
     else:
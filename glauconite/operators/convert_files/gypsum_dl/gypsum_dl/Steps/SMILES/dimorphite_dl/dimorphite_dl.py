@@ -22,6 +22,9 @@ import copy
 import os
 import argparse
 import sys
+import heapq
+import math
+from collections import deque
 
 try:
     # Python2
@@ -206,6 +209,14 @@ class ArgParseFuncs:
             default=128,
             help="limit number of variants per input compound (default: 128)",
         )
+        parser.add_argument(
+            "--best_first",
+            action="store_true",
+            help="enumerate the protonation states from most to least "
+            + "probable, stopping once max_variants unique valid states are "
+            + "found, rather than keeping the first max_variants in site "
+            + "order",
+        )
         parser.add_argument(
             "--label_states",
             action="store_true",
@@ -239,6 +250,7 @@ class ArgParseFuncs:
             "label_states": False,
             "test": False,
             "max_variants": 128,
+            "best_first": False,
         }
 
         for key in defaults:
@@ -534,9 +546,9 @@ class Protonate(object):
         # Make the args an object variable variable.
         self.args = args
 
-        # A list to store the protonated SMILES strings associated with a
+        # A queue to store the protonated SMILES strings associated with a
         # single input model.
-        self.cur_prot_SMI = []
+        self.cur_prot_SMI = deque()
 
         # Clean and normalize the args
         self.args = ArgParseFuncs.clean_args(args)
@@ -544,7 +556,8 @@ class Protonate(object):
         # Make sure functions in ProtSubstructFuncs have access to the args.
         ProtSubstructFuncs.args = args
 
-        # Load the substructures that can be protonated.
+        # Load the substructures that can be protonated. These are cached, so
+        # making many Protonate objects with the same pH settings is cheap.
         self.subs = ProtSubstructFuncs.load_protonation_substructs_calc_state_for_ph(
             self.args["min_ph"], self.args["max_ph"], self.args["pka_precision"]
         )
@@ -580,10 +593,9 @@ class Protonate(object):
         """
 
         # If there are any SMILES strings in self.cur_prot_SMI, just return
-        # the first one and update the list to include only the remaining.
+        # the first one, removing it from the queue.
         if len(self.cur_prot_SMI) > 0:
-            first, self.cur_prot_SMI = self.cur_prot_SMI[0], self.cur_prot_SMI[1:]
-            return first
+            return self.cur_prot_SMI.popleft()
 
         # self.cur_prot_SMI is empty, so try to add more to it.
 
@@ -598,11 +610,6 @@ class Protonate(object):
         # protonation process, etc.
         orig_smi = smile_and_datum["smiles"]
 
-        # Dimorphite-DL may protonate some sites in ways that produce invalid
-        # SMILES. We need to keep track of all smiles so we can "rewind" to
-        # the last valid one, should things go south.
-        properly_formed_smi_found = [orig_smi]
-
         # Everything on SMILES line but the SMILES string itself (e.g., the
         # molecule name).
         data = smile_and_datum["data"]
@@ -616,10 +623,52 @@ class Protonate(object):
         # the site SHOULD be in (not the one it IS in per the SMILES string).
         # It's calculated based on the probablistic distributions obtained
         # during training.
+        site_pkas = {}
         (
             sites,
             mol_used_to_idx_sites,
-        ) = ProtSubstructFuncs.get_prot_sites_and_target_states(orig_smi, self.subs)
+        ) = ProtSubstructFuncs.get_prot_sites_and_target_states(
+            orig_smi, self.subs, site_pkas
+        )
+
+        if self.args["best_first"] and len(sites) > 0:
+            new_smis = self.enumerate_best_first(
+                orig_smi, sites, site_pkas, mol_used_to_idx_sites
+            )
+        else:
+            new_smis = self.enumerate_in_site_order(
+                orig_smi, sites, mol_used_to_idx_sites
+            )
+
+        # If the user wants to see the target states, add those to the ends of
+        # each line.
+        if self.args["label_states"]:
+            states = "\t".join([x[1] for x in sites])
+            new_lines = [x + "\t" + tag + "\t" + states for x in new_smis]
+        else:
+            new_lines = [x + "\t" + tag for x in new_smis]
+
+        self.cur_prot_SMI = deque(new_lines)
+
+        return self.next()
+
+    def enumerate_in_site_order(self, orig_smi, sites, mol_used_to_idx_sites):
+        """Protonates the sites of a molecule one at a time, keeping the first
+        max_variants molecules after each site.
+
+        :param string orig_smi: The SMILES string of the input molecule.
+        :param list sites: The protonation sites, from
+                           get_prot_sites_and_target_states.
+        :param rdkit.Chem.rdchem.Mol mol_used_to_idx_sites: The molecule used
+                                                           to index the sites.
+        :return: A list of the unique, valid protonated SMILES strings.
+        :rtype: list
+        """
+
+        # Dimorphite-DL may protonate some sites in ways that produce invalid
+        # SMILES. We need to keep track of all smiles so we can "rewind" to
+        # the last valid one, should things go south.
+        properly_formed_smi_found = [orig_smi]
 
         new_mols = [mol_used_to_idx_sites]
         if len(sites) > 0:
@@ -683,17 +732,66 @@ class Protonate(object):
                     new_smis = [smi]
                     break
 
-        # If the user wants to see the target states, add those to the ends of
-        # each line.
-        if self.args["label_states"]:
-            states = "\t".join([x[1] for x in sites])
-            new_lines = [x + "\t" + tag + "\t" + states for x in new_smis]
-        else:
-            new_lines = [x + "\t" + tag for x in new_smis]
+        return new_smis
+
+    def enumerate_best_first(self, orig_smi, sites, site_pkas, mol_used_to_idx_sites):
+        """Generates the protonation states of a molecule lazily, from most to
+        least probable (given the distance between the pH and the pKa of each
+        site), deduplicating them by canonical SMILES as it goes. Stops as
+        soon as max_variants unique, valid states have been found.
+
+        :param string orig_smi: The SMILES string of the input molecule.
+        :param list sites: The protonation sites, from
+                           get_prot_sites_and_target_states.
+        :param dict site_pkas: The pKa of each site, from
+                               get_prot_sites_and_target_states.
+        :param rdkit.Chem.rdchem.Mol mol_used_to_idx_sites: The molecule used
+                                                           to index the sites.
+        :return: A list of the unique, valid protonated SMILES strings, from
+                 most to least probable.
+        :rtype: list
+        """
 
-        self.cur_prot_SMI = new_lines
+        max_variants = self.args["max_variants"]
+        ph = (self.args["min_ph"] + self.args["max_ph"]) / 2.0
+        site_options = [
+            ProtSubstructFuncs.get_site_charge_options(site, site_pkas.get(site), ph)
+            for site in sites
+        ]
 
-        return self.next()
+        # Give up after this many states, in case most are invalid.
+        max_tries = max_variants * ProtSubstructFuncs.max_tries_per_variant
+
+        seen_smis = set([])
+        new_smis = []
+        for num_tries, charges in enumerate(
+            ProtSubstructFuncs.iter_charges_best_first(site_options)
+        ):
+            if len(new_smis) >= max_variants or num_tries >= max_tries:
+                break
+
+            mol = ProtSubstructFuncs.make_protonation_state(
+                mol_used_to_idx_sites, sites, charges
+            )
+            if mol is None:
+                continue
+
+            # One canonicalization per state.
+            smi = Chem.MolToSmiles(mol, isomericSmiles=True, canonical=True)
+            if smi in seen_smis:
+                continue
+            seen_smis.add(smi)
+
+            # Sometimes Dimorphite-DL generates molecules that aren't actually
+            # possible. Skip those.
+            if UtilFuncs.convert_smiles_str_to_mol(smi) is not None:
+                new_smis.append(smi)
+
+        # If there are no smi left, return the input one at the very least.
+        if len(new_smis) == 0 and UtilFuncs.convert_smiles_str_to_mol(orig_smi) is not None:
+            new_smis = [orig_smi]
+
+        return new_smis
 
 
 class ProtSubstructFuncs:
@@ -702,24 +800,36 @@ class ProtSubstructFuncs:
 
     args = {}
 
+    # The lines of the site_substructures.smarts file, once read.
+    smarts_file_lines = None
+
+    # The compiled protonation substructures, keyed by (min_ph, max_ph,
+    # pka_std_range). Shared by every Protonate object in the process.
+    subs_cache = {}
+
+    # With best_first, the number of protonation states to try per requested
+    # variant before giving up (in case many states are invalid).
+    max_tries_per_variant = 4
+
     @staticmethod
     def load_substructre_smarts_file():
         """Loads the substructure smarts file. Similar to just using readlines,
-        except it filters out comments (lines that start with "#").
+        except it filters out comments (lines that start with "#"). The file
+        is only read once per process.
 
         :return: A list of the lines in the site_substructures.smarts file,
                  except blank lines and lines that start with "#"
         """
 
-        pwd = os.path.dirname(os.path.realpath(__file__))
-        site_structures_file = "{}/{}".format(pwd, "site_substructures.smarts")
-        lines = [
-            l
-            for l in open(site_structures_file, "r")
-            if l.strip() != "" and not l.startswith("#")
-        ]
+        if ProtSubstructFuncs.smarts_file_lines is None:
+            pwd = os.path.dirname(os.path.realpath(__file__))
+            site_structures_file = "{}/{}".format(pwd, "site_substructures.smarts")
+            with open(site_structures_file, "r") as f:
+                ProtSubstructFuncs.smarts_file_lines = [
+                    l for l in f if l.strip() != "" and not l.startswith("#")
+                ]
 
-        return lines
+        return ProtSubstructFuncs.smarts_file_lines
 
     @staticmethod
     def load_protonation_substructs_calc_state_for_ph(
@@ -733,9 +843,13 @@ class ProtSubstructFuncs:
         :param pka_std_range: Basically the precision (stdev from predicted pKa to
                               consider), defaults to 1.
         :return: A dict of the protonation substructions for the specified pH
-                 range.
+                 range. It is cached and shared, so it must not be modified.
         """
 
+        key = (float(min_ph), float(max_ph), float(pka_std_range))
+        if key in ProtSubstructFuncs.subs_cache:
+            return ProtSubstructFuncs.subs_cache[key]
+
         subs = []
 
         for line in ProtSubstructFuncs.load_substructre_smarts_file():
@@ -758,10 +872,12 @@ class ProtSubstructFuncs:
                         mean, std, min_ph, max_ph
                     )
 
-                    prot.append([site, protonation_state])
+                    prot.append([site, protonation_state, mean])
 
                 sub["prot_states_for_pH"] = prot
                 subs.append(sub)
+
+        ProtSubstructFuncs.subs_cache[key] = subs
         return subs
 
     @staticmethod
@@ -792,13 +908,15 @@ class ProtSubstructFuncs:
         return protonation_state
 
     @staticmethod
-    def get_prot_sites_and_target_states(smi, subs):
+    def get_prot_sites_and_target_states(smi, subs, site_pkas=None):
         """For a single molecule, find all possible matches in the protonation
         R-group list, subs. Items that are higher on the list will be matched
         first, to the exclusion of later items.
 
         :param string smi: A SMILES string.
         :param list subs: Substructure information.
+        :param dict site_pkas: If given, filled with the mean pKa of each
+                               protonation site (keyed by the site).
         :return: A list of protonation sites (atom index), pKa bin.
             ('PROTONATED', 'BOTH', or  'DEPROTONATED'), and reaction name.
             Also, the mol object that was used to generate the atom index.
@@ -824,29 +942,39 @@ class ProtSubstructFuncs:
             UtilFuncs.eprint("ERROR:   ", smi)
             return []
 
-        ProtectUnprotectFuncs.unprotect_molecule(mol_used_to_idx_sites)
+        # Keep track of the atoms that have already been matched (protected),
+        # so later (lower priority) substructures can't match them. A set of
+        # atom indexes is much faster than per-atom properties.
+        protected = set([])
         protonation_sites = []
 
         for item in subs:
-            smart = item["mol"]
-            if mol_used_to_idx_sites.HasSubstructMatch(smart):
-                matches = ProtectUnprotectFuncs.get_unprotected_matches(
-                    mol_used_to_idx_sites, smart
-                )
-                prot = item["prot_states_for_pH"]
-                for match in matches:
-                    # We want to move the site from being relative to the
-                    # substructure, to the index on the main molecule.
-                    for site in prot:
-                        proton = int(site[0])
-                        category = site[1]
-                        new_site = (match[proton], category, item["name"])
-
-                        if not new_site in protonation_sites:
-                            # Because sites must be unique.
-                            protonation_sites.append(new_site)
-
-                    ProtectUnprotectFuncs.protect_molecule(mol_used_to_idx_sites, match)
+            # A single matching pass per substructure (no separate
+            # HasSubstructMatch check first). Matches with atoms protected by
+            # earlier substructures are skipped. Matches of this substructure
+            # don't exclude each other.
+            matches = [
+                match
+                for match in mol_used_to_idx_sites.GetSubstructMatches(item["mol"])
+                if protected.isdisjoint(match)
+            ]
+
+            prot = item["prot_states_for_pH"]
+            for match in matches:
+                # We want to move the site from being relative to the
+                # substructure, to the index on the main molecule.
+                for site in prot:
+                    proton = int(site[0])
+                    category = site[1]
+                    new_site = (match[proton], category, item["name"])
+
+                    if not new_site in protonation_sites:
+                        # Because sites must be unique.
+                        protonation_sites.append(new_site)
+                        if site_pkas is not None:
+                            site_pkas[new_site] = site[2]
+
+                protected.update(match)
 
         return protonation_sites, mol_used_to_idx_sites
 
@@ -889,22 +1017,10 @@ class ProtSubstructFuncs:
                  objects.
         """
 
-        # Sets up the output list and the Nitrogen charge
+        # Sets up the output list
         output = []
 
         for charge in charges:
-            # The charge for Nitrogens is 1 higher than others (i.e.,
-            # protonated state is positively charged).
-            nitrogen_charge = charge + 1
-
-            # But there are a few nitrogen moieties where the acidic group is
-            # the neutral one. Amides are a good example. I gave some thought
-            # re. how to best flag these. I decided that those
-            # nitrogen-containing moieties where the acidic group is neutral
-            # (rather than positively charged) will have "*" in the name.
-            if "*" in prot_site_name:
-                nitrogen_charge = nitrogen_charge - 1  # Undo what was done previously.
-
             for mol in mols:
                 # Make a copy of the molecule.
                 mol_copy = copy.deepcopy(mol)
@@ -920,53 +1036,195 @@ class ProtSubstructFuncs:
                         )
                     continue
 
-                atom = mol_copy.GetAtomWithIdx(idx)
-
-                explicit_bond_order_total = sum(
-                    [b.GetBondTypeAsDouble() for b in atom.GetBonds()]
+                ProtSubstructFuncs.set_atom_protonation_charge(
+                    mol_copy, idx, charge, prot_site_name
                 )
 
-                # Assign the protonation charge, with special care for
-                # nitrogens
-                element = atom.GetAtomicNum()
-                if element == 7:
-                    atom.SetFormalCharge(nitrogen_charge)
-
-                    # Need to figure out how many hydrogens to add.
-                    if nitrogen_charge == 1 and explicit_bond_order_total == 1:
-                        atom.SetNumExplicitHs(3)
-                    elif nitrogen_charge == 1 and explicit_bond_order_total == 2:
-                        atom.SetNumExplicitHs(2)
-                    elif nitrogen_charge == 1 and explicit_bond_order_total == 3:
-                        atom.SetNumExplicitHs(1)
-                    elif nitrogen_charge == 0 and explicit_bond_order_total == 1:
-                        atom.SetNumExplicitHs(2)
-                    elif nitrogen_charge == 0 and explicit_bond_order_total == 2:
-                        atom.SetNumExplicitHs(1)
-                    elif nitrogen_charge == -1 and explicit_bond_order_total == 2:
-                        atom.SetNumExplicitHs(0)
-                    elif nitrogen_charge == -1 and explicit_bond_order_total == 1:
-                        atom.SetNumExplicitHs(1)
-                    #### JDD
-                else:
-                    atom.SetFormalCharge(charge)
-                    if element == 8 or element == 16:  # O and S
-                        if charge == 0 and explicit_bond_order_total == 1:
-                            atom.SetNumExplicitHs(1)
-                        elif charge == -1 and explicit_bond_order_total == 1:
-                            atom.SetNumExplicitHs(0)
-
-                # Deprotonating protonated aromatic nitrogen gives [nH-]. Change this
-                # to [n-].
-                if "[nH-]" in Chem.MolToSmiles(mol_copy):
+                output.append(mol_copy)
+
+        return output
+
+    @staticmethod
+    def set_atom_protonation_charge(mol_copy, idx, charge, prot_site_name):
+        """Sets the atomic charge (and number of hydrogens) of one site of a
+        molecule, in place. The molecule must not have explicit hydrogen atoms.
+
+        :param rdkit.Chem.rdchem.Mol mol_copy: The molecule.
+        :param int idx:                        The index of the atom.
+        :param int charge:                     The charge to assign (-1 for
+                                               deprotonated, 0 for
+                                               protonated).
+        :param string prot_site_name:          The name of the protonation
+                                               site.
+        """
+
+        # The charge for Nitrogens is 1 higher than others (i.e.,
+        # protonated state is positively charged).
+        nitrogen_charge = charge + 1
+
+        # But there are a few nitrogen moieties where the acidic group is
+        # the neutral one. Amides are a good example. I gave some thought
+        # re. how to best flag these. I decided that those
+        # nitrogen-containing moieties where the acidic group is neutral
+        # (rather than positively charged) will have "*" in the name.
+        if "*" in prot_site_name:
+            nitrogen_charge = nitrogen_charge - 1  # Undo what was done previously.
+
+        atom = mol_copy.GetAtomWithIdx(idx)
+
+        explicit_bond_order_total = sum(
+            [b.GetBondTypeAsDouble() for b in atom.GetBonds()]
+        )
+
+        # Assign the protonation charge, with special care for
+        # nitrogens
+        element = atom.GetAtomicNum()
+        if element == 7:
+            atom.SetFormalCharge(nitrogen_charge)
+
+            # Need to figure out how many hydrogens to add.
+            if nitrogen_charge == 1 and explicit_bond_order_total == 1:
+                atom.SetNumExplicitHs(3)
+            elif nitrogen_charge == 1 and explicit_bond_order_total == 2:
+                atom.SetNumExplicitHs(2)
+            elif nitrogen_charge == 1 and explicit_bond_order_total == 3:
+                atom.SetNumExplicitHs(1)
+            elif nitrogen_charge == 0 and explicit_bond_order_total == 1:
+                atom.SetNumExplicitHs(2)
+            elif nitrogen_charge == 0 and explicit_bond_order_total == 2:
+                atom.SetNumExplicitHs(1)
+            elif nitrogen_charge == -1 and explicit_bond_order_total == 2:
+                atom.SetNumExplicitHs(0)
+            elif nitrogen_charge == -1 and explicit_bond_order_total == 1:
+                atom.SetNumExplicitHs(1)
+            #### JDD
+        else:
+            atom.SetFormalCharge(charge)
+            if element == 8 or element == 16:  # O and S
+                if charge == 0 and explicit_bond_order_total == 1:
+                    atom.SetNumExplicitHs(1)
+                elif charge == -1 and explicit_bond_order_total == 1:
                     atom.SetNumExplicitHs(0)
 
-                mol_copy.UpdatePropertyCache(strict=False)
-                # prod.UpdatePropertyCache(strict=False)
+        # Deprotonating protonated aromatic nitrogen gives [nH-]. Change this
+        # to [n-]. Only an aromatic nitrogen with a negative charge can be
+        # written as [nH-], so skip making the SMILES string if there isn't
+        # one.
+        if ProtSubstructFuncs.has_negative_aromatic_nitrogen(
+            mol_copy
+        ) and "[nH-]" in Chem.MolToSmiles(mol_copy):
+            atom.SetNumExplicitHs(0)
 
-                output.append(mol_copy)
+        mol_copy.UpdatePropertyCache(strict=False)
+        # prod.UpdatePropertyCache(strict=False)
 
-        return output
+    @staticmethod
+    def has_negative_aromatic_nitrogen(mol):
+        """Checks whether a molecule has an aromatic nitrogen with a negative
+        charge.
+
+        :param rdkit.Chem.rdchem.Mol mol: The molecule.
+        :return: A boolean, whether there is such a nitrogen.
+        """
+
+        for atom in mol.GetAtoms():
+            if (
+                atom.GetAtomicNum() == 7
+                and atom.GetIsAromatic()
+                and atom.GetFormalCharge() < 0
+            ):
+                return True
+        return False
+
+    @staticmethod
+    def get_site_charge_options(site, pka, ph):
+        """Gets the charges a site can take, with their costs (the negative log
+        of their probabilities at the given pH), from most to least probable.
+
+        :param tuple site: The protonation site (idx, target_prot_state,
+                           prot_site_name).
+        :param float pka:  The mean pKa of the site, or None if not known.
+        :param float ph:   The pH.
+        :return: A list of (cost, charge) tuples, sorted by cost.
+        """
+
+        target_prot_state = site[1]
+        if target_prot_state == "DEPROTONATED":
+            return [(0.0, -1)]
+        if target_prot_state == "PROTONATED":
+            return [(0.0, 0)]
+
+        # BOTH. The fraction protonated, per the Henderson-Hasselbalch
+        # equation.
+        if pka is None:
+            frac_protonated = 0.5
+        else:
+            frac_protonated = 1.0 / (1.0 + 10.0 ** min(ph - pka, 300.0))
+        frac_protonated = min(max(frac_protonated, 1e-12), 1.0 - 1e-12)
+
+        options = [
+            (-math.log(frac_protonated), 0),
+            (-math.log(1.0 - frac_protonated), -1),
+        ]
+        options.sort()
+        return options
+
+    @staticmethod
+    def iter_charges_best_first(site_options):
+        """Lazily generates the combinations of site charges, from most to
+        least probable (lowest to highest total cost). Only the combinations
+        actually requested are built.
+
+        :param list site_options: The (cost, charge) options of each site,
+                                  from get_site_charge_options.
+        :return: A generator of lists with the charge of each site.
+        """
+
+        first = tuple([0] * len(site_options))
+        heap = [(sum([opts[0][0] for opts in site_options]), first)]
+        queued = set([first])
+
+        while len(heap) > 0:
+            cost, choice = heapq.heappop(heap)
+            yield [site_options[i][c][1] for i, c in enumerate(choice)]
+
+            # The next most probable combinations differ from this one at one
+            # site.
+            for i, c in enumerate(choice):
+                if c + 1 >= len(site_options[i]):
+                    continue
+                next_choice = choice[:i] + (c + 1,) + choice[i + 1 :]
+                if next_choice in queued:
+                    continue
+                queued.add(next_choice)
+                next_cost = (
+                    cost - site_options[i][c][0] + site_options[i][c + 1][0]
+                )
+                heapq.heappush(heap, (next_cost, next_choice))
+
+    @staticmethod
+    def make_protonation_state(mol, sites, charges):
+        """Makes a copy of a molecule with the given charges assigned to its
+        protonation sites.
+
+        :param rdkit.Chem.rdchem.Mol mol: The molecule used to index the sites.
+        :param list sites:                The protonation sites.
+        :param list charges:              The charge of each site.
+        :return: The protonated molecule, or None if it could not be made.
+        """
+
+        mol_copy = copy.deepcopy(mol)
+        try:
+            mol_copy = Chem.RemoveHs(mol_copy)
+        except:
+            return None
+
+        for site, charge in zip(sites, charges):
+            ProtSubstructFuncs.set_atom_protonation_charge(
+                mol_copy, site[0], charge, site[2]
+            )
+
+        return mol_copy
 
 
 class ProtectUnprotectFuncs:
@@ -1378,6 +1636,49 @@ def run(**kwargs):
     main(kwargs)
 
 
+def run_with_smiles_list(smiles_lst, **kwargs):
+    """A helpful, importable function for protonating many SMILES strings at
+    once. All the SMILES strings are run through a single Protonate object, so
+    the protonation substructures are only loaded and compiled once.
+
+    :param smiles_lst: A list of SMILES strings.
+    :type smiles_lst: list
+    :param **kwargs: For a complete description, run dimorphite_dl.py from the
+        command line with the -h option. Must not include "smiles" or
+        "smiles_file".
+    :type kwargs: dict
+    :return: A list with the protonated SMILES strings (a list) of each input
+             SMILES string, in the same order. The list of a poorly formed
+             SMILES string is empty.
+    :rtype: list
+    """
+
+    for bad_arg in ["smiles", "smiles_file"]:
+        if bad_arg in kwargs:
+            msg = (
+                "You're using Dimorphite-DL's run_with_smiles_list(smiles_lst, "
+                + '**kwargs) function, but you also passed the "'
+                + bad_arg
+                + '" argument.'
+            )
+            UtilFuncs.eprint(msg)
+            raise Exception(msg)
+
+    # Tag each SMILES string with its index, so the protonated SMILES strings
+    # can be matched to their inputs.
+    kwargs["smiles"] = "\n".join(
+        [smi + "\t" + str(i) for i, smi in enumerate(smiles_lst)]
+    )
+    kwargs["label_states"] = False
+
+    protonated_smiles = [[] for smi in smiles_lst]
+    for line in Protonate(kwargs):
+        smi, idx = line.split("\t")
+        protonated_smiles[int(idx)].append(smi)
+
+    return protonated_smiles
+
+
 def run_with_mol_list(mol_lst, **kwargs):
     """A helpful, importable function for those who want to call Dimorphite-DL
     from another Python script rather than the command line. Note that this
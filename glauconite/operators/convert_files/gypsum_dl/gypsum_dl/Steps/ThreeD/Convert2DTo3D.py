@@ -14,7 +14,9 @@
 
 """
 A module to so the 2D to 3D conversion, though the actual code for that
-conversion is in MyMol.MyMol.make_first_3d_conf_no_min()
+conversion is in MyMol.MyMol.make_first_3d_conf_no_min(). Molecules that
+already have a conformer (e.g., from ChemUtils.pick_lowest_enrgy_mols) keep
+it.
 """
 
 import __future__
@@ -38,6 +40,7 @@ def convert_2d_to_3d(
     num_procs,
     job_manager,
     parallelizer_obj,
+    template_embedding=False,
 ):
     """Converts the 1D smiles strings into 3D small-molecule models.
 
@@ -61,24 +64,58 @@ def convert_2d_to_3d(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param template_embedding: Whether to embed the variants of each
+       compound using a sibling variant as a template (see
+       parallel_make_3d_from_template). Defaults to False.
+    :type template_embedding: bool, optional
     """
 
     Utils.log("Converting all molecules to 3D structures.")
 
-    # Make the inputs to pass to the parallelizer.
+    # Molecules picked by energy during the SMILES steps already have the
+    # (unminimized) conformer used to score them. These aren't embedded
+    # again.
+    num_mols = sum([len(contnr.mols) for contnr in contnrs])
+    num_reused = sum(
+        [len([m for m in contnr.mols if len(m.conformers) > 0]) for contnr in contnrs]
+    )
+    if num_reused > 0:
+        Utils.log(
+            "\tReusing the scoring conformers of "
+            + str(num_reused)
+            + " of "
+            + str(num_mols)
+            + " molecules ("
+            + str(num_reused)
+            + " 3D embeddings saved)."
+        )
+
+    # Make the inputs to pass to the parallelizer. If using templates, the
+    # variants of each container must be converted together.
     params = []
     for contnr in contnrs:
-        for mol in contnr.mols:
-            params.append(tuple([mol]))
+        if template_embedding == True:
+            params.append(tuple([contnr.mols]))
+        else:
+            for mol in contnr.mols:
+                params.append(tuple([mol]))
     params = tuple(params)
 
+    if template_embedding == True:
+        func = parallel_make_3d_from_template
+    else:
+        func = parallel_make_3d
+
     # Run the parallelizer
     tmp = []
     if parallelizer_obj != None:
-        tmp = parallelizer_obj.run(params, parallel_make_3d, num_procs, job_manager)
+        tmp = parallelizer_obj.run(params, func, num_procs, job_manager)
     else:
         for i in params:
-            tmp.append(parallel_make_3d(i[0]))
+            tmp.append(func(i[0]))
+
+    if template_embedding == True:
+        tmp = Parallelizer.flatten_list(tmp)
 
     # Remove and Nones from the output, which represent failed molecules.
     clear = Parallelizer.strip_none(tmp)
@@ -90,11 +127,42 @@ def convert_2d_to_3d(
     )
 
 
-def parallel_make_3d(mol):
+def parallel_make_3d_from_template(mols):
+    """Does the 2D to 3D conversion of all the variants of one compound. The
+       first variant with a conformer is used as a template for the others,
+       which is much faster than embedding each of them freely. Meant to run
+       within parallelizer.
+
+    :param mols: The variants to be converted.
+    :type mols: list
+    :return: A list of MyMol.MyMol objects with the 3D coordinates inside,
+       or None where the conversion failed.
+    :rtype: list
+    """
+
+    # Start with a variant that already has a conformer, if any.
+    with_confs = [mol for mol in mols if len(mol.conformers) > 0]
+    template = with_confs[0] if len(with_confs) > 0 else None
+
+    results = []
+    for mol in mols:
+        new_mol = parallel_make_3d(mol, template)
+        results.append(new_mol)
+        if template is None and new_mol is not None:
+            template = new_mol
+
+    return results
+
+
+def parallel_make_3d(mol, template=None):
     """Does the 2D to 3D conversion. Meant to run within parallelizer.
 
     :param mol: The molecule to be converted.
     :type mol: MyMol.MyMol
+    :param template: An optional sibling variant with a conformer, to use as
+       a template (see MyMol.MyMol.make_first_3d_conf_no_min). Defaults to
+       None.
+    :type template: MyMol.MyMol, optional
     :return: A MyMol.MyMol object with the 3D coordinates inside, or None if
        it fails.
     :rtype: MyMol.MyMol | None
@@ -111,7 +179,7 @@ def parallel_make_3d(mol):
         # Check if it has strange substructures.
         if mol.remove_bizarre_substruc() == False:
             # Perform the conversion.
-            mol.make_first_3d_conf_no_min()
+            mol.make_first_3d_conf_no_min(template)
 
             # If there are some conformations, make note of that in the
             # genealogy record.
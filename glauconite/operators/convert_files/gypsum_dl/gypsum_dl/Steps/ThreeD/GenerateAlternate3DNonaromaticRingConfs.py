@@ -20,13 +20,12 @@ conformations.
 
 import __future__
 
-import copy
 import warnings
 
 import gypsum_dl.Parallelizer as Parallelizer
 import gypsum_dl.Utils as Utils
 import gypsum_dl.ChemUtils as ChemUtils
-from gypsum_dl.MyMol import MyConformer
+from gypsum_dl.MyMol import MyConformer, make_contnr_conf_settings
 
 try:
     from rdkit import Chem
@@ -53,6 +52,7 @@ def generate_alternate_3d_nonaromatic_ring_confs(
     second_embed,
     job_manager,
     parallelizer_obj,
+    conf_settings=None,
 ):
     """Docking programs like Vina rotate chemical moieties around their
        rotatable bonds, so it's not necessary to generate a larger rotomer
@@ -86,6 +86,9 @@ def generate_alternate_3d_nonaromatic_ring_confs(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param conf_settings: The conformer settings (see
+       MyMol.make_conf_settings). Defaults to None.
+    :type conf_settings: dict, optional
     :return: Returns None if no ring conformers are generated
     :rtype: None
     """
@@ -103,9 +106,11 @@ def generate_alternate_3d_nonaromatic_ring_confs(
     for contnr_idx, contnr in enumerate(contnrs):
         if contnr.num_nonaro_rngs > 0:
             ones_with_nonaro_rngs.add(contnr_idx)
+            contnr_conf_settings = make_contnr_conf_settings(contnr, conf_settings)
             for mol in contnr.mols:
                 params.append(
-                    tuple([mol, max_variants_per_compound, thoroughness, second_embed])
+                    tuple([mol, max_variants_per_compound, thoroughness, second_embed,
+                           contnr_conf_settings])
                 )
     params = tuple(params)
 
@@ -121,7 +126,7 @@ def generate_alternate_3d_nonaromatic_ring_confs(
         )
     else:
         for i in params:
-            tmp.append(parallel_get_ring_confs(i[0], i[1], i[2], i[3]))
+            tmp.append(parallel_get_ring_confs(i[0], i[1], i[2], i[3], i[4]))
 
     # Flatten the results.
     results = Parallelizer.flatten_list(tmp)
@@ -168,7 +173,8 @@ def generate_alternate_3d_nonaromatic_ring_confs(
                 )
 
 
-def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second_embed):
+def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second_embed,
+                            conf_settings=None):
     """Gets alternate ring conformations. Meant to run with the parallelizer class.
 
     :param mol: The molecule to process (with non-aromatic ring(s)).
@@ -190,6 +196,9 @@ def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second
         run time, but sometimes converts certain molecules that would
         otherwise fail.
     :type second_embed: bool
+    :param conf_settings: The conformer settings (see
+       MyMol.make_conf_settings). Defaults to None.
+    :type conf_settings: dict, optional
     :return: A list of MyMol.MyMol objects, with alternate ring conformations.
     :rtype: list
     """
@@ -225,8 +234,14 @@ def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second
         rings_by_bond_indexes.append(bond_indexes)
 
     # Generate a bunch of conformations, ordered from best energy to worst.
-    # Note that this is cached. Minimizing too.
-    mol.add_conformers(thoroughness * max_variants_per_compound, 0.1, True)
+    # Note that this is cached. Minimizing too. If sampling adaptively, stop
+    # early once new conformers stop improving on the best ones.
+    num_confs = thoroughness * max_variants_per_compound
+    if conf_settings is not None and conf_settings["adaptive_sampling"] == True:
+        mol.add_conformers_adaptively(num_confs, max_variants_per_compound,
+                                      0.1, True, conf_settings)
+    else:
+        mol.add_conformers(num_confs, 0.1, True, conf_settings)
 
     if len(mol.conformers) > 0:
         # Sometimes there are no conformers if it's an impossible structure.
@@ -249,6 +264,10 @@ def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second
             list_of_rmslists[k] = []
             AllChem.AlignMolConformers(ring_mols[k], RMSlist=list_of_rmslists[k])
 
+        # The conformers are still stored (more compactly) in mol.conformers.
+        # Don't keep (and copy) them in the rdkit molecule too.
+        mol.rdkit_mol.RemoveAllConformers()
+
         # Get points for each conformer (rmsd_ring1, rmsd_ring2, rmsd_ring3)
         pts = numpy.array(list_of_rmslists).T
         pts = numpy.vstack((numpy.array([[0.0] * pts.shape[1]]), pts))
@@ -285,8 +304,9 @@ def parallel_get_ring_confs(mol, max_variants_per_compound, thoroughness, second
         # for returning.
         results = []
         for conf in best_confs:
-            new_mol = copy.deepcopy(mol)
-            c = MyConformer(new_mol, conf.conformer(), second_embed)
+            new_mol = mol.copy_without_conformers()
+            c = MyConformer(new_mol, conf.conformer(), second_embed,
+                            energy=conf.energy)
             new_mol.conformers = [c]
             energy = c.energy
 
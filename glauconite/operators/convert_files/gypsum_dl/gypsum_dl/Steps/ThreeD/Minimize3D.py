@@ -19,11 +19,9 @@ geometry.
 
 import __future__
 
-import copy
-
 import gypsum_dl.Utils as Utils
 import gypsum_dl.ChemUtils as ChemUtils
-from gypsum_dl.MyMol import MyConformer
+from gypsum_dl.MyMol import MyConformer, make_contnr_conf_settings
 
 
 def minimize_3d(
@@ -34,6 +32,7 @@ def minimize_3d(
     second_embed,
     job_manager,
     parallelizer_obj,
+    conf_settings=None,
 ):
     """This function minimizes a 3D molecular conformation. In an attempt to
        not get trapped in a local minimum, it actually generates a number of
@@ -65,6 +64,9 @@ def minimize_3d(
     :type job_manager: string
     :param parallelizer_obj: The Parallelizer object.
     :type parallelizer_obj: Parallelizer.Parallelizer
+    :param conf_settings: The conformer settings (see
+       MyMol.make_conf_settings). Defaults to None.
+    :type conf_settings: dict, optional
     """
 
     # Let the user know you're on this step.
@@ -77,10 +79,12 @@ def minimize_3d(
         if contnr.num_nonaro_rngs == 0:
             # Because ones with nonaromatic rings have already been minimized,
             # so they can be skipped here.
+            contnr_conf_settings = make_contnr_conf_settings(contnr, conf_settings)
             for mol in contnr.mols:
                 ones_without_nonaro_rngs.add(mol.contnr_idx)
                 params.append(
-                    tuple([mol, max_variants_per_compound, thoroughness, second_embed])
+                    tuple([mol, max_variants_per_compound, thoroughness, second_embed,
+                           contnr_conf_settings])
                 )
     params = tuple(params)
 
@@ -90,7 +94,7 @@ def minimize_3d(
         tmp = parallelizer_obj.run(params, parallel_minit, num_procs, job_manager)
     else:
         for i in params:
-            tmp.append(parallel_minit(i[0], i[1], i[2], i[3]))
+            tmp.append(parallel_minit(i[0], i[1], i[2], i[3], i[4]))
 
     # Save energy into MyMol object, and get a list of just those objects.
     contnr_list_not_empty = set([])  # To keep track of which container lists
@@ -122,7 +126,8 @@ def minimize_3d(
                 mol.conformers = []
 
 
-def parallel_minit(mol, max_variants_per_compound, thoroughness, second_embed):
+def parallel_minit(mol, max_variants_per_compound, thoroughness, second_embed,
+                   conf_settings=None):
     """Minimizes the geometries of a MyMol.MyMol object. Meant to be run
     within parallelizer.
 
@@ -145,12 +150,21 @@ def parallel_minit(mol, max_variants_per_compound, thoroughness, second_embed):
         run time, but sometimes converts certain molecules that would
         otherwise fail.
     :type second_embed: bool
+    :param conf_settings: The conformer settings (see
+       MyMol.make_conf_settings). Defaults to None.
+    :type conf_settings: dict, optional
     :return: A molecule with the minimized conformers inside it.
     :rtype: MyMol.MyMol
     """
 
-    # Not minimizing. Just adding the conformers.
-    mol.add_conformers(thoroughness * max_variants_per_compound, 0.1, False)
+    # Not minimizing. Just adding the conformers. If sampling adaptively,
+    # stop early once new conformers stop improving on the best ones.
+    num_confs = thoroughness * max_variants_per_compound
+    if conf_settings is not None and conf_settings["adaptive_sampling"] == True:
+        mol.add_conformers_adaptively(num_confs, max_variants_per_compound,
+                                      0.1, False, conf_settings)
+    else:
+        mol.add_conformers(num_confs, 0.1, False, conf_settings)
 
     if len(mol.conformers) > 0:
         # Because it is possible to find a molecule that has no
@@ -161,15 +175,16 @@ def parallel_minit(mol, max_variants_per_compound, thoroughness, second_embed):
         # Further minimize the unoptimized conformers that were among the best
         # scoring.
         max_vars_per_cmpd = max_variants_per_compound
-        for i in range(len(mol.conformers[:max_vars_per_cmpd])):
-            mol.conformers[i].minimize()
+        mol.minimize_conformers(mol.conformers[:max_vars_per_cmpd], conf_settings)
 
         # Remove similar conformers
         # mol.eliminate_structurally_similar_conformers()
 
-        # Get the best scoring (lowest energy) of these minimized conformers
-        new_mol = copy.deepcopy(mol)
-        c = MyConformer(new_mol, mol.conformers[0].conformer(), second_embed)
+        # Get the best scoring (lowest energy) of these minimized conformers.
+        # Its energy is already known from the minimization.
+        new_mol = mol.copy_without_conformers()
+        c = MyConformer(new_mol, mol.conformers[0].conformer(), second_embed,
+                        energy=mol.conformers[0].energy)
         new_mol.conformers = [c]
         best_energy = c.energy
 
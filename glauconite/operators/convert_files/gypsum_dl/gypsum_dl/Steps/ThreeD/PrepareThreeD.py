@@ -18,6 +18,7 @@ Runs the 3D preparation process.
 
 import __future__
 
+from gypsum_dl.MyMol import make_conf_settings
 from gypsum_dl.Steps.ThreeD.Convert2DTo3D import convert_2d_to_3d
 from gypsum_dl.Steps.ThreeD.GenerateAlternate3DNonaromaticRingConfs import (
     generate_alternate_3d_nonaromatic_ring_confs,
@@ -41,6 +42,7 @@ def prepare_3d(contnrs, params):
     num_procs = params["num_processors"]
     job_manager = params["job_manager"]
     parallelizer_obj = params["Parallelizer"]
+    conf_settings = make_conf_settings(params)
 
     # Do the 2d to 3d conversionl, if requested.
     if not params["2d_output_only"]:
@@ -52,6 +54,7 @@ def prepare_3d(contnrs, params):
             num_procs,
             job_manager,
             parallelizer_obj,
+            params["template_embedding"],
         )
 
         # Generate alternate non-aromatic ring conformations, if requested.
@@ -64,6 +67,7 @@ def prepare_3d(contnrs, params):
                 second_embed,
                 job_manager,
                 parallelizer_obj,
+                conf_settings,
             )
 
         # Minimize the molecules, if requested.
@@ -76,4 +80,5 @@ def prepare_3d(contnrs, params):
                 second_embed,
                 job_manager,
                 parallelizer_obj,
+                conf_settings,
             )
@@ -0,0 +1,223 @@
+# Copyright 2018 Jacob D. Durrant
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module benchmarks how long it takes to send the molecule containers
+between processes (i.e., to pickle and unpickle them) after each step of
+Gypsum-DL. It compares the compact serialization of MolContainer, MyMol, and
+MyConformer (rdkit binary molecules, packed conformers) to the default
+pickling of the same data laid out as before (Python attribute dicts, with a
+full rdkit molecule per conformer).
+"""
+
+import os
+import time
+import pickle
+
+from gypsum_dl.Start import set_parameters, make_mol_containers
+from gypsum_dl.Steps.IO.LoadFiles import load_smiles_file
+from gypsum_dl.Steps.SMILES.DeSaltOrigSmiles import desalt_orig_smi
+from gypsum_dl.Steps.SMILES.AddHydrogens import add_hydrogens
+from gypsum_dl.Steps.SMILES.MakeTautomers import make_tauts
+from gypsum_dl.Steps.SMILES.EnumerateChiralMols import enumerate_chiral_molecules
+from gypsum_dl.Steps.SMILES.EnumerateDoubleBonds import enumerate_double_bonds
+from gypsum_dl.Steps.ThreeD.Convert2DTo3D import convert_2d_to_3d
+from gypsum_dl.Steps.ThreeD.Minimize3D import minimize_3d
+from gypsum_dl.MyMol import MyMol, make_conf_settings
+
+# The number of times to pickle and unpickle the containers after each step.
+NUM_REPEATS = 5
+
+
+def make_legacy_data(contnrs):
+    """Lays out the containers as they were before they had their own
+       serialization: attribute dicts, with every conformer holding a full
+       rdkit molecule.
+
+    :param contnrs: A list of containers (MolContainer.MolContainer).
+    :type contnrs: list
+    :return: The same data, as nested dicts and lists.
+    :rtype: list
+    """
+
+    def legacy_mol(mol):
+        data = dict([(a, getattr(mol, a)) for a in MyMol.plain_state_attrs])
+        data["rdkit_mol"] = mol.rdkit_mol
+        data["conformers"] = [
+            {
+                "smiles": c.smiles,
+                "mol": c.make_rdkit_mol(),
+                "energy": c.energy,
+                "minimized": c.minimized,
+                "ids_hvy_atms": c.ids_hvy_atms,
+            }
+            for c in mol.conformers
+        ]
+        return data
+
+    legacy = []
+    for contnr in contnrs:
+        data = dict(contnr.__dict__)
+        data["mols"] = [legacy_mol(m) for m in contnr.mols]
+        data["mol_orig_frm_inp_smi"] = legacy_mol(contnr.mol_orig_frm_inp_smi)
+        legacy.append(data)
+
+    return legacy
+
+
+def time_transfer(data):
+    """Times pickling and unpickling some data, as when sending it to
+       another process.
+
+    :param data: The data.
+    :type data: object
+    :return: A (seconds per transfer, bytes) tuple.
+    :rtype: tuple
+    """
+
+    start = time.time()
+    for i in range(NUM_REPEATS):
+        pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        pickle.loads(pickled)
+    return (time.time() - start) / NUM_REPEATS, len(pickled)
+
+
+def get_transfer_cost(contnrs):
+    """Gets the cost of sending the containers to another process, before
+       and after the compact serialization.
+
+    :param contnrs: A list of containers (MolContainer.MolContainer).
+    :type contnrs: list
+    :return: A (before_secs, after_secs, before_bytes, after_bytes) tuple.
+    :rtype: tuple
+    """
+
+    before_secs, before_bytes = time_transfer(make_legacy_data(contnrs))
+    after_secs, after_bytes = time_transfer(contnrs)
+    return before_secs, after_secs, before_bytes, after_bytes
+
+
+def run_benchmark():
+    """Runs the sample molecules through the Gypsum-DL steps, serially, and
+       prints a table of the time and size of one transfer of all the
+       containers after each step, before and after the compact
+       serialization.
+    """
+
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+
+    # Make the Gypsum-DL parameters.
+    params = set_parameters(
+        {
+            "source": script_dir + os.sep + "sample_molecules.smi",
+            "job_manager": "serial",
+            "max_variants_per_compound": 8,
+            "thoroughness": 3,
+            "min_ph": 4,
+            "max_ph": 10,
+            "pka_precision": 1,
+        }
+    )
+    max_variants = params["max_variants_per_compound"]
+    thoroughness = params["thoroughness"]
+
+    contnrs = make_mol_containers(load_smiles_file(params["source"]))
+
+    # The steps, run serially one at a time.
+    steps = [
+        ("Desalting", lambda: desalt_orig_smi(contnrs, 1, "serial", None)),
+        (
+            "Ionization",
+            lambda: add_hydrogens(
+                contnrs,
+                params["min_ph"],
+                params["max_ph"],
+                params["pka_precision"],
+                max_variants,
+                thoroughness,
+                1,
+                "serial",
+                None,
+            ),
+        ),
+        (
+            "Tautomers",
+            lambda: make_tauts(
+                contnrs, max_variants, thoroughness, 1, "serial", False, None
+            ),
+        ),
+        (
+            "Chirality",
+            lambda: enumerate_chiral_molecules(
+                contnrs, max_variants, thoroughness, 1, "serial", None
+            ),
+        ),
+        (
+            "Double bonds",
+            lambda: enumerate_double_bonds(
+                contnrs, max_variants, thoroughness, 1, "serial", None
+            ),
+        ),
+        (
+            "3D conversion",
+            lambda: convert_2d_to_3d(
+                contnrs, max_variants, thoroughness, 1, "serial", None
+            ),
+        ),
+        (
+            "Minimization",
+            lambda: minimize_3d(
+                contnrs,
+                max_variants,
+                thoroughness,
+                1,
+                False,
+                "serial",
+                None,
+                make_conf_settings(params),
+            ),
+        ),
+    ]
+
+    # The containers are updated in place, so measure right after each step.
+    results = []
+    for step_name, step in steps:
+        step()
+        results.append((step_name, get_transfer_cost(contnrs)))
+
+    # Print the table directly. Utils.log wraps its text, which would break
+    # up the rows.
+    print("")
+    print("BENCHMARK RESULTS (time and size of one transfer of all containers)")
+    print("=" * 82)
+    print(
+        "{:<18} {:>13} {:>13} {:>9} {:>12} {:>12}".format(
+            "Step", "Before", "After", "Speedup", "Before", "After"
+        )
+    )
+    for step_name, (before_secs, after_secs, before_bytes, after_bytes) in results:
+        print(
+            "{:<18} {:>10.2f} ms {:>10.2f} ms {:>8.1f}x {:>10d} B {:>10d} B".format(
+                step_name,
+                1000.0 * before_secs,
+                1000.0 * after_secs,
+                before_secs / max(after_secs, 1e-9),
+                before_bytes,
+                after_bytes,
+            )
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -20,9 +20,15 @@ import __future__
 
 import subprocess
 import textwrap
+import threading
+import itertools
 import random
 import string
 
+# Where log() sends its messages in each thread. If a thread has no sink the
+# messages are printed to the screen.
+_LOG_SINK = threading.local()
+
 
 def group_mols_by_container_index(mol_lst):
     """Take a list of MyMol.MyMol objects, and place them in lists according to
@@ -88,6 +94,57 @@ def random_sample(lst, num, msg_if_cut=""):
     return lst
 
 
+def random_sample_product(options, repeat, num):
+    """Randomly selects distinct combinations from the cartesian product of
+       options with itself (i.e., itertools.product(options, repeat=repeat)).
+       Unlike passing the whole product to random_sample, only the selected
+       combinations are ever built, so this is safe to use even when the
+       product is astronomically large.
+
+    :param options: The options at each position (e.g., ["R", "S"]).
+    :type options: list
+    :param repeat: The number of positions.
+    :type repeat: int
+    :param num: The number of combinations to randomly select.
+    :type num: int
+    :return: A list of at most num distinct combinations (tuples), in random
+       order.
+    :rtype: list
+    """
+
+    num_options = len(options)
+    total = num_options ** repeat
+
+    if total <= 2 * num:
+        # The product is small (or most of it is needed anyway), so just
+        # build it and sample from it.
+        return random_sample(
+            list(itertools.product(options, repeat=repeat)), num, ""
+        )
+
+    # Draw distinct indexes into the product. Because total > 2 * num, few
+    # draws are rejected as repeats.
+    idxs_picked = set([])
+    idxs = []
+    while len(idxs) < num:
+        idx = random.randrange(total)
+        if idx not in idxs_picked:
+            idxs_picked.add(idx)
+            idxs.append(idx)
+
+    # Convert each index to its combination (the index's digits in base
+    # num_options).
+    combinations = []
+    for idx in idxs:
+        combination = []
+        for i in range(repeat):
+            idx, digit = divmod(idx, num_options)
+            combination.append(options[digit])
+        combinations.append(tuple(combination))
+
+    return combinations
+
+
 def log(txt, trailing_whitespace=""):
     """Prints a message to the screen.
 
@@ -99,14 +156,61 @@ def log(txt, trailing_whitespace=""):
     """
 
     whitespace_before = txt[: len(txt) - len(txt.lstrip())].replace("\t", "    ")
-    print(
-        textwrap.fill(
-            txt.strip(),
-            width=80,
-            initial_indent=whitespace_before,
-            subsequent_indent=whitespace_before + "    ",
-        ) + trailing_whitespace
-    )
+    msg = textwrap.fill(
+        txt.strip(),
+        width=80,
+        initial_indent=whitespace_before,
+        subsequent_indent=whitespace_before + "    ",
+    ) + trailing_whitespace
+
+    sink = get_log_sink()
+    if sink is not None:
+        sink.append(msg)
+    else:
+        print(msg)
+
+
+def get_log_sink():
+    """Gets the list that log() adds its messages to in the current thread.
+
+    :return: The list, or None if messages are printed to the screen.
+    :rtype: list or None
+    """
+
+    return getattr(_LOG_SINK, "lines", None)
+
+
+def set_log_sink(sink):
+    """Sets a list that log() adds its messages to (instead of printing them)
+    in the current thread only. Unlike redirecting sys.stdout, this does not
+    affect any other thread.
+
+    :param sink: The list, or None to print messages to the screen again.
+    :type sink: list or None
+    """
+
+    _LOG_SINK.lines = sink
+
+
+def call_with_log_sink(sink, func, *args):
+    """Calls a function with the messages of log() sent to a list. The sink
+    is set in the thread that calls the function, so this can be used as the
+    target of a helper thread (e.g., func_timeout).
+
+    :param sink: The list to add the messages to.
+    :type sink: list
+    :param func: The function to call.
+    :type func: function
+    :return: Whatever func returns.
+    :rtype: any
+    """
+
+    previous_sink = get_log_sink()
+    set_log_sink(sink)
+    try:
+        return func(*args)
+    finally:
+        set_log_sink(previous_sink)
 
 
 def fnd_contnrs_not_represntd(contnrs, results):
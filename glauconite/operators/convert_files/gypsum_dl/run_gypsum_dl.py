@@ -68,6 +68,7 @@ import argparse
 import copy
 from gypsum_dl.Start import prepare_molecules
 from gypsum_dl.Test.Tester import run_test
+from gypsum_dl.Test.Benchmark import run_benchmark
 from gypsum_dl import Utils
 
 PARSER = argparse.ArgumentParser(
@@ -205,6 +206,88 @@ PARSER.add_argument(
                     Larger values increase run times but can produce better \
                     results.",
 )
+PARSER.add_argument(
+    "--tautomer_backend",
+    type=str,
+    choices=["molvs", "rdkit"],
+    help="The tautomer enumerator to use. molvs is the original (Python) \
+                    MolVS enumerator. rdkit is RDKit's (C++) \
+                    rdMolStandardize.TautomerEnumerator, which is faster.",
+)
+PARSER.add_argument(
+    "--best_first_protonation",
+    action="store_true",
+    help="Enumerates the ionization states of each molecule from most \
+                    to least probable at the given pH range, stopping once \
+                    enough unique states are found.",
+)
+PARSER.add_argument(
+    "--embed_multiple_confs",
+    action="store_true",
+    help="Generates all the conformers of a molecule with a single \
+                    call to RDKit's EmbedMultipleConfs rather than one at a \
+                    time.",
+)
+PARSER.add_argument(
+    "--embed_num_threads",
+    type=int,
+    metavar="T",
+    help="With --embed_multiple_confs, the number of threads RDKit \
+                    uses to embed the conformers of a molecule (0 uses all \
+                    available cores).",
+)
+PARSER.add_argument(
+    "--template_embedding",
+    action="store_true",
+    help="Embeds the variants (e.g., protonation states and tautomers) \
+                    of each molecule with the heavy atoms they share fixed at \
+                    the positions of the first variant embedded, which is \
+                    faster. Falls back to embedding freely when that fails.",
+)
+PARSER.add_argument(
+    "--adaptive_sampling",
+    action="store_true",
+    help="Generates the conformers of each molecule in rounds, stopping \
+                    once a round no longer improves the lowest-energy \
+                    conformers (up to the usual number of conformers).",
+)
+PARSER.add_argument(
+    "--fused_pipeline",
+    action="store_true",
+    help="In multiprocessing mode, prepares each molecule from start to \
+                    finish (all steps) on a single processor, rather than \
+                    parallelizing each step separately. Implies \
+                    --separate_output_files.",
+)
+PARSER.add_argument(
+    "--batch_minimize",
+    action="store_true",
+    help="Minimizes all the conformers of a molecule with a single \
+                    call to RDKit's UFFOptimizeMoleculeConfs (or \
+                    MMFFOptimizeMoleculeConfs) rather than one at a time.",
+)
+PARSER.add_argument(
+    "--minimize_num_threads",
+    type=int,
+    metavar="T",
+    help="With --batch_minimize, the number of threads RDKit uses to \
+                    minimize the conformers of a molecule (0 uses all \
+                    available cores).",
+)
+PARSER.add_argument(
+    "--force_field",
+    type=str,
+    choices=["uff", "mmff"],
+    help="The force field used to minimize the conformers. If MMFF \
+                    can't parameterize one of the variants of a molecule, \
+                    all of its variants are minimized with UFF.",
+)
+PARSER.add_argument(
+    "--minimize_max_iters",
+    type=int,
+    metavar="I",
+    help="The maximum number of minimization steps per conformer.",
+)
 PARSER.add_argument(
     "--separate_output_files",
     action="store_true",
@@ -213,6 +296,19 @@ PARSER.add_argument(
                     single input file, but different 3D conformers will still \
                     be stored in the same file.",
 )
+PARSER.add_argument(
+    "--skip_params_sdf",
+    action="store_true",
+    help="With --separate_output_files, skips writing the \
+                    gypsum_dl_params.sdf file describing the parameters.",
+)
+PARSER.add_argument(
+    "--skip_sdf_output",
+    action="store_true",
+    help="Skips writing the SDF file(s) of the output molecules. \
+                    Useful when the molecules are written by other means \
+                    (e.g., --add_pdb_output).",
+)
 PARSER.add_argument(
     "--add_pdb_output",
     action="store_true",
@@ -298,10 +394,17 @@ PARSER.add_argument(
 PARSER.add_argument(
     "--test", action="store_true", help="Tests Gypsum-DL to check for programming bugs."
 )
+PARSER.add_argument(
+    "--benchmark",
+    action="store_true",
+    help="Times sending the molecules between processes after each step.",
+)
 
 ARGS_DICT = vars(PARSER.parse_args())
 if ARGS_DICT["test"] == True:
     run_test()
+elif ARGS_DICT["benchmark"] == True:
+    run_benchmark()
 elif ARGS_DICT["cache_prerun"] == False:
 
     INPUTS = copy.deepcopy(ARGS_DICT)
@@ -0,0 +1,338 @@
+"""
+Readers and writers for columnar (Parquet and Arrow IPC) ligand tables.
+
+Ligands are read from and written to these tables in record batches rather
+than line by line. pyarrow is only required if one of these formats is used.
+"""
+import __future__
+
+import os
+
+# The extensions of the columnar formats which are understood
+PARQUET_EXTENSIONS = [".parquet", ".pq"]
+ARROW_EXTENSIONS = [".arrow", ".feather", ".ipc"]
+COLUMNAR_EXTENSIONS = PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+# The output table format names and the extension used for each
+TABLE_FORMAT_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Prefix of the per-filter verdict columns. ie) filter_Lipinski_Strict_Filter
+FILTER_COLUMN_PREFIX = "filter_"
+
+
+def import_pyarrow():
+    """
+    Import pyarrow and its parquet and ipc modules. pyarrow is an optional
+    dependency so this is only done when a columnar format is used.
+
+    Returns:
+    :returns: module pa: the pyarrow module
+    :returns: module pq: the pyarrow.parquet module
+    :returns: module ipc: the pyarrow.ipc module
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError as e:
+        # Either pyarrow is not installed or it is installed but fails to
+        # import (ie. it was built against another version of numpy)
+        printout = "\npyarrow could not be imported but a Parquet or Arrow "
+        printout = printout + "file was requested.\nImportError: {}\n".format(e)
+        printout = printout + "Either install a working pyarrow "
+        printout = printout + "(ie. pip install pyarrow) or use .smi files.\n"
+        print(printout)
+        raise Exception(printout)
+
+    return pa, pq, ipc
+
+
+def get_columnar_format(filename):
+    """
+    Get which columnar format a file is based on its extension.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: str table_format: "parquet", "arrow" or None if the file is not
+        a columnar file
+    """
+
+    if not isinstance(filename, str):
+        return None
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return "parquet"
+    if extension in ARROW_EXTENSIONS:
+        return "arrow"
+    return None
+
+
+def is_columnar_file(filename):
+    """
+    Check if a file is a Parquet or Arrow file based on its extension.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: bool is_columnar: True if the file is a Parquet or Arrow file
+    """
+
+    return get_columnar_format(filename) is not None
+
+
+def _check_columns(infile, column_names, smiles_column, id_column):
+    """
+    Check that the SMILES and ID columns exist in a table.
+
+    Inputs:
+    :param str infile: the path of the table, used in the error message
+    :param list column_names: the names of the columns in the table
+    :param str smiles_column: the name of the SMILES column
+    :param str id_column: the name of the ID column
+    """
+
+    for column in [smiles_column, id_column]:
+        if column not in column_names:
+            printout = "\nColumn {} was not found in {}. ".format(column, infile)
+            printout = printout + "Columns found: {}\n".format(column_names)
+            printout = printout + "Set --smiles_column and --id_column to the "
+            printout = printout + "names of the SMILES and ID columns.\n"
+            print(printout)
+            raise Exception(printout)
+
+
+def iter_columnar_batches(infile, smiles_column="SMILES", id_column="ID",
+                          batch_size=10000):
+    """
+    Iterate through a Parquet or Arrow file one record batch at a time. Only
+    the SMILES and ID columns are read.
+
+    Inputs:
+    :param str infile: the path of a Parquet or Arrow IPC file
+    :param str smiles_column: the name of the SMILES column
+    :param str id_column: the name of the ID column
+    :param int batch_size: the maximum number of rows per batch. Arrow files
+        are read in the batches they were written in.
+
+    Returns:
+    :returns: generator batches: yields lists of [SMILES, ID] lists
+    """
+
+    pa, pq, ipc = import_pyarrow()
+
+    if os.path.exists(infile) is False:
+        print("\nFile of Source compounds does not exist: {}\n".format(infile))
+        raise Exception("File of Source compounds does not exist")
+
+    table_format = get_columnar_format(infile)
+    if table_format == "parquet":
+        parquet_file = pq.ParquetFile(infile)
+        _check_columns(infile, parquet_file.schema_arrow.names,
+                       smiles_column, id_column)
+        record_batches = parquet_file.iter_batches(
+            batch_size=batch_size, columns=[smiles_column, id_column]
+        )
+    else:
+        source = pa.memory_map(infile, "r")
+        reader = ipc.open_file(source)
+        _check_columns(infile, reader.schema.names, smiles_column, id_column)
+        record_batches = (
+            reader.get_batch(i) for i in range(reader.num_record_batches)
+        )
+
+    for record_batch in record_batches:
+        names = record_batch.schema.names
+        smiles_list = record_batch.column(names.index(smiles_column)).to_pylist()
+        id_list = record_batch.column(names.index(id_column)).to_pylist()
+        yield [
+            [str(smiles), str(name)]
+            for smiles, name in zip(smiles_list, id_list)
+            if smiles is not None and name is not None
+        ]
+
+
+def get_usable_format_from_columnar(infile, smiles_column="SMILES",
+                                    id_column="ID", batch_size=10000):
+    """
+    Read a Parquet or Arrow file into the same usable list as
+    operations.get_usable_format. Rows with a null SMILES or ID are skipped.
+
+    Inputs:
+    :param str infile: the path of a Parquet or Arrow IPC file
+    :param str smiles_column: the name of the SMILES column
+    :param str id_column: the name of the ID column
+    :param int batch_size: the number of rows read at a time
+
+    Returns:
+    :returns: list usable_list_of_smiles: list of [SMILES, ID] lists
+    """
+
+    usable_list_of_smiles = []
+    for batch in iter_columnar_batches(infile, smiles_column, id_column,
+                                       batch_size):
+        usable_list_of_smiles.extend(batch)
+
+    return usable_list_of_smiles
+
+
+class FilterResultsTableWriter(object):
+    """
+    Writes the filter results of every ligand to a Parquet or Arrow table, one
+    record batch at a time.
+
+    The table has the columns:
+        SMILES (string), ID (string), passed (bool), status (string),
+        one bool column per filter if filter_names is given
+            (ie. filter_Lipinski_Strict_Filter),
+        one column per descriptor if descriptor_columns is given.
+    Verdicts and descriptors are null for ligands which failed sanitization.
+    """
+
+    def __init__(self, filename, table_format="parquet", filter_names=None,
+                 descriptor_columns=None, batch_size=10000):
+        """
+        Open the table for writing.
+
+        Inputs:
+        :param str filename: the path of the table to write
+        :param str table_format: "parquet" or "arrow"
+        :param list filter_names: the names of the filters to add a verdict
+            column for. None for no verdict columns.
+        :param list descriptor_columns: list of [name, "float" or "int"] of
+            the descriptors to add a column for. None for no descriptors.
+        :param int batch_size: the number of rows per record batch
+        """
+
+        pa, pq, ipc = import_pyarrow()
+        self.pa = pa
+
+        if table_format not in list(TABLE_FORMAT_EXTENSIONS.keys()):
+            printout = "\ntable_format must be one of {}. Got {}\n".format(
+                list(TABLE_FORMAT_EXTENSIONS.keys()), table_format
+            )
+            print(printout)
+            raise Exception(printout)
+
+        self.filename = filename
+        self.table_format = table_format
+        self.filter_names = filter_names if filter_names is not None else []
+        self.descriptor_columns = descriptor_columns \
+            if descriptor_columns is not None else []
+        self.batch_size = batch_size
+        self.num_rows = 0
+
+        fields = [
+            pa.field("SMILES", pa.string()),
+            pa.field("ID", pa.string()),
+            pa.field("passed", pa.bool_()),
+            pa.field("status", pa.string()),
+        ]
+        for filter_name in self.filter_names:
+            fields.append(pa.field(FILTER_COLUMN_PREFIX + filter_name, pa.bool_()))
+        for name, value_type in self.descriptor_columns:
+            arrow_type = pa.int64() if value_type == "int" else pa.float64()
+            fields.append(pa.field(name, arrow_type))
+        self.schema = pa.schema(fields)
+
+        if table_format == "parquet":
+            self.writer = pq.ParquetWriter(filename, self.schema)
+        else:
+            self.sink = pa.OSFile(filename, "wb")
+            self.writer = ipc.new_file(self.sink, self.schema)
+
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        """
+        Empty the column buffers of the current batch.
+        """
+
+        self.buffer = {name: [] for name in self.schema.names}
+        self.buffer_size = 0
+
+    def write_result(self, result):
+        """
+        Add the result of a single ligand to the table.
+
+        Inputs:
+        :param list result: the list returned by
+            execute_filters.run_filter_mol: [smiles_info, status, timings,
+            mol_binary, filter_verdicts, descriptor_dict]
+        """
+
+        smiles_info = result[0]
+        status = result[1]
+        filter_verdicts = result[4] if len(result) > 4 else None
+        descriptor_dict = result[5] if len(result) > 5 else None
+
+        self.buffer["SMILES"].append(smiles_info[0])
+        self.buffer["ID"].append(smiles_info[1])
+        self.buffer["passed"].append(status == "Filter_Passed")
+        self.buffer["status"].append(status)
+        for filter_name in self.filter_names:
+            verdict = None
+            if filter_verdicts is not None:
+                verdict = filter_verdicts.get(filter_name)
+            self.buffer[FILTER_COLUMN_PREFIX + filter_name].append(verdict)
+        for name, value_type in self.descriptor_columns:
+            value = None
+            if descriptor_dict is not None:
+                value = descriptor_dict.get(name)
+            self.buffer[name].append(value)
+
+        self.buffer_size = self.buffer_size + 1
+        if self.buffer_size >= self.batch_size:
+            self.flush()
+
+    def write_results(self, results):
+        """
+        Add the results of many ligands to the table.
+
+        Inputs:
+        :param list results: list of results as returned by
+            execute_filters.run_filter_and_get_results
+        """
+
+        for result in results:
+            self.write_result(result)
+
+    def flush(self):
+        """
+        Write the buffered rows to the table as one record batch.
+        """
+
+        if self.buffer_size == 0:
+            return
+
+        arrays = [
+            self.pa.array(self.buffer[field.name], type=field.type)
+            for field in self.schema
+        ]
+        record_batch = self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.table_format == "parquet":
+            self.writer.write_table(self.pa.Table.from_batches([record_batch]))
+        else:
+            self.writer.write_batch(record_batch)
+
+        self.num_rows = self.num_rows + self.buffer_size
+        self._reset_buffer()
+
+    def close(self):
+        """
+        Write any buffered rows and close the table.
+        """
+
+        self.flush()
+        self.writer.close()
+        if self.table_format == "arrow":
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,239 @@
+"""
+Streaming reading and writing of compressed (.gz and .zst) text files.
+
+The compression is chosen by the file extension, so a library saved as
+ligands.smi.gz or ligands.smi.zst can be used wherever a ligands.smi can
+without first decompressing it to disk. Plain files are read and written as
+before.
+
+When reading a compressed file, decompression runs in a background thread
+which fills a bounded queue with decompressed chunks. The calling thread
+splits those chunks into lines and parses them while the next chunks are
+being read and decompressed. zstandard is only required for .zst files.
+"""
+import __future__
+
+import os
+import io
+import gzip
+import queue
+import threading
+
+# The compressions which are understood and the extension of each
+COMPRESSION_EXTENSIONS = {"gz": ".gz", "zst": ".zst"}
+
+# Number of compressed bytes read at a time and the maximum number of
+# decompressed chunks which are held in memory waiting to be parsed
+READ_CHUNK_SIZE = 1 << 20
+MAX_QUEUED_CHUNKS = 16
+
+# Marks the end of the file in the queue
+_END_OF_FILE = object()
+
+
+def import_zstandard():
+    """
+    Import zstandard. It is an optional dependency so this is only done when a
+    .zst file is used.
+
+    Returns:
+    :returns: module zstandard: the zstandard module
+    """
+
+    try:
+        import zstandard
+    except:
+        printout = "\nzstandard is not installed but a .zst file was requested."
+        printout = printout + "\nEither install zstandard "
+        printout = printout + "(ie. pip install zstandard) or use "
+        printout = printout + "uncompressed or .gz files.\n"
+        print(printout)
+        raise Exception(printout)
+
+    return zstandard
+
+
+def get_compression(filename):
+    """
+    Get the compression of a file based on its extension.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: str compression: "gz", "zst" or None if it is not compressed
+    """
+
+    extension = os.path.splitext(filename)[1].lower()
+    for compression, compression_extension in COMPRESSION_EXTENSIONS.items():
+        if extension == compression_extension:
+            return compression
+    return None
+
+
+def strip_compression_extension(filename):
+    """
+    Remove the compression extension of a file name.
+    ie) ligands.smi.gz becomes ligands.smi
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: str filename: the path without the compression extension
+    """
+
+    if get_compression(filename) is None:
+        return filename
+    return os.path.splitext(filename)[0]
+
+
+def _open_binary_for_reading(filename):
+    """
+    Open a file as a stream of decompressed bytes.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: file binary_stream: a binary file-like object of the
+        decompressed bytes
+    """
+
+    compression = get_compression(filename)
+    if compression == "gz":
+        return gzip.open(filename, "rb")
+    if compression == "zst":
+        zstandard = import_zstandard()
+        raw_file = open(filename, "rb")
+        return zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=True)
+    return open(filename, "rb")
+
+
+def _read_chunks_in_background(filename, chunk_queue, stop_event):
+    """
+    Read and decompress a file in chunks, putting each chunk on a queue. Run
+    in a background thread. Any exception is passed through the queue so it is
+    raised in the calling thread.
+
+    Inputs:
+    :param str filename: the path of the file
+    :param queue.Queue chunk_queue: the queue to put the chunks on. The last
+        item is _END_OF_FILE or an exception.
+    :param threading.Event stop_event: set by the calling thread if it stops
+        reading early
+    """
+
+    try:
+        with _open_binary_for_reading(filename) as binary_stream:
+            while not stop_event.is_set():
+                chunk = binary_stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                _put_unless_stopped(chunk_queue, chunk, stop_event)
+        _put_unless_stopped(chunk_queue, _END_OF_FILE, stop_event)
+    except Exception as e:
+        _put_unless_stopped(chunk_queue, e, stop_event)
+
+
+def _put_unless_stopped(chunk_queue, item, stop_event):
+    """
+    Put an item on a bounded queue, giving up if the reader stopped.
+
+    Inputs:
+    :param queue.Queue chunk_queue: the queue
+    :param item: the item to put on the queue
+    :param threading.Event stop_event: set if the reader stopped
+    """
+
+    while not stop_event.is_set():
+        try:
+            chunk_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def iter_lines(filename):
+    """
+    Iterate through the lines of a text file which may be compressed. The
+    line endings are removed.
+
+    Compressed files are decompressed in a background thread so parsing the
+    lines overlaps with reading and decompressing the file.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: generator lines: yields each line (str) of the file without its
+        line ending
+    """
+
+    if get_compression(filename) is None:
+        with open(filename) as text_file:
+            for line in text_file:
+                yield line.rstrip("\r\n")
+        return
+
+    chunk_queue = queue.Queue(maxsize=MAX_QUEUED_CHUNKS)
+    stop_event = threading.Event()
+    reader = threading.Thread(
+        target=_read_chunks_in_background,
+        args=(filename, chunk_queue, stop_event),
+    )
+    reader.daemon = True
+    reader.start()
+
+    remainder = b""
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is _END_OF_FILE:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            lines = (remainder + chunk).split(b"\n")
+            # the last piece may be an incomplete line
+            remainder = lines.pop()
+            for line in lines:
+                yield line.rstrip(b"\r").decode("utf-8")
+
+        if remainder:
+            yield remainder.rstrip(b"\r").decode("utf-8")
+    finally:
+        # stop the reader if the caller stopped early
+        stop_event.set()
+        reader.join()
+
+
+def open_text_for_writing(filename, compression_level=None):
+    """
+    Open a text file for writing, compressing it if the file name ends with a
+    compression extension (.gz or .zst). Use as a context manager.
+
+    Inputs:
+    :param str filename: the path of the file
+    :param int compression_level: the compression level. None uses the
+        default of each compression (9 for gzip and 3 for zstandard). Ignored
+        for uncompressed files.
+
+    Returns:
+    :returns: file text_file: a writable text file-like object
+    """
+
+    compression = get_compression(filename)
+    if compression == "gz":
+        if compression_level is None:
+            compression_level = 9
+        return gzip.open(filename, "wt", compresslevel=int(compression_level))
+    if compression == "zst":
+        zstandard = import_zstandard()
+        if compression_level is None:
+            compression_level = 3
+        compressor = zstandard.ZstdCompressor(level=int(compression_level))
+        raw_file = open(filename, "wb")
+        binary_stream = compressor.stream_writer(raw_file, closefd=True)
+        return io.TextIOWrapper(binary_stream, encoding="utf-8")
+    return open(filename, "w")
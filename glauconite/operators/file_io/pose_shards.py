@@ -0,0 +1,315 @@
+"""
+Packed 3D output: the poses (3D models) of many ligands written to a bounded
+number of multi-record .sdf shard files rather than a PDB file per variant.
+
+Every shard ($SHARD.sdf) has a tab-separated index next to it
+($SHARD.sdf.idx) with one line per pose:
+    ligand_id   variant   byte_offset   byte_length   final_SMILES
+
+variant is indexed to 1, like the PDB files (ligand_id__variant.pdb). A
+single pose can be read from its shard with one seek and one read, without
+unpacking the rest of the shard.
+
+Each process writing poses uses its own shards (named by its process ID), so
+no locking is needed. A pose's index line is only written once the pose has
+been written and flushed, so a process which is terminated mid-write never
+leaves an index line pointing to a partial record. It can however leave a
+partial record at the end of its shard. repair_pose_shards cuts every shard
+in a folder back to the end of its last indexed pose (this is done once all
+the 3D conversions are finished, and when a shard is reopened), so the
+shards can also be read as plain .sdf files.
+"""
+import __future__
+
+import os
+import glob
+
+POSE_SHARD_EXTENSION = ".sdf"
+POSE_INDEX_EXTENSION = ".idx"
+
+
+class PoseShardWriter(object):
+    """
+    Append poses to a series of .sdf shards, starting a new shard once the
+    current one holds max_poses_per_shard poses.
+    """
+
+    def __init__(self, shard_folder, max_poses_per_shard, prefix=None):
+        """
+        Initialize the writer. No file is opened until the first pose is
+        written.
+
+        Inputs:
+        :param str shard_folder: the folder to write the shards in
+        :param int max_poses_per_shard: the number of poses per shard
+        :param str prefix: the start of the shard file names. Defaults to
+            poses_$PID
+        """
+
+        if prefix is None:
+            prefix = "poses_{}".format(os.getpid())
+        self.shard_folder = shard_folder
+        self.max_poses_per_shard = max(1, int(max_poses_per_shard))
+        self.prefix = prefix
+        self.shard_number = 0
+        self.num_poses_in_shard = 0
+        self.shard_file = None
+        self.index_file = None
+
+    def get_shard_name(self):
+        """
+        The path of the current shard.
+
+        Returns:
+        :returns: str shard_name: the path of the current shard
+        """
+
+        return "{}{}{}_{:04d}{}".format(
+            self.shard_folder, os.sep, self.prefix, self.shard_number,
+            POSE_SHARD_EXTENSION
+        )
+
+    def _open_shard(self):
+        """
+        Open the current shard and its index for appending.
+        """
+
+        shard_name = self.get_shard_name()
+        repair_pose_shard(shard_name)
+        self.shard_file = open(shard_name, "ab")
+        self.index_file = open(shard_name + POSE_INDEX_EXTENSION, "a")
+        self.num_poses_in_shard = 0
+
+    def write_poses(self, poses):
+        """
+        Write the poses of a ligand and flush them to the shard before
+        adding them to the index.
+
+        Inputs:
+        :param list poses: list of [ligand_id, variant, sdf_block,
+            final_smiles] where sdf_block is the text of one SDF record
+            (ending with $$$$)
+
+        Returns:
+        :returns: list entries: the index entry of every pose, [ligand_id,
+            variant, shard_file, byte_offset, byte_length, final_smiles]
+        """
+
+        entries = []
+        index_lines = []
+        for ligand_id, variant, sdf_block, final_smiles in poses:
+            if self.shard_file is None:
+                self._open_shard()
+            elif self.num_poses_in_shard >= self.max_poses_per_shard:
+                self._write_index_lines(index_lines)
+                index_lines = []
+                self.close()
+                self.shard_number = self.shard_number + 1
+                self._open_shard()
+
+            data = sdf_block.encode("utf-8")
+            offset = self.shard_file.seek(0, os.SEEK_END)
+            self.shard_file.write(data)
+            index_lines.append("\t".join([
+                str(ligand_id), str(variant), str(offset), str(len(data)),
+                str(final_smiles)
+            ]))
+            entries.append([ligand_id, variant, self.get_shard_name(), offset,
+                            len(data), final_smiles])
+            self.num_poses_in_shard = self.num_poses_in_shard + 1
+
+        self._write_index_lines(index_lines)
+        return entries
+
+    def _write_index_lines(self, index_lines):
+        """
+        Flush the shard and then add the index lines of the poses written to
+        it.
+
+        Inputs:
+        :param list index_lines: the index lines (str) of the poses
+        """
+
+        if len(index_lines) == 0:
+            return
+        self.shard_file.flush()
+        self.index_file.write("\n".join(index_lines) + "\n")
+        self.index_file.flush()
+
+    def close(self):
+        """
+        Close the current shard and its index.
+        """
+
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.index_file.close()
+        self.shard_file = None
+        self.index_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def repair_pose_shard(shard_file):
+    """
+    Cut a shard back to the end of its last indexed pose, removing any
+    partial record left by a process which was terminated mid-write. A
+    partial line at the end of the index is removed too.
+
+    Inputs:
+    :param str shard_file: the path of the shard
+
+    Returns:
+    :returns: int num_bytes_removed: the number of bytes cut off the shard
+    """
+
+    if os.path.exists(shard_file) is False:
+        return 0
+
+    index_file = shard_file + POSE_INDEX_EXTENSION
+    indexed_end = 0
+    if os.path.exists(index_file) is True:
+        with open(index_file, "rb") as f:
+            index_data = f.read()
+        complete_lines = index_data[:index_data.rfind(b"\n") + 1]
+        if len(complete_lines) != len(index_data):
+            with open(index_file, "r+b") as f:
+                f.truncate(len(complete_lines))
+        for line in complete_lines.decode("utf-8").split("\n"):
+            if line == "":
+                continue
+            offset, length = line.split("\t")[2:4]
+            indexed_end = max(indexed_end, int(offset) + int(length))
+
+    shard_size = os.path.getsize(shard_file)
+    if shard_size <= indexed_end:
+        return 0
+    with open(shard_file, "r+b") as f:
+        f.truncate(indexed_end)
+    return shard_size - indexed_end
+
+
+def repair_pose_shards(shard_folder):
+    """
+    Cut every shard in a folder back to the end of its last indexed pose
+    (see repair_pose_shard). Must not be run while processes are still
+    writing to the shards.
+
+    Inputs:
+    :param str shard_folder: the folder with the shards
+
+    Returns:
+    :returns: int num_bytes_removed: the number of bytes cut off the shards
+    """
+
+    num_bytes_removed = 0
+    for shard_file in glob.glob(shard_folder + os.sep + "*" + POSE_SHARD_EXTENSION):
+        num_bytes_removed = num_bytes_removed + repair_pose_shard(shard_file)
+    return num_bytes_removed
+
+
+def get_shard_index_files(shard_folder):
+    """
+    Get the index files of the shards in a folder.
+
+    Inputs:
+    :param str shard_folder: the folder with the shards
+
+    Returns:
+    :returns: list index_files: the paths of the index files, sorted
+    """
+
+    index_files = glob.glob(
+        shard_folder + os.sep + "*" + POSE_SHARD_EXTENSION + POSE_INDEX_EXTENSION
+    )
+    index_files.sort()
+    return index_files
+
+
+def iter_pose_index(shard_folder):
+    """
+    Iterate through the index entries of every shard in a folder.
+
+    Inputs:
+    :param str shard_folder: the folder with the shards
+
+    Returns:
+    :returns: generator entries: yields [ligand_id, variant, shard_file,
+        byte_offset, byte_length, final_smiles] for every pose
+    """
+
+    for index_file in get_shard_index_files(shard_folder):
+        shard_file = index_file[:-len(POSE_INDEX_EXTENSION)]
+        with open(index_file) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line == "":
+                    continue
+                ligand_id, variant, offset, length, final_smiles = \
+                    line.split("\t")
+                yield [ligand_id, int(variant), shard_file, int(offset),
+                       int(length), final_smiles]
+
+
+def load_pose_index(shard_folder):
+    """
+    Load the index of every shard in a folder.
+
+    Inputs:
+    :param str shard_folder: the folder with the shards
+
+    Returns:
+    :returns: dict pose_index: {(ligand_id, variant): [shard_file,
+        byte_offset, byte_length, final_smiles]}
+    """
+
+    pose_index = {}
+    for entry in iter_pose_index(shard_folder):
+        pose_index[(entry[0], entry[1])] = entry[2:]
+    return pose_index
+
+
+def read_pose_block(shard_file, offset, length):
+    """
+    Read the SDF record of a single pose from a shard.
+
+    Inputs:
+    :param str shard_file: the path of the shard
+    :param int offset: the byte offset of the pose in the shard
+    :param int length: the number of bytes of the pose
+
+    Returns:
+    :returns: str sdf_block: the text of the SDF record
+    """
+
+    with open(shard_file, "rb") as f:
+        f.seek(offset)
+        return f.read(length).decode("utf-8")
+
+
+def read_pose(shard_folder, ligand_id, variant=1, pose_index=None):
+    """
+    Read the SDF record of a single pose.
+
+    Inputs:
+    :param str shard_folder: the folder with the shards
+    :param str ligand_id: the ID of the ligand (as in the PDB file names)
+    :param int variant: the variant of the ligand, indexed to 1
+    :param dict pose_index: the index from load_pose_index. Loading it once
+        is faster when reading many poses. If None it is loaded here.
+
+    Returns:
+    :returns: str sdf_block: the text of the SDF record or None if the pose
+        is not in the shards
+    """
+
+    if pose_index is None:
+        pose_index = load_pose_index(shard_folder)
+    entry = pose_index.get((ligand_id, int(variant)))
+    if entry is None:
+        return None
+    return read_pose_block(entry[0], entry[1], entry[2])
@@ -0,0 +1,354 @@
+"""
+Byte-offset index for .smi files.
+
+Very large .smi files (ie. a billion ligands) are split across array jobs by
+giving each job a shard (--shard i/N) or an explicit line range
+(--line_range start:end). Rather than reading the whole file each job looks up
+where its slice starts and ends in a compact index and reads only those bytes
+through mmap.
+
+The index is built once per .smi file and is saved next to it as
+<smi_file>.idx. Its layout is:
+    MAGIC (8 bytes)
+    header: size of the .smi file, its modification time (ns) and the number
+        of lines, as three little-endian unsigned 64-bit integers
+    num_lines + 1 little-endian unsigned 64-bit byte offsets. Offset i is
+        where line i starts and the final offset is the size of the file.
+"""
+import __future__
+
+import os
+import mmap
+import array
+import struct
+import sys
+
+INDEX_EXTENSION = ".idx"
+MAGIC = b"SMIIDX01"
+HEADER = struct.Struct("<QQQ")
+OFFSET = struct.Struct("<Q")
+# Number of bytes of the .smi file read at a time while building the index
+READ_CHUNK_SIZE = 1 << 24
+
+
+def get_index_filename(smi_file):
+    """
+    Get the name of the index file of a .smi file.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+
+    Returns:
+    :returns: str index_file: the path of the index file
+    """
+
+    return smi_file + INDEX_EXTENSION
+
+
+def _get_file_stamp(smi_file):
+    """
+    Get the size and modification time of a file. These are stored in the
+    index so a stale index (ie. the .smi was edited) can be detected.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+
+    Returns:
+    :returns: int file_size: the size of the file in bytes
+    :returns: int mtime_ns: the modification time of the file in ns
+    """
+
+    stat = os.stat(smi_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_smi_index(smi_file, index_file=None):
+    """
+    Build the byte-offset index of a .smi file. The file is read in chunks so
+    memory use does not depend on the size of the file. The index is written
+    to a temporary file which is then moved into place, so array jobs which
+    race to build the same index never read a partial index.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+    :param str index_file: the path of the index to write. Defaults to
+        get_index_filename(smi_file)
+
+    Returns:
+    :returns: str index_file: the path of the index file
+    :returns: int num_lines: the number of lines in the .smi file
+    """
+
+    if index_file is None:
+        index_file = get_index_filename(smi_file)
+    if os.path.exists(smi_file) is False:
+        printout = "\nFile of Source compounds does not exist: {}\n".format(smi_file)
+        print(printout)
+        raise Exception(printout)
+
+    file_size, mtime_ns = _get_file_stamp(smi_file)
+    temp_file = "{}.{}.tmp".format(index_file, os.getpid())
+
+    num_lines = 0
+    with open(smi_file, "rb") as smi, open(temp_file, "wb") as index:
+        index.write(MAGIC)
+        # placeholder header, rewritten once the lines are counted
+        index.write(HEADER.pack(0, 0, 0))
+
+        chunk_start = 0
+        line_starts = array.array("Q")
+        if file_size > 0:
+            line_starts.append(0)
+        while True:
+            chunk = smi.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            position = chunk.find(b"\n")
+            while position != -1:
+                next_line_start = chunk_start + position + 1
+                if next_line_start < file_size:
+                    line_starts.append(next_line_start)
+                position = chunk.find(b"\n", position + 1)
+
+            if sys.byteorder != "little":
+                line_starts.byteswap()
+            line_starts.tofile(index)
+            num_lines = num_lines + len(line_starts)
+            line_starts = array.array("Q")
+            chunk_start = chunk_start + len(chunk)
+
+        index.write(OFFSET.pack(file_size))
+        index.seek(len(MAGIC))
+        index.write(HEADER.pack(file_size, mtime_ns, num_lines))
+
+    os.replace(temp_file, index_file)
+
+    return index_file, num_lines
+
+
+def read_index_header(index_file):
+    """
+    Read the header of an index file.
+
+    Inputs:
+    :param str index_file: the path of the index file
+
+    Returns:
+    :returns: list header: [file_size, mtime_ns, num_lines] or None if the
+        file is not a valid index.
+    """
+
+    with open(index_file, "rb") as index:
+        if index.read(len(MAGIC)) != MAGIC:
+            return None
+        header = index.read(HEADER.size)
+    if len(header) != HEADER.size:
+        return None
+
+    return list(HEADER.unpack(header))
+
+
+def load_smi_index(smi_file, index_file=None):
+    """
+    Get the index of a .smi file, building it if it does not exist or if the
+    .smi file changed since it was built.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+    :param str index_file: the path of the index file. Defaults to
+        get_index_filename(smi_file)
+
+    Returns:
+    :returns: str index_file: the path of the index file
+    :returns: int num_lines: the number of lines in the .smi file
+    """
+
+    if index_file is None:
+        index_file = get_index_filename(smi_file)
+
+    if os.path.exists(index_file) is True:
+        header = read_index_header(index_file)
+        if header is not None:
+            file_size, mtime_ns = _get_file_stamp(smi_file)
+            if header[0] == file_size and header[1] == mtime_ns:
+                return index_file, header[2]
+        print("Index {} is out of date. Rebuilding it.".format(index_file))
+
+    return build_smi_index(smi_file, index_file)
+
+
+def get_byte_range(index_file, start_line, end_line):
+    """
+    Look up the byte offsets of a range of lines. Only the two offsets which
+    are needed are read from the memory-mapped index.
+
+    Inputs:
+    :param str index_file: the path of the index file
+    :param int start_line: the first line (0-based)
+    :param int end_line: the line after the last line (0-based, exclusive)
+
+    Returns:
+    :returns: int start_byte: the byte offset where start_line starts
+    :returns: int end_byte: the byte offset where end_line starts (or the
+        size of the file)
+    """
+
+    header_size = len(MAGIC) + HEADER.size
+    with open(index_file, "rb") as index:
+        index_map = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start_byte = OFFSET.unpack_from(
+                index_map, header_size + start_line * OFFSET.size
+            )[0]
+            end_byte = OFFSET.unpack_from(
+                index_map, header_size + end_line * OFFSET.size
+            )[0]
+        finally:
+            index_map.close()
+
+    return start_byte, end_byte
+
+
+def read_smi_lines(smi_file, start_line, end_line, index_file=None):
+    """
+    Read a range of lines of a .smi file. Only the bytes of those lines are
+    read from the memory-mapped file.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+    :param int start_line: the first line (0-based)
+    :param int end_line: the line after the last line (0-based, exclusive)
+    :param str index_file: the path of the index file. Defaults to
+        get_index_filename(smi_file). Built if needed.
+
+    Returns:
+    :returns: list lines: the lines without their line endings
+    """
+
+    index_file, num_lines = load_smi_index(smi_file, index_file)
+    end_line = min(end_line, num_lines)
+    if start_line >= end_line:
+        return []
+
+    start_byte, end_byte = get_byte_range(index_file, start_line, end_line)
+    with open(smi_file, "rb") as smi:
+        smi_map = mmap.mmap(smi.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data = smi_map[start_byte:end_byte]
+        finally:
+            smi_map.close()
+
+    return data.decode("utf-8").splitlines()
+
+
+def parse_shard(shard):
+    """
+    Parse a shard string of the form "i/N" where i is the 0-based index of the
+    shard and N the number of shards.
+
+    Inputs:
+    :param str shard: the shard string. ie) "3/100"
+
+    Returns:
+    :returns: int shard_index: i
+    :returns: int num_shards: N
+    """
+
+    printout = "\n--shard must be of the form i/N where N is the number of "
+    printout = printout + "shards and 0 <= i < N. Got {}\n".format(shard)
+    try:
+        shard_index, num_shards = [int(x) for x in str(shard).split("/")]
+    except:
+        print(printout)
+        raise Exception(printout)
+    if num_shards < 1 or shard_index < 0 or shard_index >= num_shards:
+        print(printout)
+        raise Exception(printout)
+
+    return shard_index, num_shards
+
+
+def parse_line_range(line_range):
+    """
+    Parse a line range string of the form "start:end". Lines are 0-based and
+    end is exclusive (like a python slice). Either side may be left empty.
+
+    Inputs:
+    :param str line_range: the line range string. ie) "1000:2000"
+
+    Returns:
+    :returns: int start_line: the first line
+    :returns: int end_line: the line after the last line or None for the end
+        of the file
+    """
+
+    printout = "\n--line_range must be of the form start:end (0-based, end "
+    printout = printout + "exclusive). Got {}\n".format(line_range)
+    parts = str(line_range).split(":")
+    if len(parts) != 2:
+        print(printout)
+        raise Exception(printout)
+    try:
+        start_line = int(parts[0]) if parts[0].strip() != "" else 0
+        end_line = int(parts[1]) if parts[1].strip() != "" else None
+    except:
+        print(printout)
+        raise Exception(printout)
+    if start_line < 0 or (end_line is not None and end_line < start_line):
+        print(printout)
+        raise Exception(printout)
+
+    return start_line, end_line
+
+
+def get_shard_line_range(num_lines, shard_index, num_shards):
+    """
+    Get the lines of a shard. The lines are split as evenly as possible and
+    every line belongs to exactly one shard.
+
+    Inputs:
+    :param int num_lines: the number of lines in the file
+    :param int shard_index: the 0-based index of the shard
+    :param int num_shards: the number of shards
+
+    Returns:
+    :returns: int start_line: the first line of the shard
+    :returns: int end_line: the line after the last line of the shard
+    """
+
+    start_line = (num_lines * shard_index) // num_shards
+    end_line = (num_lines * (shard_index + 1)) // num_shards
+
+    return start_line, end_line
+
+
+def resolve_line_range(smi_file, shard=None, line_range=None):
+    """
+    Work out which lines of a .smi file to read from a shard or a line range.
+    Builds the index of the .smi file if needed.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+    :param str shard: a shard string "i/N" or None
+    :param str line_range: a line range string "start:end" or None
+
+    Returns:
+    :returns: list line_range: [start_line, end_line, num_lines] where
+        end_line is exclusive and num_lines is the number of lines in the
+        whole file
+    """
+
+    index_file, num_lines = load_smi_index(smi_file)
+
+    if shard is not None:
+        shard_index, num_shards = parse_shard(shard)
+        start_line, end_line = get_shard_line_range(
+            num_lines, shard_index, num_shards
+        )
+    else:
+        start_line, end_line = parse_line_range(line_range)
+        if end_line is None or end_line > num_lines:
+            end_line = num_lines
+        start_line = min(start_line, num_lines)
+
+    return [start_line, end_line, num_lines]
@@ -0,0 +1,58 @@
+"""
+Molecular descriptors which can be saved alongside the filter results, so
+downstream analysis can reuse them instead of recomputing them.
+
+The descriptors are calculated on the same prepared (deprotonated and
+uncharged) mol which the filters are run on.
+"""
+import __future__
+
+import rdkit
+import rdkit.Chem.Lipinski as Lipinski
+import rdkit.Chem.Crippen as Crippen
+import rdkit.Chem.Descriptors as Descriptors
+import rdkit.Chem.MolSurf as MolSurf
+import rdkit.Chem.rdMolDescriptors as rdMolDescriptors
+
+# Disable the unnecessary RDKit warnings
+rdkit.RDLogger.DisableLog("rdApp.*")
+
+# Each descriptor is [column name, function(mol), "float" or "int"].
+# This order is the column order in the output tables.
+DESCRIPTORS = [
+    ["ExactMolWt", Descriptors.ExactMolWt, "float"],
+    ["MolLogP", Crippen.MolLogP, "float"],
+    ["MolMR", Crippen.MolMR, "float"],
+    ["TPSA", MolSurf.TPSA, "float"],
+    ["NumHDonors", Lipinski.NumHDonors, "int"],
+    ["NumHAcceptors", Lipinski.NumHAcceptors, "int"],
+    ["NumRotatableBonds", Lipinski.NumRotatableBonds, "int"],
+    ["NumRings", rdMolDescriptors.CalcNumRings, "int"],
+    ["NumHeavyAtoms", Lipinski.HeavyAtomCount, "int"],
+]
+
+DESCRIPTOR_NAMES = [x[0] for x in DESCRIPTORS]
+
+
+def calculate_descriptors(mol):
+    """
+    Calculate all of the descriptors in DESCRIPTORS for a single mol.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol object mol: a sanitized rdkit mol
+
+    Returns:
+    :returns: dict descriptor_dict: the descriptor names as keys and their
+        values as items. A value is None if that descriptor failed.
+    """
+
+    descriptor_dict = {}
+    for name, function, value_type in DESCRIPTORS:
+        try:
+            value = function(mol)
+            value = int(value) if value_type == "int" else float(value)
+        except:
+            value = None
+        descriptor_dict[name] = value
+
+    return descriptor_dict
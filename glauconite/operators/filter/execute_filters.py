@@ -4,10 +4,10 @@ Top level for running filters.
 import __future__
 
 import copy
+import time
 
 import rdkit
 from rdkit import Chem
-from rdkit.Chem.MolStandardize import rdMolStandardize
 
 # Disable the unnecessary RDKit warnings
 rdkit.RDLogger.DisableLog("rdApp.*")
@@ -16,6 +16,8 @@ from glauconite.operators.filter.filter_classes.parent_filter_class import Paren
 from glauconite.operators.filter.filter_classes.get_child_filter_class import get_all_subclasses
 
 import glauconite.operators.convert_files.gypsum_dl.gypsum_dl.MolObjectHandling as MOH
+import glauconite.operators.filter.mol_preparation as mol_prep
+import glauconite.operators.filter.descriptors as descriptors
 from glauconite.operators.filter.filter_classes.filter_children_classes import *
 
 
@@ -51,7 +53,7 @@ def make_run_class_dict(filters_to_use):
     return child_dict
 
 
-def run_filter(vars, list_of_new_ligands, verbose=True):
+def run_filter(vars, list_of_new_ligands, verbose=True, mol_binaries=None):
     """
     This will run a filter of the Users choosing.
 
@@ -63,47 +65,117 @@ def run_filter(vars, list_of_new_ligands, verbose=True):
     :param list list_of_new_ligands: list of lists containing all the newly
         generated ligands and their names
     :param bool verbose: print message if True; don't if False
+    :param list mol_binaries: optional list of rdkit binary mols (one per
+        ligand in list_of_new_ligands, ie. loaded from a molecule library). If
+        provided the SMILES strings are not parsed again.
 
     Returns:
     :returns: list ligands_which_passed_filter: a list of only the molecules
         which passed the filter. Excludes all molecules which failed.
     """
 
+    results = run_filter_and_get_results(
+        vars, list_of_new_ligands, verbose, mol_binaries
+    )
+    ligands_which_passed_filter = [x[0] for x in results if x[1] == "Filter_Passed"]
+
+    return ligands_which_passed_filter
+
+
+def run_filter_and_get_results(vars, list_of_new_ligands, verbose=True,
+                               mol_binaries=None, keep_mol_binaries=False,
+                               keep_filter_verdicts=False, keep_descriptors=False):
+    """
+    Run the filters of the Users choosing and return the result of every
+    ligand (not just those which passed).
+
+    Inputs:
+    :param dict vars: User variables which will govern how the programs runs
+    :param list list_of_new_ligands: list of lists containing all the newly
+        generated ligands and their names
+    :param bool verbose: print message if True; don't if False
+    :param list mol_binaries: optional list of rdkit binary mols (one per
+        ligand in list_of_new_ligands, ie. loaded from a molecule library). If
+        provided the SMILES strings are not parsed again.
+    :param bool keep_mol_binaries: if True the rdkit binary of the sanitized
+        input mol is returned for every ligand which passed so it can be
+        written to a molecule library.
+    :param bool keep_filter_verdicts: if True the pass/fail verdict of every
+        individual filter is returned for every ligand
+    :param bool keep_descriptors: if True the descriptors in
+        descriptors.DESCRIPTORS are calculated and returned for every ligand
+        which sanitized
+
+    Returns:
+    :returns: list results: a list with one entry per ligand in the same order
+        as list_of_new_ligands. Each entry is the list returned by
+        run_filter_mol: [smiles_info, status, timings, mol_binary,
+        filter_verdicts, descriptor_dict]
+    """
+
     # Get the already generated dictionary of filter objects
     filter_object_dict = vars["filter_object_dict"]
     start_num = len(list_of_new_ligands)
     # make a list of tuples for multi-processing Filter
     job_input = []
-    for smiles_info in list_of_new_ligands:
-        temp_tuple = tuple([smiles_info, filter_object_dict])
+    for i, smiles_info in enumerate(list_of_new_ligands):
+        mol_binary = None if mol_binaries is None else mol_binaries[i]
+        temp_tuple = tuple(
+            [smiles_info, filter_object_dict, mol_binary, keep_mol_binaries,
+             keep_filter_verdicts, keep_descriptors]
+        )
         job_input.append(temp_tuple)
     job_input = tuple(job_input)
 
     results = vars["parallelizer"].run(job_input, run_filter_mol)
 
+    if verbose is True:
+        print_filter_stats(results, start_num)
+
+    return results
+
+
+def print_filter_stats(results, start_num):
+    """
+    Print how many ligands passed, failed the filters or failed to sanitize
+    and how long each preparation sub-step took in total.
+
+    Inputs:
+    :param list results: the results of every ligand as returned by
+        run_filter_and_get_results
+    :param int start_num: the number of ligands which were filtered
+    """
+
     # remove mols which fail the filter
     ligands_failed_to_sanitize = [x[0] for x in results if x[1] == "Sanitize_fail"]
     ligands_which_failed_filter = [x[0] for x in results if x[1] == "Filter_fail"]
     ligands_which_passed_filter = [x[0] for x in results if x[1] == "Filter_Passed"]
 
-    if verbose is True:
-        print("######################")
-        print("")
-        print("Pass/fail Stats")
-        print("")
-        print("Total number of ligs starting: ", len(list_of_new_ligands))
-        print("Number of ligs failed sanitization: ", len(ligands_failed_to_sanitize))
-        print("Number of ligs failed the filters: ", len(ligands_which_failed_filter))
-        print("Number of ligs which PASSED: ", len(ligands_which_passed_filter))
-        print("")
-        print("{}% PASSED".format(str(100*len(ligands_which_passed_filter)/start_num)))
-        print("")
-        print("######################")
-
-    return ligands_which_passed_filter
-
-
-def run_filter_mol(smiles_info, child_dict):
+    # Sum the time spent in each preparation sub-step across all ligands
+    total_timings = mol_prep.make_timing_counters()
+    for x in results:
+        mol_prep.merge_timing_counters(total_timings, x[2])
+
+    print("######################")
+    print("")
+    print("Pass/fail Stats")
+    print("")
+    print("Total number of ligs starting: ", start_num)
+    print("Number of ligs failed sanitization: ", len(ligands_failed_to_sanitize))
+    print("Number of ligs failed the filters: ", len(ligands_which_failed_filter))
+    print("Number of ligs which PASSED: ", len(ligands_which_passed_filter))
+    print("")
+    print("{}% PASSED".format(str(100*len(ligands_which_passed_filter)/start_num)))
+    print("")
+    print("Preparation timings (total CPU seconds across all ligands):")
+    for step in mol_prep.PREP_STEPS:
+        print("    {}: {:.3f}".format(step, total_timings[step]))
+    print("")
+    print("######################")
+
+
+def run_filter_mol(smiles_info, child_dict, mol_binary=None, keep_mol_binary=False,
+                   keep_filter_verdicts=False, keep_descriptors=False):
     """
     This takes a smiles_string and the selected filter list (child_dict) and
     runs it through the selected filters.
@@ -115,51 +187,69 @@ def run_filter_mol(smiles_info, child_dict):
     :param dict child_dict: This dictionary contains all the names of the
         chosen filters as keys and the the filter objects as the items Or None if
         User specifies no filters
+    :param bytes mol_binary: the rdkit binary of the already sanitized mol
+        (ie. from a molecule library). If None the SMILES string is parsed.
+    :param bool keep_mol_binary: if True and the mol passes, return the rdkit
+        binary of the sanitized input mol.
+    :param bool keep_filter_verdicts: if True return a dict with the name of
+        each filter as keys and True/False (passed/failed) as items.
+    :param bool keep_descriptors: if True calculate and return the descriptors
+        of the prepared mol (see descriptors.DESCRIPTORS).
 
     Returns:
-    :returns: list smiles_info: list of the smiles_info if it passed the filter and
-        "Filter_Passed".
-        returns smiles_info and "Sanitize_fail" if the mol fails to sanitize.
-        returns smiles_info and "Sanitize_fail" if the mol fails one or more filters.
+    :returns: list smiles_info: list of the smiles_info if it passed the filter,
+        "Filter_Passed", a dict of the seconds spent in each preparation
+        sub-step (see mol_preparation.PREP_STEPS), the rdkit binary of the
+        sanitized input mol (None unless keep_mol_binary is True), the dict of
+        filter verdicts (None unless keep_filter_verdicts is True) and the
+        dict of descriptors (None unless keep_descriptors is True).
+        returns smiles_info, "Sanitize_fail", the timings, None, None, None if
+        the mol fails to sanitize.
+        returns smiles_info, "Filter_fail", the timings, None and the verdicts
+        and descriptors if the mol fails one or more filters.
     """
 
-    smiles_string = smiles_info[0]
+    timings = mol_prep.make_timing_counters()
 
-    mol = Chem.MolFromSmiles(smiles_string, sanitize=False)
-    # try sanitizing, which is necessary later
-    mol = MOH.check_sanitization(mol)
-    if mol is None:
-        return [smiles_info, "Sanitize_fail"]
+    if mol_binary is None:
+        input_mol = mol_prep.parse_and_sanitize(smiles_info[0], timings)
+    else:
+        input_mol = mol_prep.load_mol_from_binary(mol_binary, timings)
+    if input_mol is None:
+        return [smiles_info, "Sanitize_fail", timings, None, None, None]
 
-    mol = MOH.try_deprotanation(mol)
+    mol = mol_prep.prepare_parsed_mol_for_filters(
+        input_mol, timings, mol_is_sanitized=True
+    )
     if mol is None:
-        return [smiles_info, "Sanitize_fail"]
+        return [smiles_info, "Sanitize_fail", timings, None, None, None]
 
-    mol = MOH.check_sanitization(mol)
-    if mol is None:
-        return [smiles_info, "Sanitize_fail"]
-
-    # remove charge from mol objects. This affects some properties
-    # such as: logP, Mol refractivity, and polar surface area
-    # which can impact filters such as Ghose and VandeWaterbeemd
-    # This is done because logP is traditionally applied to neutral molecules
-    uncharger_obj = rdMolStandardize.Uncharger()
-    mol = uncharger_obj.uncharge(mol)
-    if mol is None:
-        return [smiles_info, "Sanitize_fail"]
+    descriptor_dict = None
+    if keep_descriptors is True:
+        descriptor_dict = descriptors.calculate_descriptors(mol)
 
+    filter_verdicts = None
     if child_dict is not None:
-        # run through the filters
-        filter_result = run_all_selected_filters(mol, child_dict)
+        # run through the filters. The prepared mol is already sanitized
+        start_time = time.time()
+        filter_verdicts = get_filter_verdicts(mol, child_dict, mol_is_sanitized=True)
+        timings["filter"] = time.time() - start_time
 
         # see if passed
+        filter_result = False not in list(filter_verdicts.values())
+        if keep_filter_verdicts is False:
+            filter_verdicts = None
         if filter_result is False:
-            return [smiles_info, "Filter_fail"]
-        # it passed return the smiles_info
-        return [smiles_info, "Filter_Passed"]
+            return [smiles_info, "Filter_fail", timings, None,
+                    filter_verdicts, descriptor_dict]
 
-    # This will return None
-    return [smiles_info, "Filter_Passed"]
+    # it passed return the smiles_info
+    if keep_mol_binary is True and mol_binary is None:
+        mol_binary = input_mol.ToBinary()
+    if keep_mol_binary is False:
+        mol_binary = None
+
+    return [smiles_info, "Filter_Passed", timings, mol_binary, filter_verdicts, descriptor_dict]
 
 
 def run_filter_on_just_smiles(smile_string, child_dict):
@@ -190,8 +280,8 @@ def run_filter_on_just_smiles(smile_string, child_dict):
         return False
 
     if child_dict is not None:
-        # run through the filters
-        filter_result = run_all_selected_filters(mol, child_dict)
+        # run through the filters. try_deprotanation returns a sanitized mol
+        filter_result = run_all_selected_filters(mol, child_dict, mol_is_sanitized=True)
 
         # see if passed
         if filter_result is False:
@@ -202,7 +292,7 @@ def run_filter_on_just_smiles(smile_string, child_dict):
     return smile_string
 
 
-def run_all_selected_filters(mol, child_dict):
+def run_all_selected_filters(mol, child_dict, mol_is_sanitized=False):
     """
     Iterate through all of the filters specified by the user for a single
     molecule. returns True if the mol passes all the chosen filters. returns
@@ -213,24 +303,53 @@ def run_all_selected_filters(mol, child_dict):
         if it passes the filters
     :param dict child_dict: This dictionary contains all the names of the
         chosen filters as keys and the the filter objects as the items
+    :param bool mol_is_sanitized: True if the mol is known to already be
+        sanitized, in which case it is not sanitized again.
 
     Returns:
     returns bol bol: True if the mol passes all the filters. False if the mol
         fails any filters.
     """
 
-    filters_failed = 0
-    mol = MOH.check_sanitization(mol)
-    if mol is None:
+    filter_verdicts = get_filter_verdicts(mol, child_dict, mol_is_sanitized)
+    if filter_verdicts is None:
         return False
-    for child in list(child_dict.keys()):
-        mol_copy = copy.deepcopy(mol)
-        filter_function = child_dict[child].run_filter
-        if filter_function(mol_copy) is False:
-            filters_failed = filters_failed + 1
 
-    if filters_failed == 0:
+    if False not in list(filter_verdicts.values()):
         return True
 
     # failed one or more filters
     return False
+
+
+def get_filter_verdicts(mol, child_dict, mol_is_sanitized=False):
+    """
+    Iterate through all of the filters specified by the user for a single
+    molecule and record whether the mol passed each of them.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol object mol: An rdkit mol object to be tested
+        if it passes the filters
+    :param dict child_dict: This dictionary contains all the names of the
+        chosen filters as keys and the the filter objects as the items
+    :param bool mol_is_sanitized: True if the mol is known to already be
+        sanitized, in which case it is not sanitized again.
+
+    Returns:
+    :returns: dict filter_verdicts: the name of each filter in child_dict as
+        keys and True (passed) or False (failed) as items. Returns None if the
+        mol fails to sanitize.
+    """
+
+    if mol_is_sanitized is False:
+        mol = MOH.check_sanitization(mol)
+        if mol is None:
+            return None
+
+    filter_verdicts = {}
+    for child in list(child_dict.keys()):
+        mol_copy = copy.deepcopy(mol)
+        filter_function = child_dict[child].run_filter
+        filter_verdicts[child] = filter_function(mol_copy) is not False
+
+    return filter_verdicts
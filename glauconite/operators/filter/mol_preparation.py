@@ -0,0 +1,240 @@
+"""
+Preparation stage which turns a SMILES string into the sanitized,
+deprotonated and neutralized rdkit mol object which the filters are run on.
+
+Standardizer objects are expensive to construct so they are made once per
+process (ie. once per worker of the parallelizer) and reused for every
+molecule that worker handles.
+"""
+import __future__
+
+import time
+
+import rdkit
+from rdkit import Chem
+from rdkit.Chem.MolStandardize import rdMolStandardize
+
+# Disable the unnecessary RDKit warnings
+rdkit.RDLogger.DisableLog("rdApp.*")
+
+import glauconite.operators.convert_files.gypsum_dl.gypsum_dl.MolObjectHandling as MOH
+
+# The names of the timed sub-steps of the preparation stage, in the order
+# they are run. "filter" is timed by execute_filters.run_filter_mol
+PREP_STEPS = ["parse", "sanitize", "deprotonate", "uncharge", "filter"]
+
+# Process level cache of the standardizer objects. Each worker process gets
+# its own copy the first time it needs it.
+_UNCHARGER = None
+
+
+def get_uncharger():
+    """
+    Return this process's rdMolStandardize.Uncharger, building it the first
+    time it is requested.
+
+    Returns:
+    :returns: rdMolStandardize.Uncharger uncharger: the cached Uncharger
+    """
+
+    global _UNCHARGER
+    if _UNCHARGER is None:
+        _UNCHARGER = rdMolStandardize.Uncharger()
+    return _UNCHARGER
+
+
+def make_timing_counters():
+    """
+    Make an empty dictionary of timing counters, one for each preparation
+    sub-step.
+
+    Returns:
+    :returns: dict timings: dictionary with the name of each sub-step in
+        PREP_STEPS as keys and 0.0 seconds as items
+    """
+
+    return {step: 0.0 for step in PREP_STEPS}
+
+
+def merge_timing_counters(total_timings, timings):
+    """
+    Add the timings of a single molecule to a running total. total_timings is
+    modified in place.
+
+    Inputs:
+    :param dict total_timings: the running total of the timing counters
+    :param dict timings: the timing counters of a single molecule. May be None
+        in which case nothing is added.
+
+    Returns:
+    :returns: dict total_timings: the running total of the timing counters
+    """
+
+    if timings is None:
+        return total_timings
+    for step in list(timings.keys()):
+        total_timings[step] = total_timings.get(step, 0.0) + timings[step]
+    return total_timings
+
+
+def mol_has_formal_charge(mol):
+    """
+    Check if any atom in a mol has a formal charge. The Uncharger only alters
+    charged atoms, so a mol without any charges does not need to go through it.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: an rdkit mol object
+
+    Returns:
+    :returns: bool has_charge: True if any atom has a non-zero formal charge
+    """
+
+    for atom in mol.GetAtoms():
+        if atom.GetFormalCharge() != 0:
+            return True
+    return False
+
+
+def parse_and_sanitize(smiles_string, timings=None):
+    """
+    Parse a SMILES string without sanitizing and then sanitize it. This is
+    the mol as the user provided it (before deprotonating or uncharging), which
+    is what is handed on to later stages.
+
+    Inputs:
+    :param str smiles_string: the SMILES string to parse
+    :param dict timings: optional dictionary of timing counters (see
+        make_timing_counters). The seconds spent in each sub-step are added to
+        it in place.
+
+    Returns:
+    :returns: rdkit.Chem.rdchem.Mol mol: the sanitized mol, or None if it
+        failed to parse or sanitize.
+    """
+
+    if timings is None:
+        timings = make_timing_counters()
+
+    start_time = time.time()
+    mol = Chem.MolFromSmiles(smiles_string, sanitize=False)
+    timings["parse"] = timings.get("parse", 0.0) + time.time() - start_time
+    if mol is None:
+        return None
+
+    start_time = time.time()
+    mol = MOH.check_sanitization(mol)
+    timings["sanitize"] = timings.get("sanitize", 0.0) + time.time() - start_time
+
+    return mol
+
+
+def load_mol_from_binary(mol_binary, timings=None):
+    """
+    Rebuild a mol from the rdkit binary format (ie. from a molecule library).
+    Mols are sanitized before they are written to a library so they are not
+    sanitized again.
+
+    Inputs:
+    :param bytes mol_binary: the output of rdkit.Chem.rdchem.Mol.ToBinary()
+    :param dict timings: optional dictionary of timing counters which is added
+        to in place. The time is counted as "parse".
+
+    Returns:
+    :returns: rdkit.Chem.rdchem.Mol mol: the mol, or None if it could not be
+        rebuilt.
+    """
+
+    if timings is None:
+        timings = make_timing_counters()
+
+    start_time = time.time()
+    try:
+        mol = Chem.Mol(mol_binary)
+    except:
+        mol = None
+    timings["parse"] = timings.get("parse", 0.0) + time.time() - start_time
+
+    return mol
+
+
+def prepare_mol_for_filters(smiles_string, timings=None):
+    """
+    Run a SMILES string through the full preparation stage:
+        1) parse the SMILES without sanitizing
+        2) sanitize
+        3) remove all non-explicit Hs (deprotonate)
+        4) neutralize charges using the cached Uncharger
+
+    Sanitization is only repeated when the mol was changed since it was last
+    sanitized. try_deprotanation already returns a sanitized mol and the
+    Uncharger is skipped entirely for mols without a formal charge, so most
+    mols are sanitized twice rather than four times.
+
+    Inputs:
+    :param str smiles_string: the SMILES string to prepare
+    :param dict timings: optional dictionary of timing counters (see
+        make_timing_counters). The seconds spent in each sub-step are added to
+        it in place.
+
+    Returns:
+    :returns: rdkit.Chem.rdchem.Mol mol: the sanitized, deprotonated and
+        uncharged mol, or None if any step failed.
+    """
+
+    if timings is None:
+        timings = make_timing_counters()
+
+    mol = parse_and_sanitize(smiles_string, timings)
+
+    return prepare_parsed_mol_for_filters(mol, timings, mol_is_sanitized=True)
+
+
+def prepare_parsed_mol_for_filters(mol, timings=None, mol_is_sanitized=False):
+    """
+    Run an already parsed rdkit mol through the remaining preparation steps
+    (sanitize, deprotonate and uncharge). See prepare_mol_for_filters.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: an unsanitized or sanitized rdkit mol
+    :param dict timings: optional dictionary of timing counters which is added
+        to in place.
+    :param bool mol_is_sanitized: True if the mol is known to already be
+        sanitized, in which case the first sanitization is skipped.
+
+    Returns:
+    :returns: rdkit.Chem.rdchem.Mol mol: the sanitized, deprotonated and
+        uncharged mol, or None if any step failed.
+    """
+
+    if timings is None:
+        timings = make_timing_counters()
+    if mol is None:
+        return None
+
+    # try sanitizing, which is necessary later
+    if mol_is_sanitized is False:
+        start_time = time.time()
+        mol = MOH.check_sanitization(mol)
+        timings["sanitize"] = timings.get("sanitize", 0.0) + time.time() - start_time
+        if mol is None:
+            return None
+
+    # try_deprotanation sanitizes the mol it returns
+    start_time = time.time()
+    mol = MOH.try_deprotanation(mol)
+    timings["deprotonate"] = timings.get("deprotonate", 0.0) + time.time() - start_time
+    if mol is None:
+        return None
+
+    # remove charge from mol objects. This affects some properties
+    # such as: logP, Mol refractivity, and polar surface area
+    # which can impact filters such as Ghose and VandeWaterbeemd
+    # This is done because logP is traditionally applied to neutral molecules
+    start_time = time.time()
+    if mol_has_formal_charge(mol) is True:
+        mol = get_uncharger().uncharge(mol)
+        # the uncharged mol is a new object which needs sanitizing
+        mol = MOH.check_sanitization(mol)
+    timings["uncharge"] = timings.get("uncharge", 0.0) + time.time() - start_time
+
+    return mol
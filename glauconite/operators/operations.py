@@ -8,7 +8,12 @@ import sys
 import glob
 
 import glauconite.operators.filter.execute_filters as Filter
+import glauconite.operators.filter.descriptors as descriptors
+import glauconite.operators.file_io.columnar_io as columnar_io
+import glauconite.operators.file_io.smi_index as smi_index
+import glauconite.operators.file_io.compressed_io as compressed_io
 import glauconite.operators.convert_files.conversion_to_3d as conversion_to_3d
+import glauconite.operators.convert_files.gypsum_dl.gypsum_dl.Steps.IO.MolLibrary as MolLibrary
 
 
 def get_usable_format(infile):
@@ -35,7 +40,7 @@ def get_usable_format(infile):
 
     Inputs:
     :param str infile: the string of the PATHname of a formatted .smi file to
-        be read into the program
+        be read into the program. It may be compressed (.smi.gz or .smi.zst)
 
     Returns:
     :returns: list usable_list_of_smiles: list of SMILES and their associated
@@ -49,22 +54,92 @@ def get_usable_format(infile):
         print("\nFile of Source compounds does not exist: {}\n".format(infile))
         raise Exception("File of Source compounds does not exist")
 
-    with open(infile) as smiles_file:
-        for line in smiles_file:
-            line = line.replace("\n", "")
-            parts = line.split("\t")  # split line into parts separated by 4-spaces
-            if len(parts) == 1:
-                parts = line.split(
-                    "    "
-                )  # split line into parts separated by 4-spaces
+    # .smi.gz and .smi.zst files are decompressed while they are read
+    for line in compressed_io.iter_lines(infile):
+        usable_list_of_smiles.append(convert_smi_line_to_list(line))
 
-            choice_list = []
-            for i in range(0, len(parts)):
-                choice_list.append(parts[i])
-            usable_list_of_smiles.append(choice_list)
+    return usable_list_of_smiles
+
+def convert_smi_line_to_list(line):
+    """
+    Split a single line of a .smi file into its parts. See get_usable_format
+    for the format of the line.
+
+    Inputs:
+    :param str line: a line of a .smi file
+
+    Returns:
+    :returns: list choice_list: the parts of the line. ie) [SMILES, name]
+    """
+
+    line = line.replace("\n", "")
+    parts = line.split("\t")  # split line into parts separated by 4-spaces
+    if len(parts) == 1:
+        parts = line.split(
+            "    "
+        )  # split line into parts separated by 4-spaces
+
+    choice_list = []
+    for i in range(0, len(parts)):
+        choice_list.append(parts[i])
+
+    return choice_list
+
+def get_usable_format_from_smi_slice(infile, start_line, end_line):
+    """
+    Read a range of lines of a .smi file into the same usable list as
+    get_usable_format. The byte-offset index of the file is used so only the
+    requested lines are read (see file_io.smi_index).
+
+    Inputs:
+    :param str infile: the string of the PATHname of a formatted .smi file
+    :param int start_line: the first line to read (0-based)
+    :param int end_line: the line after the last line to read (exclusive)
+
+    Returns:
+    :returns: list usable_list_of_smiles: list of SMILES and their associated
+        information formatted into a list which is usable by the rest of Autogrow
+    """
+
+    if os.path.exists(infile) is False:
+        print("\nFile of Source compounds does not exist: {}\n".format(infile))
+        raise Exception("File of Source compounds does not exist")
+
+    usable_list_of_smiles = []
+    for line in smi_index.read_smi_lines(infile, start_line, end_line):
+        usable_list_of_smiles.append(convert_smi_line_to_list(line))
 
     return usable_list_of_smiles
 
+def get_usable_format_from_mol_library(infile):
+    """
+    This code takes a string for a binary molecule library (.mlib) and reads it
+    into the same usable list as get_usable_format. The rdkit binary mols are
+    also returned so they do not need to be parsed from the SMILES again.
+
+    Inputs:
+    :param str infile: the string of the PATHname of a .mlib file to be read
+        into the program
+
+    Returns:
+    :returns: list usable_list_of_smiles: list of SMILES and their associated
+        names formatted into a list which is usable by the rest of Autogrow
+    :returns: list mol_binaries: list of the rdkit binary mols in the same
+        order as usable_list_of_smiles
+    """
+
+    if os.path.exists(infile) is False:
+        print("\nFile of Source compounds does not exist: {}\n".format(infile))
+        raise Exception("File of Source compounds does not exist")
+
+    usable_list_of_smiles = []
+    mol_binaries = []
+    for smiles, name, mol_binary in MolLibrary.iter_mol_library(infile):
+        usable_list_of_smiles.append([smiles, name])
+        mol_binaries.append(mol_binary)
+
+    return usable_list_of_smiles, mol_binaries
+
 #############
 # Main run GlauconiteFilter operators to make a generation
 #############
@@ -90,33 +165,75 @@ def populate_generation(vars):
     # does not sanitize in RDKit it will be excluded and a printout of its
     # Name and SMILES string will be printed.
 
-    seed_list = get_usable_format(vars["source_compound_file"])
+    if MolLibrary.is_mol_library_file(vars["source_compound_file"]):
+        seed_list, seed_mol_binaries = get_usable_format_from_mol_library(
+            vars["source_compound_file"]
+        )
+    elif columnar_io.is_columnar_file(vars["source_compound_file"]):
+        seed_list = columnar_io.get_usable_format_from_columnar(
+            vars["source_compound_file"], vars["smiles_column"],
+            vars["id_column"], vars["record_batch_size"]
+        )
+        seed_mol_binaries = None
+    elif vars["source_line_range"] is not None:
+        # Only read this job's shard/line range of the .smi file
+        seed_list = get_usable_format_from_smi_slice(
+            vars["source_compound_file"], vars["source_line_range"][0],
+            vars["source_line_range"][1]
+        )
+        seed_mol_binaries = None
+    else:
+        seed_list = get_usable_format(vars["source_compound_file"])
+        seed_mol_binaries = None
 
     # Save source compounds list
     save_ligand_list(
         vars["output_directory"],
         seed_list,
         "Initial_SMILES",
+        vars["output_compression"],
+        vars["compression_level"],
     )
 
     # Run Glauconite
-    passed_ligands = Filter.run_filter(vars, seed_list, vars["verbose"])
-    passed_lig_names = [x[1] for x in passed_ligands]
+    save_table = vars["output_table_format"] is not None
+    filter_results = Filter.run_filter_and_get_results(
+        vars, seed_list, vars["verbose"], seed_mol_binaries,
+        vars["save_mol_library"],
+        save_table and vars["filter_verdict_columns"],
+        save_table and vars["descriptor_columns"],
+    )
+    passed_results = [x for x in filter_results if x[1] == "Filter_Passed"]
+    passed_ligands = [x[0] for x in passed_results]
+    passed_lig_names = set([x[1] for x in passed_ligands])
     failed_filters = [x for x in seed_list if x[1] not in passed_lig_names]
 
     # save those which passed and those that failed
-    save_ligand_list(
+    full_generation_smiles_file = save_ligand_list(
         vars["output_directory"],
         passed_ligands,
         "SMILES_Passed_All_Filters",
+        vars["output_compression"],
+        vars["compression_level"],
     )
-    full_generation_smiles_file = vars["output_directory"] + os.sep + \
-        "SMILES_Passed_All_Filters.SMI"
     save_ligand_list(
         vars["output_directory"],
         failed_filters,
         "SMILES_Failed_Filter",
+        vars["output_compression"],
+        vars["compression_level"],
     )
+    if vars["save_mol_library"] is True:
+        # the parsed and sanitized mols of those which passed. This is also
+        # what the 3D conversion reads
+        save_mol_library(
+            vars["output_directory"],
+            [[x[0][0], x[0][1], x[3]] for x in passed_results],
+            "SMILES_Passed_All_Filters",
+        )
+    if save_table is True:
+        # the result of every ligand as a Parquet/Arrow table
+        save_filter_results_table(vars, filter_results, "Filter_Results")
     sys.stdout.flush()
 
     # CONVERT SMILES TO .sdf USING GYPSUM and convert .sdf to .pdb with rdkit
@@ -125,7 +242,10 @@ def populate_generation(vars):
     # original .smi file is saved as .smi.1.sdf and 2nd file is saved as
     # .smi.2.sdf
     if vars["convert_to_3D"] is True:
-        smiles_to_convert_file = vars["output_directory"] + "SMILES_Passed_All_Filters.smi"
+        smiles_to_convert_file = full_generation_smiles_file
+        if vars["save_mol_library"] is True:
+            smiles_to_convert_file = vars["output_directory"] + \
+                "SMILES_Passed_All_Filters" + MolLibrary.MOL_LIBRARY_EXTENSION
         conversion_to_3d.convert_to_3d(vars, smiles_to_convert_file, vars["output_directory"])
         get_list_of_3D_SMILES(vars, passed_ligands)
 
@@ -138,12 +258,47 @@ def get_list_of_3D_SMILES(vars, new_generation_smiles_list):
     This will obtain and save the list of SMILES in the same order as
     found in NEW_SMILES.smi but with 3D variant information from PDBS.
 
+    When Gypsum-DL ran in batches, the workers reported every 3D model they
+    wrote (PDB or shard) and the final SMILES in the 3D manifest, which is
+    in the same order. The manifest is streamed rather than searching the
+    PDBs folder and opening every PDB.
+
     Will save to vars["output_directory"] +  "New_SMILES_After_3D_Conversion.smi"
+    compressed as vars["output_compression"] like the other .smi outputs
+    (ie. New_SMILES_After_3D_Conversion.smi.gz)
 
     Inputs:
     :param dict vars: a dictionary of all user variables
     :param list new_generation_smiles_list: list of all 1/2D SMILES
     """
+    output_file_name = vars["output_directory"] + "New_SMILES_After_3D_Conversion.smi"
+    if vars["output_compression"] is not None:
+        output_file_name = output_file_name + \
+            compressed_io.COMPRESSION_EXTENSIONS[vars["output_compression"]]
+
+    manifest_file = vars["output_directory"] + conversion_to_3d.MANIFEST_3D_FILE_NAME
+    if vars["gypsum_batch_size"] > 0 and os.path.exists(manifest_file):
+        # the full name of every ligand by the ID used for its 3D models
+        names_by_short_id = {}
+        for mol_info in new_generation_smiles_list:
+            short_id = mol_info[1].split(")")[-1]
+            names_by_short_id.setdefault(short_id, mol_info[1])
+
+        with compressed_io.open_text_for_writing(
+                output_file_name, vars["compression_level"]) as f:
+            first_line = True
+            for entry in conversion_to_3d.iter_3d_manifest(manifest_file):
+                ligand_id, variant, file_path, offset, length, SMILES_string = entry
+                if ligand_id not in names_by_short_id:
+                    continue
+                base_info = "{}__{}".format(ligand_id, variant)
+                line = "\t".join([SMILES_string, names_by_short_id[ligand_id], base_info])
+                if first_line is False:
+                    line = "\n" + line
+                f.write(line)
+                first_line = False
+        return
+
     list_of_3D_SMILES = []
     PDBs_dir = vars["output_directory"] + os.sep + "PDBs" + os.sep
     for mol_info in new_generation_smiles_list:
@@ -159,14 +314,16 @@ def get_list_of_3D_SMILES(vars, new_generation_smiles_list):
 
     # Save all info to a .smi file
     list_of_3D_SMILES = "\n".join(list_of_3D_SMILES)
-    with open(vars["output_directory"] +  "New_SMILES_After_3D_Conversion.smi", "w") as f:
+    with compressed_io.open_text_for_writing(
+            output_file_name, vars["compression_level"]) as f:
         f.write(list_of_3D_SMILES)
 
 #############
 # Saving Output files for generations and seeds
 #############
 
-def save_ligand_list(output_directory, list_of_chosen_ligands, nomenclature_tag):
+def save_ligand_list(output_directory, list_of_chosen_ligands, nomenclature_tag,
+                     compression=None, compression_level=None):
     """
     Save the list of ligands. nomenclature_tag is a string such as "Mutation"
     or "Crossover" describing what this data is used
@@ -180,6 +337,13 @@ def save_ligand_list(output_directory, list_of_chosen_ligands, nomenclature_tag)
             mutations would be the list of mutations generated from the
             seeding_mutations list
         -ie. mutation, crossover
+    :param str compression: "gz" or "zst" to compress the file while it is
+        written (ie. Mutation.smi.gz). None for a plain .smi file.
+    :param int compression_level: the compression level. None uses the default
+        level of the compression.
+
+    Returns:
+    :returns: str output_file_name: the path of the saved .smi file
     """
 
     # make a folder for the Seed files
@@ -194,11 +358,77 @@ def save_ligand_list(output_directory, list_of_chosen_ligands, nomenclature_tag)
     output_file_name = "{}{}.smi".format(
         seed_folder_path, nomenclature_tag
     )
+    if compression is not None:
+        output_file_name = output_file_name + \
+            compressed_io.COMPRESSION_EXTENSIONS[compression]
 
     # save to a new output smiles file. ie. save to ranked_smiles_file
-    with open(output_file_name, "w") as output:
+    with compressed_io.open_text_for_writing(
+            output_file_name, compression_level) as output:
         for line in list_of_chosen_ligands:
             output_line = "\t".join(line) + "\n"
             output.write(output_line)
 
     sys.stdout.flush()
+
+    return output_file_name
+
+def save_mol_library(output_directory, list_of_chosen_ligands, nomenclature_tag):
+    """
+    Save a list of ligands as a binary molecule library (.mlib). This holds
+    the already parsed and sanitized rdkit mols so later stages (or later
+    runs) do not need to parse the SMILES again.
+
+    Inputs:
+    :param dict output_directory: the directory of the run to save the
+    :param list list_of_chosen_ligands: list of [SMILES, name, mol_binary]
+        where mol_binary is the output of rdkit.Chem.rdchem.Mol.ToBinary()
+    :param str nomenclature_tag: The str describing the ligand list
+    """
+
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    output_file_name = "{}{}{}{}".format(
+        output_directory, os.sep, nomenclature_tag, MolLibrary.MOL_LIBRARY_EXTENSION
+    )
+    MolLibrary.write_mol_library(output_file_name, list_of_chosen_ligands)
+
+    sys.stdout.flush()
+
+def save_filter_results_table(vars, filter_results, nomenclature_tag):
+    """
+    Save the filter result of every ligand as a columnar (Parquet or Arrow)
+    table. The table holds the SMILES, ID, passed (bool) and status columns,
+    one pass/fail column per filter if vars["filter_verdict_columns"] and the
+    descriptors calculated during filtering if vars["descriptor_columns"].
+
+    Inputs:
+    :param dict vars: a dictionary of all user variables
+    :param list filter_results: the results of every ligand as returned by
+        execute_filters.run_filter_and_get_results
+    :param str nomenclature_tag: The str describing the table. ie)
+        Filter_Results
+    """
+
+    table_format = vars["output_table_format"]
+    output_file_name = "{}{}{}{}".format(
+        vars["output_directory"], os.sep, nomenclature_tag,
+        columnar_io.TABLE_FORMAT_EXTENSIONS[table_format]
+    )
+
+    filter_names = None
+    if vars["filter_verdict_columns"] is True and \
+            vars["filter_object_dict"] is not None:
+        filter_names = list(vars["filter_object_dict"].keys())
+    descriptor_columns = None
+    if vars["descriptor_columns"] is True:
+        descriptor_columns = [[x[0], x[2]] for x in descriptors.DESCRIPTORS]
+
+    with columnar_io.FilterResultsTableWriter(
+        output_file_name, table_format, filter_names, descriptor_columns,
+        vars["record_batch_size"]
+    ) as writer:
+        writer.write_results(filter_results)
+
+    sys.stdout.flush()
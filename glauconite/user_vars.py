@@ -13,6 +13,9 @@ import json
 import sys
 from shutil import copyfile
 
+import glauconite.operators.file_io.smi_index as smi_index
+import glauconite.operators.file_io.columnar_io as columnar_io
+
 
 def program_info():
     """
@@ -234,10 +237,16 @@ def check_for_required_inputs(input_params):
             "source_compound_file can not be found. \
             File must be a tab delineated .smi file."
         )
-    if ".smi" not in input_params["source_compound_file"]:
+    source_extension = os.path.splitext(
+        input_params["source_compound_file"]
+    )[1].lower()
+    if ".smi" not in input_params["source_compound_file"] and \
+            source_extension not in [".mlib", ".parquet", ".pq", ".arrow",
+                                     ".feather", ".ipc"]:
         raise NotImplementedError(
             "source_compound_file must be a \
-            tab delineated .smi file."
+            tab delineated .smi file (optionally compressed as .smi.gz or \
+            .smi.zst), a .mlib molecule library or a Parquet/Arrow table (.parquet, .pq, .arrow, .feather, .ipc)."
         )
 
 def check_dependencies():
@@ -380,6 +389,68 @@ def define_defaults():
     vars["max_ph"] = 8.4
     vars["pka_precision"] = 1.0
     vars["gypsum_timeout_limit"] = 10
+    # Number of ligands handed to each Gypsum-DL worker at a time. 0 runs
+    # Gypsum-DL once per ligand from its own submission file
+    vars["gypsum_batch_size"] = 25
+    # How a ligand which runs past gypsum_timeout_limit is stopped when
+    # running in batches: "process" terminates and replaces its worker
+    # process, "thread" uses func_timeout. mpi always uses func_timeout
+    vars["gypsum_timeout_mode"] = "process"
+    # Only write the PDBs of the 3D models (not the 3D_SDFs) when running in
+    # batches
+    vars["skip_3d_sdfs"] = False
+    # How the Gypsum-DL workers write the 3D models when running in batches:
+    # "pdb" (a PDB per variant) or "sdf_shards" (multi-record .sdf shards
+    # with an index, in the 3D_Shards folder)
+    vars["output_3d_format"] = "pdb"
+    vars["poses_per_shard"] = 10000
+    # Embed all the conformers of a ligand in one EmbedMultipleConfs call
+    # when running in batches
+    vars["gypsum_embed_multiple_confs"] = False
+    # Number of threads RDKit uses to embed and minimize the conformers of a
+    # ligand when running in batches. 0 uses all available cores
+    vars["gypsum_embed_threads"] = 1
+    # Minimize all the conformers of a ligand in one force-field call when
+    # running in batches
+    vars["gypsum_batch_minimize"] = False
+    # Force field ("uff" or "mmff") and maximum number of steps used to
+    # minimize the conformers of a ligand when running in batches
+    vars["gypsum_force_field"] = "uff"
+    vars["gypsum_minimize_max_iters"] = 200
+    # Tautomer enumerator used by Gypsum-DL when running in batches: "molvs"
+    # or "rdkit" (faster)
+    vars["gypsum_tautomer_backend"] = "molvs"
+    # Enumerate the most probable ionization states first, stopping once
+    # enough are found, when running in batches
+    vars["gypsum_best_first_protonation"] = False
+    # Embed the variants of a ligand from the first variant embedded, when
+    # running in batches
+    vars["gypsum_template_embedding"] = False
+    # Generate the conformers of a ligand in rounds, stopping once they stop
+    # improving, when running in batches
+    vars["gypsum_adaptive_sampling"] = False
+    # Save a .smi for every ligand in gypsum_submission_files (debugging only)
+    vars["save_gypsum_submission_files"] = False
+
+    # Binary molecule library of the ligands which pass
+    vars["save_mol_library"] = False
+
+    # Columnar (Parquet/Arrow) input and output
+    vars["output_table_format"] = None
+    vars["smiles_column"] = "SMILES"
+    vars["id_column"] = "ID"
+    vars["record_batch_size"] = 10000
+    vars["filter_verdict_columns"] = False
+    vars["descriptor_columns"] = False
+
+    # Shards of large .smi files. source_line_range is set from these
+    vars["shard"] = None
+    vars["line_range"] = None
+    vars["source_line_range"] = None
+
+    # Compression of the output .smi files (None, "gz" or "zst")
+    vars["output_compression"] = None
+    vars["compression_level"] = None
 
     return vars
 
@@ -578,6 +649,104 @@ def load_in_commandline_parameters(argv):
 
     vars = filter_choice_handling(vars)
 
+    # Check the columnar output settings
+    if vars["output_table_format"] is not None:
+        vars["output_table_format"] = vars["output_table_format"].lower()
+        if vars["output_table_format"] not in ["parquet", "arrow"]:
+            printout = "\noutput_table_format must be parquet, arrow or None.\n"
+            print(printout)
+            raise Exception(printout)
+        # Make sure pyarrow works now rather than once the filtering is done
+        columnar_io.import_pyarrow()
+    vars["record_batch_size"] = int(vars["record_batch_size"])
+    if vars["record_batch_size"] < 1:
+        printout = "\nrecord_batch_size must be an integer of 1 or more.\n"
+        print(printout)
+        raise Exception(printout)
+
+    # Check the output compression settings
+    if vars["output_compression"] is not None:
+        vars["output_compression"] = vars["output_compression"].lower()
+        if vars["output_compression"] not in ["gz", "zst"]:
+            printout = "\noutput_compression must be gz, zst or None.\n"
+            print(printout)
+            raise Exception(printout)
+    if vars["compression_level"] is not None:
+        vars["compression_level"] = int(vars["compression_level"])
+
+    vars["gypsum_batch_size"] = int(vars["gypsum_batch_size"])
+    if vars["gypsum_batch_size"] < 0:
+        printout = "\ngypsum_batch_size must be 0 or a positive integer.\n"
+        print(printout)
+        raise Exception(printout)
+
+    vars["gypsum_timeout_mode"] = str(vars["gypsum_timeout_mode"]).lower()
+    if vars["gypsum_timeout_mode"] not in ["process", "thread"]:
+        printout = "\ngypsum_timeout_mode must be process or thread.\n"
+        print(printout)
+        raise Exception(printout)
+
+    vars["output_3d_format"] = str(vars["output_3d_format"]).lower()
+    if vars["output_3d_format"] not in ["pdb", "sdf_shards"]:
+        printout = "\noutput_3d_format must be pdb or sdf_shards.\n"
+        print(printout)
+        raise Exception(printout)
+    if vars["output_3d_format"] == "sdf_shards" and vars["gypsum_batch_size"] == 0:
+        printout = "\noutput_3d_format sdf_shards requires gypsum_batch_size "
+        printout = printout + "to be above 0.\n"
+        print(printout)
+        raise Exception(printout)
+    vars["poses_per_shard"] = int(vars["poses_per_shard"])
+    if vars["poses_per_shard"] < 1:
+        printout = "\nposes_per_shard must be a positive integer.\n"
+        print(printout)
+        raise Exception(printout)
+
+    vars["gypsum_embed_threads"] = int(vars["gypsum_embed_threads"])
+    if vars["gypsum_embed_threads"] < 0:
+        printout = "\ngypsum_embed_threads must be 0 or a positive integer.\n"
+        print(printout)
+        raise Exception(printout)
+
+    vars["gypsum_force_field"] = str(vars["gypsum_force_field"]).lower()
+    if vars["gypsum_force_field"] not in ["uff", "mmff"]:
+        printout = "\ngypsum_force_field must be uff or mmff.\n"
+        print(printout)
+        raise Exception(printout)
+    vars["gypsum_minimize_max_iters"] = int(vars["gypsum_minimize_max_iters"])
+    if vars["gypsum_minimize_max_iters"] < 1:
+        printout = "\ngypsum_minimize_max_iters must be a positive integer.\n"
+        print(printout)
+        raise Exception(printout)
+
+    vars["gypsum_tautomer_backend"] = str(vars["gypsum_tautomer_backend"]).lower()
+    if vars["gypsum_tautomer_backend"] not in ["molvs", "rdkit"]:
+        printout = "\ngypsum_tautomer_backend must be molvs or rdkit.\n"
+        print(printout)
+        raise Exception(printout)
+
+    # Work out which lines of the source .smi this run reads. This builds the
+    # byte-offset index of the .smi file if it does not exist yet
+    if vars["shard"] is not None or vars["line_range"] is not None:
+        if vars["shard"] is not None and vars["line_range"] is not None:
+            printout = "\n--shard and --line_range can not be used together.\n"
+            print(printout)
+            raise Exception(printout)
+        source_extension = os.path.splitext(vars["source_compound_file"])[1]
+        if source_extension.lower() != ".smi":
+            printout = "\n--shard and --line_range require the "
+            printout = printout + "source_compound_file to be an "
+            printout = printout + "uncompressed .smi file.\n"
+            print(printout)
+            raise Exception(printout)
+        vars["source_line_range"] = smi_index.resolve_line_range(
+            vars["source_compound_file"], vars["shard"], vars["line_range"]
+        )
+        printout = printout + "\nReading lines {} to {} of {} of {}\n".format(
+            vars["source_line_range"][0], vars["source_line_range"][1],
+            vars["source_line_range"][2], vars["source_compound_file"]
+        )
+
     ###########################################
     ########## Check variables Exist ##########
     ###########################################
@@ -0,0 +1,15 @@
+"""
+Shared setup for the tests. Makes the glauconite package and the bundled
+Gypsum-DL package (which imports itself as gypsum_dl) importable when the
+tests are run from the top of the repository.
+"""
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+GYPSUM_DIR = os.path.join(ROOT_DIR, "glauconite", "operators", "convert_files", "gypsum_dl")
+
+for path in [ROOT_DIR, GYPSUM_DIR]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,76 @@
+"""
+Tests for the .smi of the SMILES after 3D conversion
+(operations.get_list_of_3D_SMILES).
+"""
+import gzip
+import os
+
+import pytest
+
+pytest.importorskip("rdkit")
+
+import glauconite.operators.operations as operations
+import glauconite.operators.convert_files.conversion_to_3d as conversion_to_3d
+
+# The ligands which passed the filters, [SMILES, name]
+PASSED_LIGANDS = [["CCO", "(seed)ethanol"], ["CCN", "ethylamine"]]
+
+# The 3D manifest entries of their variants
+MANIFEST_LINES = [
+    "ethanol\t1\tPDBs/ethanol__1.pdb\t0\t100\tCCO",
+    "ethanol\t2\tPDBs/ethanol__2.pdb\t0\t100\tCC[OH2+]",
+    "ethylamine\t1\tPDBs/ethylamine__1.pdb\t0\t100\tCC[NH3+]",
+]
+
+EXPECTED_TEXT = "\n".join(
+    [
+        "CCO\t(seed)ethanol\tethanol__1",
+        "CC[OH2+]\t(seed)ethanol\tethanol__2",
+        "CC[NH3+]\tethylamine\tethylamine__1",
+    ]
+)
+
+
+def make_vars(tmp_path, output_compression):
+    """
+    Make the user variables used by get_list_of_3D_SMILES and write the 3D
+    manifest of a batched run.
+
+    Inputs:
+    :param pathlib.Path tmp_path: the output directory
+    :param str output_compression: "gz" or None
+
+    Returns:
+    :returns: dict vars: the user variables
+    """
+
+    output_directory = str(tmp_path) + os.sep
+    with open(output_directory + conversion_to_3d.MANIFEST_3D_FILE_NAME, "w") as f:
+        f.write("\n".join(MANIFEST_LINES) + "\n")
+    return {
+        "output_directory": output_directory,
+        "output_compression": output_compression,
+        "compression_level": None,
+        "gypsum_batch_size": 25,
+    }
+
+
+def test_3d_smiles_uncompressed(tmp_path):
+    """Without output_compression a plain .smi is written."""
+
+    vars = make_vars(tmp_path, None)
+    operations.get_list_of_3D_SMILES(vars, PASSED_LIGANDS)
+
+    with open(str(tmp_path / "New_SMILES_After_3D_Conversion.smi")) as f:
+        assert f.read() == EXPECTED_TEXT
+
+
+def test_3d_smiles_compressed(tmp_path):
+    """The .smi is compressed like the other .smi outputs."""
+
+    vars = make_vars(tmp_path, "gz")
+    operations.get_list_of_3D_SMILES(vars, PASSED_LIGANDS)
+
+    assert not os.path.exists(str(tmp_path / "New_SMILES_After_3D_Conversion.smi"))
+    with gzip.open(str(tmp_path / "New_SMILES_After_3D_Conversion.smi.gz"), "rt") as f:
+        assert f.read() == EXPECTED_TEXT
@@ -0,0 +1,43 @@
+"""
+Tests for the optional pyarrow dependency of the columnar tables
+(file_io.columnar_io).
+"""
+import sys
+
+import pytest
+
+import glauconite.operators.file_io.columnar_io as columnar_io
+
+
+def test_import_pyarrow_reports_import_error(monkeypatch):
+    """
+    If pyarrow fails to import, the error says why rather than only that it
+    is not installed.
+    """
+
+    # A None entry in sys.modules makes "import pyarrow" raise an ImportError
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    with pytest.raises(Exception) as excinfo:
+        columnar_io.import_pyarrow()
+
+    message = str(excinfo.value)
+    assert "pyarrow could not be imported" in message
+    assert "ImportError: " in message
+    assert "pyarrow" in message.split("ImportError: ")[1]
+
+
+def test_import_pyarrow_does_not_hide_other_errors(monkeypatch):
+    """Errors other than an ImportError are not reported as import problems."""
+
+    class BrokenFinder(object):
+        def find_spec(self, name, path=None, target=None):
+            if name == "pyarrow":
+                raise RuntimeError("broken pyarrow")
+            return None
+
+    monkeypatch.delitem(sys.modules, "pyarrow", raising=False)
+    monkeypatch.setattr(sys, "meta_path", [BrokenFinder()] + sys.meta_path)
+
+    with pytest.raises(RuntimeError):
+        columnar_io.import_pyarrow()
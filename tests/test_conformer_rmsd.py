@@ -0,0 +1,235 @@
+"""
+Tests for the vectorized conformer RMSDs of Gypsum-DL (gypsum_dl.ConformerRMSD),
+checked against RDKit's own alignment.
+"""
+import pytest
+
+numpy = pytest.importorskip("numpy")
+pytest.importorskip("rdkit")
+
+from rdkit import Chem
+from rdkit.Chem import AllChem
+from rdkit.Chem import rdMolAlign
+from rdkit.Geometry import Point3D
+
+import gypsum_dl.ConformerRMSD as ConformerRMSD
+
+# A chiral molecule with no symmetry-equivalent heavy atoms, so RDKit's
+# symmetry-aware GetBestRMS matches a plain atom-by-atom alignment.
+SMILES = "C[C@@H](O)[C@H](N)CCCl"
+
+
+def make_heavy_atom_mol(num_confs):
+    """
+    Embed some conformers of SMILES and remove the hydrogens.
+
+    Inputs:
+    :param int num_confs: the number of conformers to embed
+
+    Returns:
+    :returns: rdkit.Chem.rdchem.Mol mol: the heavy-atom molecule, with its
+        conformers
+    """
+
+    mol = Chem.AddHs(Chem.MolFromSmiles(SMILES))
+    AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, randomSeed=42)
+    return Chem.RemoveHs(mol)
+
+
+def add_conformer(mol, coords):
+    """
+    Add a conformer with the given coordinates to a molecule.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the molecule
+    :param numpy.ndarray coords: the coordinates, shape (num atoms, 3)
+
+    Returns:
+    :returns: int conf_id: the ID of the new conformer
+    """
+
+    conf = Chem.Conformer(mol.GetNumAtoms())
+    for i, (x, y, z) in enumerate(coords):
+        conf.SetAtomPosition(i, Point3D(float(x), float(y), float(z)))
+    return mol.AddConformer(conf, assignId=True)
+
+
+def get_coords(mol):
+    """
+    Get the coordinates of all the conformers of a molecule.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the molecule
+
+    Returns:
+    :returns: numpy.ndarray coords: shape (num conformers, num atoms, 3)
+    """
+
+    return numpy.array(
+        [conf.GetPositions() for conf in mol.GetConformers()], dtype=numpy.float64
+    )
+
+
+def rdkit_rmsd(mol, ref_id, prb_id):
+    """
+    The RMSD between two conformers after RDKit aligns them (rotation and
+    translation only). The molecule is copied, so its coordinates are not
+    changed.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the molecule
+    :param int ref_id: the ID of the reference conformer
+    :param int prb_id: the ID of the conformer to align
+
+    Returns:
+    :returns: float rmsd: the RMSD
+    """
+
+    atom_map = [(i, i) for i in range(mol.GetNumAtoms())]
+    return rdMolAlign.AlignMol(
+        Chem.Mol(mol), mol, prbCid=prb_id, refCid=ref_id, atomMap=atom_map
+    )
+
+
+def random_rotation(rng):
+    """
+    Make a random proper rotation matrix.
+
+    Inputs:
+    :param numpy.random.RandomState rng: the random number generator
+
+    Returns:
+    :returns: numpy.ndarray rotation: a 3x3 matrix with determinant 1
+    """
+
+    q, r = numpy.linalg.qr(rng.normal(size=(3, 3)))
+    q = q * numpy.sign(numpy.diag(r))
+    if numpy.linalg.det(q) < 0:
+        q[:, 0] = -q[:, 0]
+    return q
+
+
+def test_rmsds_match_rdkit():
+    """The batched RMSDs match AlignMol and GetBestRMS for every pair."""
+
+    mol = make_heavy_atom_mol(6)
+    coords = get_coords(mol)
+    conf_ids = [conf.GetId() for conf in mol.GetConformers()]
+
+    for i, ref_id in enumerate(conf_ids):
+        rmsds = ConformerRMSD.get_aligned_rmsds(coords[i], coords)
+        for j, prb_id in enumerate(conf_ids):
+            assert rmsds[j] == pytest.approx(
+                rdkit_rmsd(mol, ref_id, prb_id), abs=1e-4
+            )
+            best_rms = rdMolAlign.GetBestRMS(
+                Chem.Mol(mol), mol, refId=ref_id, prbId=prb_id
+            )
+            assert rmsds[j] == pytest.approx(best_rms, abs=1e-4)
+
+        # A conformer is identical to itself.
+        assert rmsds[i] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_rotated_copy_has_zero_rmsd():
+    """A rotated and translated copy of a conformer has an RMSD of 0."""
+
+    rng = numpy.random.RandomState(0)
+    mol = make_heavy_atom_mol(1)
+    ref = get_coords(mol)[0]
+    moved = ref.dot(random_rotation(rng).T) + numpy.array([3.0, -2.0, 7.5])
+
+    rmsds = ConformerRMSD.get_aligned_rmsds(ref, moved[None])
+    assert rmsds[0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_mirror_image_is_not_superimposed():
+    """
+    The mirror image of a chiral conformer can't be reached by rotation, so
+    its RMSD is above 0 and matches AlignMol (which doesn't reflect either).
+    """
+
+    mol = make_heavy_atom_mol(1)
+    ref = get_coords(mol)[0]
+    mirror_id = add_conformer(mol, ref * numpy.array([-1.0, 1.0, 1.0]))
+    ref_id = mol.GetConformers()[0].GetId()
+
+    rmsd = ConformerRMSD.get_aligned_rmsds(ref, get_coords(mol)[1:])[0]
+
+    assert rmsd > 0.1
+    assert rmsd == pytest.approx(rdkit_rmsd(mol, ref_id, mirror_id), abs=1e-4)
+
+    # Allowing reflection, RDKit superimposes the two exactly.
+    atom_map = [(i, i) for i in range(mol.GetNumAtoms())]
+    reflected_rmsd = rdMolAlign.AlignMol(
+        Chem.Mol(mol),
+        mol,
+        prbCid=mirror_id,
+        refCid=ref_id,
+        atomMap=atom_map,
+        reflect=True,
+    )
+    assert reflected_rmsd == pytest.approx(0.0, abs=1e-4)
+
+
+def rdkit_distinct_conformers(mol, rmsd_cutoff):
+    """
+    The conformers kept by the original pairwise elimination: in order, each
+    conformer is dropped if it's within rmsd_cutoff of an earlier kept one.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: the molecule
+    :param float rmsd_cutoff: the RMSD cutoff
+
+    Returns:
+    :returns: list keep: a bool for each conformer, True if it's kept
+    """
+
+    conf_ids = [conf.GetId() for conf in mol.GetConformers()]
+    keep = []
+    for i, prb_id in enumerate(conf_ids):
+        keep.append(
+            all(
+                rdkit_rmsd(mol, conf_ids[j], prb_id) > rmsd_cutoff
+                for j in range(i)
+                if keep[j]
+            )
+        )
+    return keep
+
+
+@pytest.mark.parametrize("batch_size", [ConformerRMSD.RMSD_BATCH_SIZE, 2])
+@pytest.mark.parametrize("rmsd_cutoff", [0.1, 0.5])
+def test_same_conformers_kept_as_rdkit(batch_size, rmsd_cutoff):
+    """
+    find_distinct_conformers keeps the same conformers as the pairwise RDKit
+    elimination, with near-duplicates and a mirror image in the set.
+    """
+
+    rng = numpy.random.RandomState(1)
+    mol = make_heavy_atom_mol(6)
+    embedded = get_coords(mol)
+
+    # Moved copies of some conformers, with a little noise, so some
+    # conformers are within the cutoff of others.
+    for i in [0, 2, 2, 5]:
+        noise = rng.normal(scale=0.02, size=embedded[i].shape)
+        add_conformer(
+            mol, (embedded[i] + noise).dot(random_rotation(rng).T) + 1.0
+        )
+
+    # The mirror image of the first conformer.
+    add_conformer(mol, embedded[0] * numpy.array([1.0, -1.0, 1.0]))
+
+    keep = ConformerRMSD.find_distinct_conformers(
+        get_coords(mol), rmsd_cutoff, batch_size
+    )
+
+    assert list(keep) == rdkit_distinct_conformers(mol, rmsd_cutoff)
+
+    # The noisy copies are all dropped at the default cutoff, and the mirror
+    # image is kept.
+    if rmsd_cutoff == 0.1:
+        num_embedded = len(embedded)
+        assert keep[num_embedded : num_embedded + 4] == [False] * 4
+        assert keep[-1]
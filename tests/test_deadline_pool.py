@@ -0,0 +1,219 @@
+"""
+Tests for the DeadlinePool used to run Gypsum-DL with a deadline per ligand.
+"""
+import os
+import time
+
+from glauconite.operators.convert_files.deadline_pool import DeadlinePool
+
+# The deadline of every item in the tests (seconds)
+TIMEOUT = 1.0
+
+
+def init_worker(state):
+    """
+    The init_func of the test pools.
+
+    Inputs:
+    :param str state: the state to hand to every item
+
+    Returns:
+    :returns: str state: the state
+    """
+
+    return state
+
+
+def init_worker_and_crash(state):
+    """
+    An init_func which kills its worker before it runs any item.
+
+    Inputs:
+    :param str state: unused
+    """
+
+    os._exit(5)
+
+
+def run_item(state, item):
+    """
+    The item_func of the test pools. An item is [action, value]:
+        ["ok", value] returns straight away
+        ["sleep", pid_file] writes the pid of the worker to pid_file and
+            sleeps far past the deadline
+        ["crash", exit_code] kills the worker process
+
+    Inputs:
+    :param str state: the state made by init_worker
+    :param list item: the item
+
+    Returns:
+    :returns: list result: [state, value, pid of the worker]
+    """
+
+    action, value = item
+    if action == "sleep":
+        with open(value, "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(60)
+    elif action == "crash":
+        os._exit(value)
+    return [state, value, os.getpid()]
+
+
+def make_failed_result(item, error, timed_out):
+    """
+    The failed_func of the test pools.
+
+    Inputs:
+    :param list item: the item which failed
+    :param str error: a description of the failure
+    :param bool timed_out: True if the item passed its deadline
+
+    Returns:
+    :returns: list result: ["failed", value of the item, error, timed_out]
+    """
+
+    return ["failed", item[1], error, timed_out]
+
+
+def make_pool(num_procs, init_func=init_worker):
+    """
+    Make a DeadlinePool which runs run_item.
+
+    Inputs:
+    :param int num_procs: the number of worker processes
+    :param func init_func: the init_func of the pool
+
+    Returns:
+    :returns: DeadlinePool pool: the pool
+    """
+
+    return DeadlinePool(
+        num_procs, TIMEOUT, init_func, ("state",), run_item, make_failed_result
+    )
+
+
+def is_process_alive(pid):
+    """
+    Check if a process exists.
+
+    Inputs:
+    :param int pid: the process id
+
+    Returns:
+    :returns: bool alive: True if the process exists
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_results_in_item_order():
+    """
+    Every item is run once in a worker and the results are in the order of
+    the items in the batches.
+    """
+
+    batches = [[["ok", i] for i in range(j * 3, j * 3 + 3)] for j in range(5)]
+    batches.insert(2, [])
+
+    results = make_pool(2).run(batches)
+
+    assert [x[:2] for x in results] == [["state", i] for i in range(15)]
+    assert os.getpid() not in [x[2] for x in results]
+    assert make_pool(2).run([]) == []
+    assert make_pool(2).run([[], []]) == []
+
+
+def test_timed_out_item_is_terminated_and_replaced(tmp_path):
+    """
+    An item which passes its deadline is reported as timed out, its worker is
+    terminated, and a new worker runs the rest of its batch.
+    """
+
+    pid_file = str(tmp_path / "sleeping_worker.pid")
+    batch = [["ok", 0], ["sleep", pid_file], ["ok", 2], ["ok", 3]]
+
+    start_time = time.time()
+    results = make_pool(1).run([batch])
+    run_time = time.time() - start_time
+
+    # It did not wait for the sleeping item to finish
+    assert run_time < 30
+
+    assert results[0][:2] == ["state", 0]
+    assert results[1][0] == "failed"
+    assert results[1][1] == pid_file
+    assert "Timed out" in results[1][2]
+    assert results[1][3] is True
+    assert results[2][:2] == ["state", 2]
+    assert results[3][:2] == ["state", 3]
+
+    # The stuck worker was terminated and the rest of the batch ran in a
+    # new worker
+    with open(pid_file, "r") as f:
+        sleeping_pid = int(f.read())
+    assert results[0][2] == sleeping_pid
+    assert is_process_alive(sleeping_pid) is False
+    assert results[2][2] != sleeping_pid
+    assert results[2][2] == results[3][2]
+
+
+def test_timeout_does_not_block_other_batches(tmp_path):
+    """
+    While one worker is stuck, the other workers keep running their batches
+    and the stuck batch's remaining items are still run.
+    """
+
+    pid_file = str(tmp_path / "sleeping_worker.pid")
+    batches = [
+        [["sleep", pid_file], ["ok", 1], ["ok", 2]],
+        [["ok", 3], ["ok", 4]],
+        [["ok", 5], ["ok", 6]],
+    ]
+
+    results = make_pool(2).run(batches)
+
+    assert results[0][0] == "failed"
+    assert results[0][3] is True
+    assert [x[1] for x in results[1:]] == [1, 2, 3, 4, 5, 6]
+    assert all(x[0] == "state" for x in results[1:])
+
+
+def test_crashed_worker_is_reported():
+    """
+    An item which kills its worker process is reported as failed (not timed
+    out) instead of hanging the parent, and the rest of its batch is run by
+    a new worker.
+    """
+
+    batch = [["ok", 0], ["crash", 3], ["ok", 2]]
+
+    results = make_pool(1).run([batch, [["ok", 4]]])
+
+    assert results[0][:2] == ["state", 0]
+    assert results[1][0] == "failed"
+    assert results[1][1] == 3
+    assert "exited with code 3" in results[1][2]
+    assert results[1][3] is False
+    assert results[2][:2] == ["state", 2]
+    assert results[3][:2] == ["state", 4]
+    assert results[2][2] != results[0][2]
+
+
+def test_worker_crashing_on_start_fails_every_item():
+    """
+    A worker which dies before running any item fails the items one at a
+    time, so the pool always finishes.
+    """
+
+    batches = [[["ok", 0], ["ok", 1]], [["ok", 2]]]
+
+    results = make_pool(2, init_func=init_worker_and_crash).run(batches)
+
+    assert [x[:2] for x in results] == [["failed", 0], ["failed", 1], ["failed", 2]]
+    assert all(x[3] is False for x in results)
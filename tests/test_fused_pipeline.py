@@ -0,0 +1,62 @@
+"""
+Tests for the per-container runs of Gypsum-DL (the fused pipeline and mpi
+modes), in which each container is prepared end-to-end by a single worker.
+"""
+import pytest
+
+pytest.importorskip("rdkit")
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+import gypsum_dl.Start as Start
+
+# (SMILES, name, properties) tuples
+SMILES_DATA = [
+    ("CCO", "ethanol", {}),
+    ("OC(=O)c1ccccc1", "benzoic_acid", {}),
+]
+
+
+def test_failing_job_is_reported_as_error(monkeypatch):
+    """
+    An exception while preparing a job's containers becomes an error
+    ContainerResult for each of them instead of escaping.
+    """
+
+    def fail_execute_gypsum_dl(contnrs, params):
+        raise AttributeError("'list' object has no attribute 'mols'")
+
+    monkeypatch.setattr(Start, "execute_gypsum_dl", fail_execute_gypsum_dl)
+    contnrs = Start.make_mol_containers(SMILES_DATA)
+
+    results = Start.execute_gypsum_dl_on_one_job(contnrs, {})
+
+    assert [result.name for result in results] == ["ethanol", "benzoic_acid"]
+    for result in results:
+        assert result.status == "error"
+        assert "AttributeError" in result.error
+
+
+def test_fused_pipeline_with_durrant_lab_filters(tmp_path):
+    """
+    The fused pipeline prepares every molecule with the Durrant-lab filters
+    on, in multiprocessing mode.
+    """
+
+    results = Start.prepare_molecules(
+        {
+            "source": list(SMILES_DATA),
+            "output_folder": str(tmp_path),
+            "job_manager": "multiprocessing",
+            "num_processors": 2,
+            "fused_pipeline": True,
+            "use_durrant_lab_filters": True,
+            "max_variants_per_compound": 2,
+            "thoroughness": 1,
+        }
+    )
+
+    assert sorted(result.name for result in results) == ["benzoic_acid", "ethanol"]
+    for result in results:
+        assert result.status == "success", (result.error, result.log)
+        assert result.num_variants > 0
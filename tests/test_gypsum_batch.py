@@ -0,0 +1,167 @@
+"""
+End-to-end tests of the batched 3D conversion (conversion_to_3d.run_gypsum_batch)
+with the Gypsum-DL parameters Glauconite uses.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("rdkit")
+pytest.importorskip("numpy")
+pytest.importorskip("func_timeout")
+
+from rdkit import Chem
+
+import glauconite.user_vars as user_vars
+import glauconite.operators.convert_files.conversion_to_3d as conversion_to_3d
+import glauconite.operators.file_io.pose_shards as pose_shards
+import gypsum_dl.ContainerResult as gypsum_results
+
+# (SMILES, abridged name, mol_binary) tuples, as handed to the workers
+LIGANDS = [
+    ("CCO", "ethanol", None),
+    ("OC(=O)c1ccccc1", "benzoic_acid", None),
+    ("C[C@H](N)C(=O)O", "alanine", None),
+]
+
+
+def make_batch_params(tmp_path, output_3d_format):
+    """
+    Make the Gypsum-DL parameters and 3D output settings of a batched run,
+    as convert_batches_with_gypsum does, from the default user variables.
+
+    Inputs:
+    :param pathlib.Path tmp_path: the folder to write everything in
+    :param str output_3d_format: "pdb" or "sdf_shards"
+
+    Returns:
+    :returns: dict gypsum_params: the Gypsum-DL parameters
+    :returns: list output_3d: how to write the 3D models (see
+        conversion_to_3d.get_output_3d_settings)
+    """
+
+    vars = user_vars.define_defaults()
+    vars["output_3d_format"] = output_3d_format
+    smile_file_directory = str(tmp_path) + os.sep
+    output_3d = conversion_to_3d.get_output_3d_settings(vars, smile_file_directory)
+    os.makedirs(output_3d[1])
+
+    gypsum_params = conversion_to_3d.make_gypsum_params(
+        [],
+        smile_file_directory + "3D_SDFs" + os.sep,
+        vars["max_variants_per_compound"],
+        vars["gypsum_thoroughness"],
+        vars["min_ph"],
+        vars["max_ph"],
+        vars["pka_precision"],
+    )
+    conversion_to_3d.add_batch_gypsum_params(vars, gypsum_params, output_3d)
+
+    return gypsum_params, output_3d
+
+
+def test_run_gypsum_batch_writes_pdbs(tmp_path):
+    """
+    Every ligand of a batch is converted, with the Durrant-lab filters on,
+    and a PDB is written for each of its variants.
+    """
+
+    gypsum_params, output_3d = make_batch_params(tmp_path, "pdb")
+    assert gypsum_params["use_durrant_lab_filters"] is True
+
+    results = conversion_to_3d.run_gypsum_batch(
+        str(tmp_path / "log") + os.sep, gypsum_params, LIGANDS, 120, output_3d
+    )
+
+    assert [result.name for result in results] == [x[1] for x in LIGANDS]
+    for result in results:
+        assert result.status == "success", (result.error, result.log)
+        assert result.num_variants > 0
+        assert len(result.outputs) == result.num_variants
+        for ligand_id, variant, pdb_name, offset, length, smiles in result.outputs:
+            assert ligand_id == result.name
+            assert os.path.getsize(pdb_name) == length
+            mol = Chem.MolFromPDBFile(pdb_name)
+            assert mol is not None
+            assert mol.GetNumConformers() == 1
+
+
+def test_run_gypsum_batch_writes_shards(tmp_path):
+    """Writing to .sdf shards, every variant can be read back."""
+
+    gypsum_params, output_3d = make_batch_params(tmp_path, "sdf_shards")
+
+    results = conversion_to_3d.run_gypsum_batch(
+        str(tmp_path / "log") + os.sep, gypsum_params, LIGANDS, 120, output_3d
+    )
+    conversion_to_3d.finish_pose_shards(output_3d)
+
+    pose_index = pose_shards.load_pose_index(output_3d[1])
+    for result in results:
+        assert result.status == "success", (result.error, result.log)
+        for variant in range(1, result.num_variants + 1):
+            sdf_block = pose_shards.read_pose(
+                output_3d[1], result.name, variant, pose_index
+            )
+            mol = Chem.MolFromMolBlock(sdf_block)
+            assert mol is not None
+            assert mol.GetNumConformers() == 1
+
+
+def test_run_gypsum_batch_reports_each_ligand(tmp_path):
+    """
+    A ligand which can't be converted is reported on its own; the rest of the
+    batch is still converted.
+    """
+
+    gypsum_params, output_3d = make_batch_params(tmp_path, "pdb")
+    ligands = [LIGANDS[0], ("C1CC", "unclosed_ring", None), LIGANDS[1]]
+
+    results = conversion_to_3d.run_gypsum_batch(
+        str(tmp_path / "log") + os.sep, gypsum_params, ligands, 120, output_3d
+    )
+
+    assert [result.name for result in results] == [x[1] for x in ligands]
+    assert [result.succeeded() for result in results] == [True, False, True]
+    assert results[1].status in ["invalid_input", "error"]
+
+
+def test_failures_reported_by_status(tmp_path, capsys):
+    """
+    Ligands which timed out are listed apart from those which hit an error,
+    and the logs of every failure are written.
+    """
+
+    gypsum_log_path = str(tmp_path / "log") + os.sep
+    results = [
+        gypsum_results.ContainerResult("ethanol", "CCO", "success", 2),
+        gypsum_results.ContainerResult(
+            "slow", "CCCC", "timeout", error="Timed out after 10 seconds"
+        ),
+        gypsum_results.ContainerResult(
+            "broken", "CCN", "error", error="AttributeError()", log=["msg"]
+        ),
+        gypsum_results.ContainerResult("empty", "CCC", "no_variants"),
+    ]
+
+    failed = conversion_to_3d.handle_gypsum_results(results, gypsum_log_path)
+    conversion_to_3d.print_ligands_failed_to_convert(failed, gypsum_log_path)
+
+    assert [result.name for result in failed] == ["slow", "broken", "empty"]
+    for name in ["slow", "broken", "empty"]:
+        assert os.path.exists("{}{}_log.txt".format(gypsum_log_path, name))
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == (
+        "Gypsum-DL made 2 3D variants of 4 ligands "
+        "(error: 1, no_variants: 1, success: 1, timeout: 1)"
+    )
+    timeout_line = [x for x in lines if "Timed out" in x][0]
+    error_line = [x for x in lines if "with an error" in x][0]
+    assert lines[lines.index(timeout_line) + 1] == "['slow']"
+    assert lines[lines.index(error_line) + 1] == (
+        "See the logs of these ligands in {}".format(gypsum_log_path)
+    )
+    assert lines[lines.index(error_line) + 2] == "['broken']"
+    assert "Likely due to a Timeout" not in lines
+    assert "['empty']" in lines
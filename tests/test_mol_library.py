@@ -0,0 +1,172 @@
+"""
+Tests for the binary molecule library format (gypsum_dl.Steps.IO.MolLibrary)
+and for handing library mols to Gypsum-DL without sanitizing them again.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("rdkit")
+
+from rdkit import Chem
+
+import gypsum_dl.MyMol as MyMol
+from gypsum_dl.MolContainer import MolContainer
+from gypsum_dl.Steps.IO import MolLibrary
+
+SMILES_AND_NAMES = [
+    ("CCO", "ethanol"),
+    ("c1ccccc1C(=O)[O-]", "benzoate"),
+    ("C[C@H](N)C(=O)O", "alanine"),
+    ("F/C=C/F", "difluoroethene"),
+]
+
+
+def write_test_library(filename):
+    """
+    Write SMILES_AND_NAMES to a molecule library.
+
+    Inputs:
+    :param str filename: the library to write
+
+    Returns:
+    :returns: list mols: the sanitized mols which were written
+    """
+
+    mols = [Chem.MolFromSmiles(smiles) for smiles, name in SMILES_AND_NAMES]
+    records = [
+        (smiles, name, mol) for (smiles, name), mol in zip(SMILES_AND_NAMES, mols)
+    ]
+    assert MolLibrary.write_mol_library(filename, records) == len(records)
+    return mols
+
+
+def test_round_trip(tmp_path):
+    """
+    Every record written to a library is read back in order, unchanged.
+    """
+
+    filename = str(tmp_path / "test.mlib")
+    mols = write_test_library(filename)
+
+    records = list(MolLibrary.iter_mol_library(filename))
+    assert len(records) == len(SMILES_AND_NAMES)
+    for (smiles, name, mol_binary), (exp_smiles, exp_name), mol in zip(
+        records, SMILES_AND_NAMES, mols
+    ):
+        assert smiles == exp_smiles
+        assert name == exp_name
+        assert mol_binary == mol.ToBinary()
+        assert Chem.MolToSmiles(Chem.Mol(mol_binary)) == Chem.MolToSmiles(mol)
+
+    loaded = MolLibrary.load_mol_library_file(filename)
+    assert [(s, n) for s, n, props, mol in loaded] == SMILES_AND_NAMES
+    assert all(props == {} for s, n, props, mol in loaded)
+
+
+def test_writer_accepts_binaries(tmp_path):
+    """
+    The writer takes mols already converted with ToBinary() as is.
+    """
+
+    filename = str(tmp_path / "binary.mlib")
+    mol_binary = Chem.MolFromSmiles("CCN").ToBinary()
+    with MolLibrary.MolLibraryWriter(filename) as writer:
+        writer.write("CCN", "ethylamine", mol_binary)
+        assert writer.num_records == 1
+
+    assert list(MolLibrary.iter_mol_library(filename)) == [
+        ("CCN", "ethylamine", mol_binary)
+    ]
+
+
+def test_empty_library(tmp_path):
+    """
+    A library with no records has no entries.
+    """
+
+    filename = str(tmp_path / "empty.mlib")
+    assert MolLibrary.write_mol_library(filename, []) == 0
+    assert list(MolLibrary.iter_mol_library(filename)) == []
+
+
+def test_wrong_magic(tmp_path):
+    """
+    A file which doesn't start with the magic header is rejected.
+    """
+
+    filename = str(tmp_path / "not_a_library.mlib")
+    with open(filename, "wb") as f:
+        f.write(b"CCO\tethanol\n")
+
+    with pytest.raises(Exception, match="is not a molecule library"):
+        list(MolLibrary.iter_mol_library(filename))
+
+
+@pytest.mark.parametrize("num_bytes_removed", [1, 2, 6])
+def test_truncated_record(tmp_path, num_bytes_removed):
+    """
+    A library cut off in the middle of the last field of its last record
+    raises an error instead of dropping the record.
+    """
+
+    filename = str(tmp_path / "truncated.mlib")
+    write_test_library(filename)
+    size = os.path.getsize(filename)
+    with open(filename, "r+b") as f:
+        f.truncate(size - num_bytes_removed)
+
+    with pytest.raises(Exception, match="is truncated"):
+        list(MolLibrary.iter_mol_library(filename))
+
+
+@pytest.mark.parametrize("partial_prefix", [b"", b"\x03\x00"])
+def test_truncated_between_fields(tmp_path, partial_prefix):
+    """
+    A library cut off after the name of a record, or in the middle of the
+    length prefix of the next field, raises an error.
+    """
+
+    filename = str(tmp_path / "truncated.mlib")
+    with open(filename, "wb") as f:
+        f.write(MolLibrary.MAGIC)
+        name = "ethanol".encode("utf-8")
+        f.write(MolLibrary.LENGTH_PREFIX.pack(len(name)))
+        f.write(name)
+        f.write(partial_prefix)
+
+    with pytest.raises(Exception, match="is truncated"):
+        list(MolLibrary.iter_mol_library(filename))
+
+
+def test_library_mols_not_sanitized_again(tmp_path, monkeypatch):
+    """
+    A container made from a library mol uses that mol as is, without
+    sanitizing it again. SMILES strings are still sanitized.
+    """
+
+    filename = str(tmp_path / "test.mlib")
+    write_test_library(filename)
+
+    calls = []
+    check_sanitization = MyMol.MOH.check_sanitization
+
+    def counting_check_sanitization(mol):
+        calls.append(mol)
+        return check_sanitization(mol)
+
+    monkeypatch.setattr(MyMol.MOH, "check_sanitization", counting_check_sanitization)
+
+    for idx, (smiles, name, props, mol) in enumerate(
+        MolLibrary.load_mol_library_file(filename)
+    ):
+        contnr = MolContainer(smiles, name, idx, props, mol)
+        assert contnr.mol_orig_frm_inp_smi.rdkit_mol is mol
+        assert contnr.mol_orig_frm_inp_smi.orig_smi == smiles
+        assert contnr.orig_smi_canonical == Chem.MolToSmiles(
+            Chem.MolFromSmiles(smiles), isomericSmiles=True
+        )
+    assert calls == []
+
+    MolContainer("CCO", "ethanol", 0, {})
+    assert len(calls) == 1
@@ -0,0 +1,194 @@
+"""
+Tests for the filter preparation stage (mol_preparation) and the results
+returned by execute_filters.run_filter_mol.
+"""
+import pytest
+
+pytest.importorskip("rdkit")
+
+from rdkit import Chem
+
+import glauconite.operators.filter.mol_preparation as mol_prep
+import glauconite.operators.filter.execute_filters as execute_filters
+
+
+def count_charged_atoms(mol):
+    """
+    Count the atoms of a mol with a non-zero formal charge.
+
+    Inputs:
+    :param rdkit.Chem.rdchem.Mol mol: an rdkit mol object
+
+    Returns:
+    :returns: int num_charged: the number of charged atoms
+    """
+
+    return len([a for a in mol.GetAtoms() if a.GetFormalCharge() != 0])
+
+
+def test_neutral_mol_skips_uncharger(monkeypatch):
+    """
+    A mol without formal charges is never handed to the Uncharger.
+    """
+
+    def fail_get_uncharger():
+        raise AssertionError("The Uncharger was used on a neutral mol")
+
+    monkeypatch.setattr(mol_prep, "get_uncharger", fail_get_uncharger)
+
+    timings = mol_prep.make_timing_counters()
+    mol = mol_prep.prepare_mol_for_filters("CCOC(=O)c1ccccc1", timings)
+
+    assert mol is not None
+    assert Chem.MolToSmiles(mol) == Chem.MolToSmiles(Chem.MolFromSmiles("CCOC(=O)c1ccccc1"))
+    assert sorted(timings.keys()) == sorted(mol_prep.PREP_STEPS)
+
+
+def test_charged_mol_is_neutralized():
+    """
+    Charged mols still go through the Uncharger and come out neutral and
+    sanitized.
+    """
+
+    for smiles in ["CC(=O)[O-]", "C[NH3+]", "[O-]C(=O)CC[NH3+]"]:
+        mol = mol_prep.prepare_mol_for_filters(smiles)
+        assert mol is not None, smiles
+        assert count_charged_atoms(mol) == 0, smiles
+        # A sanitized mol can be written back out
+        assert Chem.MolToSmiles(mol) != ""
+
+
+def test_charged_parsed_mol_uses_uncharger(monkeypatch):
+    """
+    prepare_parsed_mol_for_filters calls the Uncharger for a charged mol.
+    """
+
+    calls = []
+    uncharger = mol_prep.get_uncharger()
+
+    def counting_get_uncharger():
+        calls.append(1)
+        return uncharger
+
+    monkeypatch.setattr(mol_prep, "get_uncharger", counting_get_uncharger)
+
+    mol = Chem.MolFromSmiles("CC(=O)[O-]", sanitize=False)
+    mol = mol_prep.prepare_parsed_mol_for_filters(mol)
+
+    assert len(calls) == 1
+    assert count_charged_atoms(mol) == 0
+
+
+def test_prepare_fails_on_bad_smiles():
+    """
+    A SMILES string which can not be parsed gives None rather than raising.
+    """
+
+    assert mol_prep.prepare_mol_for_filters("C1CC(") is None
+    assert mol_prep.prepare_parsed_mol_for_filters(None) is None
+
+
+def test_merge_timing_counters():
+    """
+    merge_timing_counters adds the timings of one mol to the running total.
+    """
+
+    total = mol_prep.make_timing_counters()
+    mol_prep.merge_timing_counters(total, {"parse": 1.0, "filter": 2.0})
+    mol_prep.merge_timing_counters(total, {"parse": 0.5})
+    mol_prep.merge_timing_counters(total, None)
+
+    assert total["parse"] == 1.5
+    assert total["filter"] == 2.0
+    assert total["sanitize"] == 0.0
+
+
+def check_result_shape(result, smiles_info):
+    """
+    Check the parts of a run_filter_mol result which are the same for every
+    outcome.
+
+    Inputs:
+    :param list result: the output of execute_filters.run_filter_mol
+    :param list smiles_info: the smiles_info passed to run_filter_mol
+    """
+
+    assert isinstance(result, list)
+    assert len(result) == 6
+    assert result[0] == smiles_info
+    timings = result[2]
+    assert sorted(timings.keys()) == sorted(mol_prep.PREP_STEPS)
+    for seconds in timings.values():
+        assert isinstance(seconds, float)
+        assert seconds >= 0.0
+
+
+def test_run_filter_mol_passed():
+    """
+    A passing mol returns the 6 item result with the timing dict, and only
+    the optional outputs which were asked for.
+    """
+
+    child_dict = execute_filters.make_run_class_dict(["LipinskiStrictFilter"])
+    smiles_info = ["CCO", "ethanol"]
+
+    result = execute_filters.run_filter_mol(smiles_info, child_dict)
+    check_result_shape(result, smiles_info)
+    assert result[1] == "Filter_Passed"
+    assert result[3:] == [None, None, None]
+
+    result = execute_filters.run_filter_mol(
+        smiles_info,
+        child_dict,
+        keep_mol_binary=True,
+        keep_filter_verdicts=True,
+        keep_descriptors=True,
+    )
+    check_result_shape(result, smiles_info)
+    assert result[1] == "Filter_Passed"
+    assert Chem.MolToSmiles(Chem.Mol(result[3])) == "CCO"
+    assert result[4] == {"LipinskiStrictFilter": True}
+    assert isinstance(result[5], dict)
+    assert result[2]["filter"] >= 0.0
+
+
+def test_run_filter_mol_from_binary():
+    """
+    A mol given as an rdkit binary gives the same verdict as its SMILES.
+    """
+
+    child_dict = execute_filters.make_run_class_dict(["LipinskiStrictFilter"])
+    smiles_info = ["CC(=O)[O-]", "acetate"]
+    mol_binary = Chem.MolFromSmiles("CC(=O)[O-]").ToBinary()
+
+    result = execute_filters.run_filter_mol(
+        smiles_info, child_dict, mol_binary=mol_binary, keep_mol_binary=True
+    )
+    check_result_shape(result, smiles_info)
+    assert result[1] == "Filter_Passed"
+    assert result[3] == mol_binary
+
+
+def test_run_filter_mol_failed():
+    """
+    A mol failing a filter or failing to sanitize still returns the 6 item
+    result.
+    """
+
+    child_dict = execute_filters.make_run_class_dict(["LipinskiStrictFilter"])
+
+    # Far too heavy for Lipinski
+    smiles_info = ["C" * 60, "heavy"]
+    result = execute_filters.run_filter_mol(
+        smiles_info, child_dict, keep_filter_verdicts=True
+    )
+    check_result_shape(result, smiles_info)
+    assert result[1] == "Filter_fail"
+    assert result[3] is None
+    assert result[4] == {"LipinskiStrictFilter": False}
+
+    smiles_info = ["C1CC(", "broken"]
+    result = execute_filters.run_filter_mol(smiles_info, child_dict)
+    check_result_shape(result, smiles_info)
+    assert result[1] == "Sanitize_fail"
+    assert result[3:] == [None, None, None]
@@ -0,0 +1,202 @@
+"""
+Tests for the packed .sdf shard output of the 3D models (file_io.pose_shards).
+"""
+import os
+
+import glauconite.operators.file_io.pose_shards as pose_shards
+
+
+def make_sdf_block(ligand_id, variant):
+    """
+    Make the text of a (fake) SDF record of a pose.
+
+    Inputs:
+    :param str ligand_id: the ID of the ligand
+    :param int variant: the variant of the ligand
+
+    Returns:
+    :returns: str sdf_block: the text of the record, ending with $$$$
+    """
+
+    return "{}__{}\n  test\n\n  0  0  0  0  0  0  0  0  0  0999 V2000\nM  END\n$$$$\n".format(
+        ligand_id, variant
+    )
+
+
+def make_poses(ligand_id, num_variants):
+    """
+    Make the poses of a ligand, as handed to PoseShardWriter.write_poses.
+
+    Inputs:
+    :param str ligand_id: the ID of the ligand
+    :param int num_variants: the number of variants
+
+    Returns:
+    :returns: list poses: list of [ligand_id, variant, sdf_block,
+        final_smiles]
+    """
+
+    return [
+        [ligand_id, variant, make_sdf_block(ligand_id, variant), "C" * variant]
+        for variant in range(1, num_variants + 1)
+    ]
+
+
+def read_text(filename):
+    """
+    Read a whole file.
+
+    Inputs:
+    :param str filename: the path of the file
+
+    Returns:
+    :returns: str text: the contents of the file
+    """
+
+    with open(filename, "r") as f:
+        return f.read()
+
+
+def test_round_trip_with_rotation(tmp_path):
+    """
+    Poses written across several shards (a new shard every
+    max_poses_per_shard poses) are all read back from the index.
+    """
+
+    shard_folder = str(tmp_path)
+    ligands = [("lig_a", 3), ("lig_b", 1), ("lig_c", 4)]
+
+    entries = []
+    with pose_shards.PoseShardWriter(shard_folder, 2, prefix="poses") as writer:
+        for ligand_id, num_variants in ligands:
+            entries.extend(writer.write_poses(make_poses(ligand_id, num_variants)))
+
+    # 8 poses at 2 per shard
+    index_files = pose_shards.get_shard_index_files(shard_folder)
+    assert [os.path.basename(x) for x in index_files] == [
+        "poses_{:04d}.sdf.idx".format(i) for i in range(4)
+    ]
+    assert len(entries) == 8
+    assert sorted(set(x[2] for x in entries)) == [x[:-4] for x in index_files]
+
+    # Every shard holds max_poses_per_shard poses and is a plain .sdf file
+    pose_index = pose_shards.load_pose_index(shard_folder)
+    assert len(pose_index) == 8
+    for index_file in index_files:
+        shard_file = index_file[:-len(pose_shards.POSE_INDEX_EXTENSION)]
+        shard_entries = [x for x in entries if x[2] == shard_file]
+        assert len(shard_entries) == 2
+        assert read_text(shard_file) == "".join(
+            make_sdf_block(x[0], x[1]) for x in shard_entries
+        )
+
+    for ligand_id, num_variants in ligands:
+        for variant in range(1, num_variants + 1):
+            assert pose_shards.read_pose(
+                shard_folder, ligand_id, variant, pose_index
+            ) == make_sdf_block(ligand_id, variant)
+            assert pose_index[(ligand_id, variant)][3] == "C" * variant
+    assert pose_shards.read_pose(shard_folder, "lig_b", 1) == make_sdf_block("lig_b", 1)
+    assert pose_shards.read_pose(shard_folder, "lig_b", 2) is None
+    assert pose_shards.read_pose(shard_folder, "lig_d", 1, pose_index) is None
+
+    assert [x[:2] for x in pose_shards.iter_pose_index(shard_folder)] == [
+        [ligand_id, variant]
+        for ligand_id, num_variants in ligands
+        for variant in range(1, num_variants + 1)
+    ]
+
+
+def test_write_poses_entries(tmp_path):
+    """
+    The entries returned by write_poses point at the poses in the shard.
+    """
+
+    shard_folder = str(tmp_path)
+    with pose_shards.PoseShardWriter(shard_folder, 10, prefix="poses") as writer:
+        entries = writer.write_poses(make_poses("lig_a", 3))
+        assert writer.write_poses([]) == []
+
+    for ligand_id, variant, shard_file, offset, length, final_smiles in entries:
+        assert pose_shards.read_pose_block(shard_file, offset, length) == \
+            make_sdf_block(ligand_id, variant)
+
+
+def write_partial_pose(shard_folder):
+    """
+    Write two complete ligands, then leave a partial record at the end of
+    the shard (and a partial line at the end of its index) as a process
+    terminated mid-write would.
+
+    Inputs:
+    :param str shard_folder: the folder to write the shard in
+
+    Returns:
+    :returns: str shard_file: the path of the shard
+    :returns: str complete_text: the text of the complete records
+    """
+
+    with pose_shards.PoseShardWriter(shard_folder, 10, prefix="poses") as writer:
+        writer.write_poses(make_poses("lig_a", 2))
+        writer.write_poses(make_poses("lig_b", 1))
+        shard_file = writer.get_shard_name()
+    complete_text = read_text(shard_file)
+
+    with open(shard_file, "a") as f:
+        f.write(make_sdf_block("lig_c", 1)[:20])
+    with open(shard_file + pose_shards.POSE_INDEX_EXTENSION, "a") as f:
+        f.write("lig_c\t1\t")
+
+    return shard_file, complete_text
+
+
+def test_repair_removes_partial_pose(tmp_path):
+    """
+    repair_pose_shards cuts a shard back to its last indexed pose, so it is
+    a valid .sdf file, and the index can still be read.
+    """
+
+    shard_folder = str(tmp_path)
+    shard_file, complete_text = write_partial_pose(shard_folder)
+
+    assert pose_shards.repair_pose_shards(shard_folder) == 20
+    assert read_text(shard_file) == complete_text
+    assert sorted(pose_shards.load_pose_index(shard_folder).keys()) == [
+        ("lig_a", 1), ("lig_a", 2), ("lig_b", 1)
+    ]
+
+    # Nothing left to remove
+    assert pose_shards.repair_pose_shards(shard_folder) == 0
+    assert read_text(shard_file) == complete_text
+
+
+def test_repair_shard_without_index(tmp_path):
+    """
+    A shard whose process was terminated before any of its poses were
+    indexed is emptied.
+    """
+
+    shard_file = str(tmp_path / "poses_0000.sdf")
+    with open(shard_file, "w") as f:
+        f.write(make_sdf_block("lig_a", 1)[:30])
+
+    assert pose_shards.repair_pose_shards(str(tmp_path)) == 30
+    assert read_text(shard_file) == ""
+    assert pose_shards.load_pose_index(str(tmp_path)) == {}
+
+
+def test_reopened_shard_is_repaired(tmp_path):
+    """
+    A writer appending to a shard with a partial record removes it first, so
+    the new poses are indexed at the right offsets.
+    """
+
+    shard_folder = str(tmp_path)
+    shard_file, complete_text = write_partial_pose(shard_folder)
+
+    with pose_shards.PoseShardWriter(shard_folder, 10, prefix="poses") as writer:
+        writer.write_poses(make_poses("lig_d", 1))
+
+    assert read_text(shard_file) == complete_text + make_sdf_block("lig_d", 1)
+    assert pose_shards.read_pose(shard_folder, "lig_d", 1) == make_sdf_block("lig_d", 1)
+    assert pose_shards.read_pose(shard_folder, "lig_a", 2) == make_sdf_block("lig_a", 2)
@@ -0,0 +1,131 @@
+"""
+Tests for the random sampling of combinations used to enumerate chiralities and
+double-bond isomers in Gypsum-DL (gypsum_dl.Utils.random_sample_product).
+"""
+import itertools
+import random
+
+import pytest
+
+import gypsum_dl.Utils as Utils
+
+
+def count_random_sample_calls(monkeypatch):
+    """
+    Count the calls to Utils.random_sample, which only the small-product
+    fallback of random_sample_product uses.
+
+    Inputs:
+    :param monkeypatch: the pytest monkeypatch fixture
+
+    Returns:
+    :returns: list calls: a list that gets one entry per call
+    """
+
+    calls = []
+    original = Utils.random_sample
+
+    def counting_random_sample(lst, num, msg_if_cut=""):
+        calls.append(num)
+        return original(lst, num, msg_if_cut)
+
+    monkeypatch.setattr(Utils, "random_sample", counting_random_sample)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "options, repeat, num",
+    [
+        # 8 combinations: decoded when 8 > 2 * num, else the fallback.
+        (["R", "S"], 3, 3),
+        (["R", "S"], 3, 4),
+        (["R", "S"], 3, 100),
+        # 81 combinations, on either side of the switch.
+        (["E", "Z", "X"], 4, 1),
+        (["E", "Z", "X"], 4, 40),
+        (["E", "Z", "X"], 4, 41),
+        # A product of a single combination.
+        (["A"], 5, 3),
+    ],
+)
+def test_distinct_and_count(options, repeat, num):
+    """
+    Exactly min(num, product size) distinct combinations are returned, all
+    from the product.
+    """
+
+    random.seed(0)
+    product = set(itertools.product(options, repeat=repeat))
+
+    combinations = Utils.random_sample_product(options, repeat, num)
+
+    assert len(combinations) == min(num, len(product))
+    assert len(set(combinations)) == len(combinations)
+    assert set(combinations) <= product
+
+
+def test_small_product_uses_fallback(monkeypatch):
+    """When the product is at most twice num, it's built and sampled."""
+
+    calls = count_random_sample_calls(monkeypatch)
+    random.seed(1)
+
+    combinations = Utils.random_sample_product(["R", "S"], 4, 8)
+
+    assert calls == [8]
+    assert len(combinations) == 8
+    assert len(set(combinations)) == 8
+
+
+def test_large_product_decodes_indexes(monkeypatch):
+    """
+    When the product is large, it's never built: random indexes are decoded
+    to combinations instead.
+    """
+
+    calls = count_random_sample_calls(monkeypatch)
+    random.seed(2)
+
+    # 2 ** 200 combinations, far too many to build.
+    combinations = Utils.random_sample_product(["R", "S"], 200, 50)
+
+    assert calls == []
+    assert len(combinations) == 50
+    assert len(set(combinations)) == 50
+    for combination in combinations:
+        assert len(combination) == 200
+        assert set(combination) <= set(["R", "S"])
+
+
+def test_decoding_skips_repeated_indexes(monkeypatch):
+    """
+    Repeated random indexes are rejected, and each index decodes to its
+    digits in base len(options), least significant first.
+    """
+
+    draws = iter([5, 5, 0, 5, 26])
+    monkeypatch.setattr(random, "randrange", lambda total: next(draws))
+
+    # 3 ** 3 = 27 > 2 * 3, so indexes are decoded.
+    combinations = Utils.random_sample_product(["a", "b", "c"], 3, 3)
+
+    # 5 = 2 + 1 * 3, 0 = 0, 26 = 2 + 2 * 3 + 2 * 9
+    assert combinations == [("c", "b", "a"), ("a", "a", "a"), ("c", "c", "c")]
+
+
+def test_decoding_covers_whole_product(monkeypatch):
+    """Every index of the product decodes to a different combination."""
+
+    options = ["E", "Z", "X"]
+    repeat = 4
+    total = len(options) ** repeat
+
+    # Force each index in turn.
+    decoded = set()
+    for idx in range(total):
+        draws = iter([idx])
+        monkeypatch.setattr(random, "randrange", lambda total: next(draws))
+        decoded.update(Utils.random_sample_product(options, repeat, 1))
+
+    assert len(decoded) == total
+    assert decoded == set(itertools.product(options, repeat=repeat))
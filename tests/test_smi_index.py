@@ -0,0 +1,272 @@
+"""
+Tests for the byte-offset index of .smi files (file_io.smi_index) and the
+coverage check of accessory_scripts/merge_shard_outputs.py.
+"""
+import os
+import importlib.util
+
+import pytest
+
+import glauconite.operators.file_io.smi_index as smi_index
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def load_merge_shard_outputs():
+    """
+    Import accessory_scripts/merge_shard_outputs.py, which is a script rather
+    than part of the glauconite package.
+
+    Returns:
+    :returns: module merge_shard_outputs: the imported script
+    """
+
+    script = os.path.join(ROOT_DIR, "accessory_scripts", "merge_shard_outputs.py")
+    spec = importlib.util.spec_from_file_location("merge_shard_outputs", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_smi(tmp_path, text, name="test.smi"):
+    """
+    Write a .smi file.
+
+    Inputs:
+    :param pathlib.Path tmp_path: the folder to write the file in
+    :param str text: the contents of the file
+    :param str name: the name of the file
+
+    Returns:
+    :returns: str smi_file: the path of the file
+    """
+
+    smi_file = str(tmp_path / name)
+    with open(smi_file, "wb") as f:
+        f.write(text.encode("utf-8"))
+    return smi_file
+
+
+def read_all_lines(smi_file):
+    """
+    Read every line of a .smi file through the index.
+
+    Inputs:
+    :param str smi_file: the path of the .smi file
+
+    Returns:
+    :returns: list lines: the lines without their line endings
+    """
+
+    index_file, num_lines = smi_index.load_smi_index(smi_file)
+    return smi_index.read_smi_lines(smi_file, 0, num_lines)
+
+
+def test_blank_lines_are_kept(tmp_path):
+    """
+    Blank lines count as lines so line numbers match the file.
+    """
+
+    smi_file = write_smi(tmp_path, "CCO\tlig1\n\nCCN\tlig2\n\n")
+
+    index_file, num_lines = smi_index.build_smi_index(smi_file)
+    assert index_file == smi_file + ".idx"
+    assert num_lines == 4
+    assert read_all_lines(smi_file) == ["CCO\tlig1", "", "CCN\tlig2", ""]
+    assert smi_index.read_smi_lines(smi_file, 1, 3) == ["", "CCN\tlig2"]
+
+
+def test_no_final_newline(tmp_path):
+    """
+    The last line of a file without a final newline is not lost.
+    """
+
+    smi_file = write_smi(tmp_path, "CCO\tlig1\nCCN\tlig2")
+
+    index_file, num_lines = smi_index.build_smi_index(smi_file)
+    assert num_lines == 2
+    assert read_all_lines(smi_file) == ["CCO\tlig1", "CCN\tlig2"]
+    assert smi_index.read_smi_lines(smi_file, 1, 2) == ["CCN\tlig2"]
+
+
+def test_empty_file(tmp_path):
+    """
+    An empty file has no lines and every range of it is empty.
+    """
+
+    smi_file = write_smi(tmp_path, "")
+
+    index_file, num_lines = smi_index.build_smi_index(smi_file)
+    assert num_lines == 0
+    assert smi_index.read_index_header(index_file) == [0, os.stat(smi_file).st_mtime_ns, 0]
+    assert smi_index.read_smi_lines(smi_file, 0, 10) == []
+    assert smi_index.resolve_line_range(smi_file, shard="0/4") == [0, 0, 0]
+
+
+def test_index_across_read_chunks(tmp_path, monkeypatch):
+    """
+    The index is the same when lines are split across the chunks the file is
+    read in.
+    """
+
+    lines = ["C" * (i % 7) + "\tlig" + str(i) for i in range(50)]
+    lines[10] = ""
+    lines[11] = ""
+    smi_file = write_smi(tmp_path, "\n".join(lines))
+
+    for chunk_size in [1, 2, 3, 5, 64]:
+        monkeypatch.setattr(smi_index, "READ_CHUNK_SIZE", chunk_size)
+        index_file, num_lines = smi_index.build_smi_index(smi_file)
+        assert num_lines == len(lines)
+        assert smi_index.read_smi_lines(smi_file, 0, num_lines) == lines
+        for start_line in range(0, len(lines), 7):
+            assert smi_index.read_smi_lines(
+                smi_file, start_line, start_line + 3
+            ) == lines[start_line:start_line + 3]
+
+
+def test_read_past_end(tmp_path):
+    """
+    Ranges past the end of the file are clipped to the file.
+    """
+
+    smi_file = write_smi(tmp_path, "A\nB\nC\n")
+
+    assert smi_index.read_smi_lines(smi_file, 2, 100) == ["C"]
+    assert smi_index.read_smi_lines(smi_file, 3, 100) == []
+    assert smi_index.read_smi_lines(smi_file, 5, 2) == []
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    """
+    An index is rebuilt when the .smi file changes after it was built, and is
+    reused otherwise.
+    """
+
+    smi_file = write_smi(tmp_path, "A\nB\n")
+    index_file, num_lines = smi_index.load_smi_index(smi_file)
+    assert num_lines == 2
+    index_mtime = os.stat(index_file).st_mtime_ns
+
+    assert smi_index.load_smi_index(smi_file) == (index_file, 2)
+    assert os.stat(index_file).st_mtime_ns == index_mtime
+
+    write_smi(tmp_path, "A\nB\nC\n")
+    assert smi_index.load_smi_index(smi_file) == (index_file, 3)
+    assert read_all_lines(smi_file) == ["A", "B", "C"]
+
+    with open(index_file, "wb") as f:
+        f.write(b"not an index")
+    assert smi_index.load_smi_index(smi_file) == (index_file, 3)
+
+
+@pytest.mark.parametrize("num_lines", [0, 1, 2, 7, 10, 101])
+@pytest.mark.parametrize("num_shards", [1, 2, 3, 7, 16])
+def test_shard_boundaries(num_lines, num_shards):
+    """
+    The shards cover every line exactly once, in order, and differ in size by
+    at most one line.
+    """
+
+    ranges = [
+        smi_index.get_shard_line_range(num_lines, i, num_shards)
+        for i in range(num_shards)
+    ]
+
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == num_lines
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        assert end == next_start
+    sizes = [end - start for start, end in ranges]
+    assert min(sizes) >= 0
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_shards_read_whole_file(tmp_path):
+    """
+    Reading every shard of a file gives every line of it once, in order.
+    """
+
+    lines = ["C" * (i % 5 + 1) + "\tlig" + str(i) for i in range(23)]
+    smi_file = write_smi(tmp_path, "\n".join(lines) + "\n")
+
+    read_lines = []
+    for shard_index in range(4):
+        start_line, end_line, num_lines = smi_index.resolve_line_range(
+            smi_file, shard="{}/4".format(shard_index)
+        )
+        assert num_lines == len(lines)
+        read_lines.extend(smi_index.read_smi_lines(smi_file, start_line, end_line))
+
+    assert read_lines == lines
+
+
+def test_resolve_line_range(tmp_path):
+    """
+    Line ranges are clipped to the file and open ends are filled in.
+    """
+
+    smi_file = write_smi(tmp_path, "A\nB\nC\nD\n")
+
+    assert smi_index.resolve_line_range(smi_file, line_range="1:3") == [1, 3, 4]
+    assert smi_index.resolve_line_range(smi_file, line_range="2:") == [2, 4, 4]
+    assert smi_index.resolve_line_range(smi_file, line_range=":2") == [0, 2, 4]
+    assert smi_index.resolve_line_range(smi_file, line_range="3:100") == [3, 4, 4]
+    assert smi_index.resolve_line_range(smi_file, line_range="9:100") == [4, 4, 4]
+
+
+@pytest.mark.parametrize("shard", ["4/4", "-1/4", "1/0", "1", "a/b"])
+def test_bad_shard(shard):
+    """
+    Shard strings which are not "i/N" with 0 <= i < N are rejected.
+    """
+
+    with pytest.raises(Exception):
+        smi_index.parse_shard(shard)
+
+
+@pytest.mark.parametrize("line_range", ["5:2", "-1:3", "1", "a:b", "1:2:3"])
+def test_bad_line_range(line_range):
+    """
+    Line range strings which are not "start:end" with start <= end are
+    rejected.
+    """
+
+    with pytest.raises(Exception):
+        smi_index.parse_line_range(line_range)
+
+
+def test_check_run_coverage(capsys):
+    """
+    Runs which cover the file without overlapping are accepted, gaps are
+    warned about, and overlaps or different source files are errors.
+    """
+
+    merge_shard_outputs = load_merge_shard_outputs()
+    check_run_coverage = merge_shard_outputs.check_run_coverage
+
+    check_run_coverage([
+        ["in.smi", 0, 5, 10, "run_0"],
+        ["in.smi", 5, 10, 10, "run_1"],
+    ])
+    assert "WARNING" not in capsys.readouterr().out
+
+    check_run_coverage([
+        ["in.smi", 0, 3, 10, "run_0"],
+        ["in.smi", 5, 8, 10, "run_1"],
+    ])
+    output = capsys.readouterr().out
+    assert "lines 3 to 5 were not filtered" in output
+    assert "lines 8 to 10 were not filtered" in output
+
+    with pytest.raises(Exception, match="overlap"):
+        check_run_coverage([
+            ["in.smi", 0, 6, 10, "run_0"],
+            ["in.smi", 5, 10, 10, "run_1"],
+        ])
+
+    with pytest.raises(Exception, match="different source files"):
+        check_run_coverage([
+            ["in.smi", 0, 5, 10, "run_0"],
+            ["other.smi", 5, 10, 10, "run_1"],
+        ])